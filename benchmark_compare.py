@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+三种比对模式的性能基准测试
+
+按参数生成测试数据（行数、指标列数、维度基数、匹配率、文本数值占比），
+分别运行横向比对（run_compare）、维度比对（run_dimension_compare）和
+聚合比对（run_aggregate_compare），按阶段记录耗时和峰值内存（RSS），
+结果写入JSON文件，便于不同版本之间对比是否变慢。
+
+各阶段的耗时取自比对结果中的 performance；每次运行都在独立的子进程中执行，峰值内存互不影响。
+相同参数生成的数据文件会复用（固定随机种子，内容确定），不同版本可使用完全相同的输入。
+
+使用方法:
+    python benchmark_compare.py --rows 1000000 --cols 8
+    python benchmark_compare.py --modes dimension aggregate --repeat 3 --output new.json
+    python benchmark_compare.py --baseline old.json --tolerance 0.2   # 比旧结果慢20%以上时返回非0
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+    RESOURCE_OK = True
+except ImportError:
+    RESOURCE_OK = False  # Windows 不提供 resource 模块，不记录峰值内存
+
+from openpyxl import Workbook
+
+import excel_compare_web as ecw
+
+MODES = ('compare', 'dimension', 'aggregate')
+
+# 横向比对的数据文件每个指标占一列，受Excel最大列数限制
+MAX_HORIZONTAL_INDICATORS = 16384
+
+
+def peak_rss_mb(who=None):
+    """当前进程（或已结束的子进程）的峰值常驻内存，单位MB；不支持时返回None"""
+    if not RESOURCE_OK:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who is None else who)
+    # Linux 上 ru_maxrss 单位为KB，macOS 上为字节
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(usage.ru_maxrss / scale, 1)
+
+
+# ========== 测试数据生成 ==========
+
+def dataset_name(args):
+    """由生成参数得到数据目录名（参数相同时复用已生成的文件）"""
+    return 'r{}_c{}_d{}_k{}_m{}_s{}_seed{}_{}'.format(
+        args.rows, args.cols, args.dims, args.key_cardinality,
+        args.match_ratio, args.string_ratio, args.seed, args.format
+    )
+
+
+def make_value(rng, string_ratio):
+    """生成一个指标值：按 string_ratio 的比例写成文本形式的数值"""
+    value = round(rng.uniform(-1000, 100000), 2)
+    if rng.random() < string_ratio:
+        return str(value)
+    return value
+
+
+def perturb(rng, value, string_ratio):
+    """B表中已匹配行的指标值：一半相同，其余带小差异或大差异"""
+    roll = rng.random()
+    if roll < 0.5:
+        return value
+    number = float(value) + (rng.uniform(-0.5, 0.5) if roll < 0.8 else rng.uniform(-5000, 5000))
+    number = round(number, 2)
+    return str(number) if rng.random() < string_ratio else number
+
+
+def make_detail_rows(args):
+    """生成维度/聚合比对的明细表A、B
+
+    列：分类1..分类d（每列取值个数为维度基数）、编号（行唯一）、指标1..指标n。
+    维度比对以全部维度列+编号为键（每行唯一），聚合比对按分类列分组。
+    B表中 match_ratio 比例的行与A表编号相同，其余为B表独有的编号。
+    """
+    rng = random.Random(args.seed)
+    headers = ['分类{}'.format(i + 1) for i in range(args.dims)] + ['编号'] + \
+              ['指标{}'.format(i + 1) for i in range(args.cols)]
+    pools = [['类{}_{}'.format(d + 1, v) for v in range(args.key_cardinality)] for d in range(args.dims)]
+
+    rows_a = []
+    for i in range(args.rows):
+        dims = [rng.choice(pool) for pool in pools]
+        rows_a.append(dims + ['K{:09d}'.format(i)] + [make_value(rng, args.string_ratio) for _ in range(args.cols)])
+
+    matched = int(args.rows * args.match_ratio)
+    matched_ids = set(rng.sample(range(args.rows), matched))
+    rows_b = []
+    for i, row in enumerate(rows_a):
+        if i in matched_ids:
+            rows_b.append(row[:args.dims + 1] + [perturb(rng, v, args.string_ratio) for v in row[args.dims + 1:]])
+        else:
+            dims = [rng.choice(pool) for pool in pools]
+            rows_b.append(dims + ['B{:09d}'.format(i)] +
+                          [make_value(rng, args.string_ratio) for _ in range(args.cols)])
+    rng.shuffle(rows_b)
+    return headers, rows_a, rows_b
+
+
+def write_table(path, headers, rows, file_format):
+    if file_format == 'csv':
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(headers)
+            writer.writerows(rows)
+        return
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(headers)
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+
+def generate_dataset(args):
+    """生成（或复用）测试数据，返回各文件路径"""
+    data_dir = os.path.join(args.data_dir, dataset_name(args))
+    ext = '.' + args.format
+    files = {
+        'base': os.path.join(data_dir, 'base.xlsx'),
+        'data_a': os.path.join(data_dir, 'data_a.xlsx'),
+        'data_b': os.path.join(data_dir, 'data_b.xlsx'),
+        'table_a': os.path.join(data_dir, 'table_a' + ext),
+        'table_b': os.path.join(data_dir, 'table_b' + ext),
+    }
+    if all(os.path.exists(path) for path in files.values()):
+        print('复用测试数据: {}'.format(data_dir))
+        return files
+
+    os.makedirs(data_dir, exist_ok=True)
+    start = time.perf_counter()
+    headers, rows_a, rows_b = make_detail_rows(args)
+    write_table(files['table_a'], headers, rows_a, args.format)
+    write_table(files['table_b'], headers, rows_b, args.format)
+
+    # 横向比对：基准文件每行一个指标名，数据文件第1行指标名、第2行数值
+    rng = random.Random(args.seed)
+    count = min(args.rows, MAX_HORIZONTAL_INDICATORS)
+    names = ['指标_{:05d}'.format(i) for i in range(count)]
+    matched = set(rng.sample(range(count), int(count * args.match_ratio)))
+    values_a = [make_value(rng, args.string_ratio) for _ in names]
+    write_table(files['base'], ['指标名称'], [[name] for name in names], 'xlsx')
+    write_table(files['data_a'], names, [values_a], 'xlsx')
+    names_b = [name if i in matched else name + '_B' for i, name in enumerate(names)]
+    write_table(files['data_b'], names_b, [[perturb(rng, v, args.string_ratio) for v in values_a]], 'xlsx')
+
+    print('生成测试数据: {}（{:.1f} 秒）'.format(data_dir, time.perf_counter() - start))
+    return files
+
+
+def build_request(mode, files, args, output_dir):
+    """构造各比对模式的请求参数"""
+    common = {'workDir': output_dir, 'sourceOutput': args.source_output}
+    if mode == 'compare':
+        return dict(common, baseFile=files['base'], dataAFile=files['data_a'], dataBFile=files['data_b'],
+                    outputFile='bench_compare.xlsx')
+    if mode == 'dimension':
+        return dict(common, tableAFile=files['table_a'], tableBFile=files['table_b'],
+                    keyColumns=args.dims + 1, outputFile='bench_dimension.xlsx')
+    return dict(common, tableAFile=files['table_a'], tableBFile=files['table_b'],
+                dimColumns=['分类{}'.format(i + 1) for i in range(args.dims)],
+                indColumns=['指标{}'.format(i + 1) for i in range(args.cols)],
+                outputFile='bench_aggregate.xlsx')
+
+
+# ========== 运行 ==========
+
+def run_case(mode, request, conn):
+    """子进程入口：运行一次比对，把计时结果发回主进程"""
+    service = ecw.ExcelCompareService()
+    method = {
+        'compare': service.run_compare,
+        'dimension': service.run_dimension_compare,
+        'aggregate': service.run_aggregate_compare,
+    }[mode]
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    result = method(request)
+    wall = time.perf_counter() - start
+    ecw._reset_load_executor()
+
+    conn.send({
+        'success': result.get('success', False),
+        'message': result.get('message', '') if not result.get('success') else '',
+        'wallSeconds': round(wall, 4),
+        'cpuSeconds': round(time.process_time() - cpu_start, 4),
+        # 各阶段耗时来自比对结果自带的 performance（见 PhaseTimer）
+        'phases': result.get('performance', {}).get('phases', []),
+        'peakRssMB': peak_rss_mb(),
+        'childrenPeakRssMB': peak_rss_mb(resource.RUSAGE_CHILDREN) if RESOURCE_OK else None,
+    })
+    conn.close()
+
+
+def run_isolated(mode, request):
+    """在独立子进程中运行一次比对（每次运行的峰值内存单独统计）"""
+    ctx = multiprocessing.get_context('spawn')
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=run_case, args=(mode, request, child_conn))
+    process.start()
+    child_conn.close()
+    try:
+        record = parent_conn.recv()
+    except EOFError:
+        record = {'success': False, 'message': '子进程异常退出（退出码 {}）'.format(process.exitcode)}
+    process.join()
+    return record
+
+
+def environment_info():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpuCount': os.cpu_count(),
+        'numpy': ecw.NUMPY_OK,
+        'pyarrow': getattr(ecw, 'PYARROW_OK', False),
+        'loadWorkers': ecw.LOAD_WORKERS,
+        'compareWorkers': ecw.COMPARE_WORKERS,
+    }
+
+
+def compare_with_baseline(results, baseline_path, tolerance):
+    """与旧结果对比各模式的最佳耗时，返回是否有模式变慢超过容差"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('parameters') != results['parameters']:
+        print('[提示] 基准结果的测试参数不同，对比仅供参考')
+
+    regressed = False
+    print('\n与基准结果对比（容差 {:.0%}）:'.format(tolerance))
+    for mode, summary in results['modes'].items():
+        old = baseline.get('modes', {}).get(mode)
+        if not old or not old.get('bestWallSeconds') or not summary.get('bestWallSeconds'):
+            continue
+        ratio = summary['bestWallSeconds'] / old['bestWallSeconds']
+        flag = '✗ 变慢' if ratio > 1 + tolerance else '✓'
+        regressed = regressed or ratio > 1 + tolerance
+        print('  {:<10} {:>8.3f}s -> {:>8.3f}s  ({:.2f}x) {}'.format(
+            mode, old['bestWallSeconds'], summary['bestWallSeconds'], ratio, flag))
+    return regressed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='三种比对模式的性能基准测试')
+    parser.add_argument('--rows', type=int, default=100000, help='明细表行数（横向比对为指标个数，最多16384）')
+    parser.add_argument('--cols', type=int, default=5, help='指标列数')
+    parser.add_argument('--dims', type=int, default=2, help='分类维度列数')
+    parser.add_argument('--key-cardinality', type=int, default=50, help='每个分类维度列的取值个数')
+    parser.add_argument('--match-ratio', type=float, default=0.9, help='B表中与A表匹配的行比例')
+    parser.add_argument('--string-ratio', type=float, default=0.1, help='以文本形式存储的数值比例')
+    parser.add_argument('--seed', type=int, default=20260101, help='随机种子')
+    parser.add_argument('--format', choices=('xlsx', 'csv'), default='xlsx', help='明细表文件格式')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES), help='要测试的比对模式')
+    parser.add_argument('--repeat', type=int, default=1, help='每种模式运行次数（取最佳耗时）')
+    parser.add_argument('--source-output', choices=ecw.SOURCE_OUTPUTS, default='embed',
+                        help='源数据输出策略（sourceOutput）')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'excel_compare_bench'),
+                        help='测试数据目录（相同参数的数据会复用）')
+    parser.add_argument('--output', default='benchmark_compare_result.json', help='结果JSON文件')
+    parser.add_argument('--baseline', help='用于对比的旧结果JSON文件')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许比基准慢的比例')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    files = generate_dataset(args)
+    output_dir = tempfile.mkdtemp(prefix='excel_compare_bench_out_')
+
+    parameters = {
+        'rows': args.rows, 'cols': args.cols, 'dims': args.dims,
+        'keyCardinality': args.key_cardinality, 'matchRatio': args.match_ratio,
+        'stringRatio': args.string_ratio, 'seed': args.seed, 'format': args.format,
+        'sourceOutput': args.source_output,
+    }
+    results = {
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'environment': environment_info(),
+        'parameters': parameters,
+        'modes': {},
+    }
+
+    print('=' * 60)
+    print('比对模式性能基准测试')
+    print('=' * 60)
+    failed = False
+    for mode in args.modes:
+        request = build_request(mode, files, args, output_dir)
+        runs = [run_isolated(mode, request) for _ in range(args.repeat)]
+        ok_runs = [run for run in runs if run['success']]
+        best = min(ok_runs, key=lambda run: run['wallSeconds']) if ok_runs else None
+        results['modes'][mode] = {
+            'runs': runs,
+            'bestWallSeconds': best['wallSeconds'] if best else None,
+            'peakRssMB': max((run['peakRssMB'] or 0) for run in runs) if RESOURCE_OK else None,
+        }
+
+        if best is None:
+            failed = True
+            print('{:<10} ✗ 失败: {}'.format(mode, runs[-1].get('message', '')))
+            continue
+        print('{:<10} {:>8.3f} 秒  CPU {:>8.3f} 秒  峰值内存 {} MB'.format(
+            mode, best['wallSeconds'], best['cpuSeconds'], best['peakRssMB']))
+        for phase in best['phases']:
+            print('    {:<12} {:>8.3f} 秒'.format(phase['label'], phase['seconds']))
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print('结果已保存: {}'.format(args.output))
+
+    regressed = compare_with_baseline(results, args.baseline, args.tolerance) if args.baseline else False
+    return 1 if failed or regressed else 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
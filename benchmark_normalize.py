@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+维度键标准化性能测试
+
+对比旧实现（每次调用 import re + 未编译的 re.sub）与当前实现
+（str.translate 删除表 + 记忆化缓存）构建维度键的每行耗时。
+
+测试数据模拟真实明细：百万行级别，但维度值只有几十种（险种、渠道等）。
+
+使用方法:
+    python benchmark_normalize.py [行数]
+"""
+
+import random
+import sys
+import time
+
+from excel_compare_web import ExcelCompareService, _normalize_text
+
+
+def legacy_normalize_string(s):
+    """旧版 _normalize_string 实现（用于对比）"""
+    import re
+    if s is None:
+        return ''
+    s = str(s).strip()
+    s = s.replace(' ', '')
+    s = s.replace('_', '')
+    s = re.sub(r'[()（）\[\]【】]', '', s)
+    return s.lower()
+
+
+def legacy_normalize_dimension_key(key_values):
+    """旧版 _normalize_dimension_key 实现（用于对比）"""
+    normalized = []
+    for val in key_values:
+        normalized.append(legacy_normalize_string(val))
+    return tuple(normalized)
+
+
+def make_rows(row_count, seed=20260101):
+    """生成维度键行：险种 × 渠道 × 机构，带下划线、空格、括号等变体"""
+    random.seed(seed)
+    products = ['车险', '车_险', '健康险', '意外险（短期）', '意外险【短期】', '寿险 A', '寿险A',
+                '财产险', '重疾险', 'Term_Life', 'Term Life (Group)']
+    channels = ['银行', '电销', '代理', '网销', '直销', '经代(个人)', '经代_团体']
+    branches = ['分公司{:02d}'.format(i) for i in range(30)] + [1001, 1002, 1003, None]
+    return [
+        (random.choice(products), random.choice(channels), random.choice(branches))
+        for _ in range(row_count)
+    ]
+
+
+def run_benchmark(rows):
+    handler = ExcelCompareService()
+
+    start = time.perf_counter()
+    legacy_keys = [legacy_normalize_dimension_key(row) for row in rows]
+    legacy_cost = time.perf_counter() - start
+
+    _normalize_text.cache_clear()
+    start = time.perf_counter()
+    current_keys = [handler._normalize_dimension_key(row) for row in rows]
+    current_cost = time.perf_counter() - start
+
+    if legacy_keys != current_keys:
+        print('✗ 新旧实现的标准化结果不一致!')
+        sys.exit(1)
+
+    cache_info = _normalize_text.cache_info()
+    row_count = len(rows)
+    print('=' * 60)
+    print('维度键标准化性能测试')
+    print('=' * 60)
+    print('行数: {}，每行维度列: {}'.format(row_count, len(rows[0]) if rows else 0))
+    print('旧实现: {:.3f} 秒，每行 {:.2f} 微秒'.format(legacy_cost, legacy_cost / row_count * 1e6))
+    print('新实现: {:.3f} 秒，每行 {:.2f} 微秒'.format(current_cost, current_cost / row_count * 1e6))
+    print('加速比: {:.1f}x'.format(legacy_cost / current_cost if current_cost else float('inf')))
+    print('缓存: 命中 {}，未命中 {}，条目 {}'.format(cache_info.hits, cache_info.misses, cache_info.currsize))
+    print('✓ 新旧实现结果一致')
+
+
+def main():
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    run_benchmark(make_rows(row_count))
+
+
+if __name__ == '__main__':
+    main()
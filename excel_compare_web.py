@@ -7,14 +7,40 @@ Python 3.7.1 兼容
 """
 
 import os
+import re
 import sys
+import csv
 import json
-import webbrowser
+import codecs
+import argparse
 import threading
 import subprocess
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import datetime
+import time
+import uuid
+import hashlib
+import logging
+import math
+import pickle
+import shutil
+import tempfile
+import multiprocessing
+from copy import copy
+from operator import itemgetter
+from itertools import islice, chain
+from functools import lru_cache, wraps
+from collections import OrderedDict, Counter, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import parse_qs, unquote
 from decimal import Decimal, ROUND_HALF_UP
+from logging.handlers import RotatingFileHandler
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows 没有 resource 模块，峰值内存通过 psapi 获取
 
 # 设置标准输出编码为UTF-8（解决Windows控制台中文输出问题）
 if sys.platform == 'win32':
@@ -33,6 +59,7 @@ os.environ['PYTHONIOENCODING'] = 'utf-8'
 
 try:
     from openpyxl import Workbook, load_workbook
+    from openpyxl.cell import WriteOnlyCell
     from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
     from openpyxl.utils import get_column_letter
     OPENPYXL_OK = True
@@ -45,10 +72,790 @@ try:
 except ImportError:
     XLRD_OK = False
 
+try:
+    import numpy as np
+    NUMPY_OK = True
+except ImportError:
+    NUMPY_OK = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+    PYARROW_OK = True
+except ImportError:
+    PYARROW_OK = False
+
 # 全局配置
 WORK_DIR = os.getcwd()
 PORT = 9527
 
+# 表头探测：读取的样本数据行数、每列返回的样本值个数、缓存的文件数
+HEADER_PROBE_ROWS = 20
+HEADER_PROBE_SAMPLES = 3
+HEADER_PROBE_CACHE_SIZE = 64
+
+# 表头探测缓存：(绝对路径, 大小, 修改时间) -> 探测结果
+_header_probe_cache = OrderedDict()
+_header_probe_lock = threading.Lock()
+
+# 同时执行的比对任务数上限（其余比对排队，不影响打开文件/目录等轻量请求）
+COMPARE_WORKERS = max(1, min(4, os.cpu_count() or 1))
+_compare_executor = ThreadPoolExecutor(max_workers=COMPARE_WORKERS, thread_name_prefix='compare')
+
+# 已解析表格缓存的内存预算（MB），可通过环境变量 EXCEL_COMPARE_CACHE_MB 调整，0 表示禁用
+TABLE_CACHE_MB = int(os.environ.get('EXCEL_COMPARE_CACHE_MB', 512))
+
+
+class TableCache:
+    """已解析表格的进程级缓存（LRU，按内存预算淘汰）
+    
+    键为 (绝对路径, 文件大小, 修改时间, sheet)，文件被修改后自然失效。
+    值为 _read_source_sheet 格式的源数据（流式读取时不含样式，styles 为 None）。
+    同一文件在多次操作（解析表头、比对等）之间只需解析一次。
+    """
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (source, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def make_key(file_path, sheet=None):
+        """构建缓存键，sheet为None表示活动sheet"""
+        stat = os.stat(file_path)
+        return (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, sheet)
+    
+    @staticmethod
+    def estimate_row_size(row):
+        """估算一行数据占用的内存字节数"""
+        return sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row if v is not None)
+    
+    @staticmethod
+    def estimate_object_size(obj, depth=3):
+        """估算对象（含属性和元素，向下depth层）占用的内存字节数，用于样式对象等嵌套结构"""
+        size = sys.getsizeof(obj)
+        if depth <= 0 or obj is None or isinstance(obj, (str, bytes, int, float, bool)):
+            return size
+        if isinstance(obj, (tuple, list)):
+            return size + sum(TableCache.estimate_object_size(item, depth - 1) for item in obj)
+        attrs = getattr(obj, '__dict__', None)
+        if attrs:
+            size += sys.getsizeof(attrs) + sum(
+                TableCache.estimate_object_size(value, depth - 1) for value in attrs.values() if value is not None)
+        return size
+    
+    def get(self, key):
+        """返回缓存的源数据或 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, key, source, size):
+        """放入缓存，超出预算时淘汰最久未使用的表格；单表超出预算则不缓存"""
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (source, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted[1]
+                self.evictions += 1
+        return True
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'maxBytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+_table_cache = TableCache(TABLE_CACHE_MB * 1024 * 1024)
+
+# 比对耗时直方图的桶上限（秒）
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+class MetricsRegistry:
+    """进程内运行指标（计数器和直方图），GET /metrics 以Prometheus文本格式导出
+    
+    只记录汇总数值，不依赖 prometheus_client；缓存、任务等当前状态在导出时读取（见 _render_metrics）。
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = OrderedDict()  # 指标名 -> (类型, 说明)
+        self._counters = OrderedDict()  # (指标名, 标签) -> 值
+        self._histograms = OrderedDict()  # (指标名, 标签) -> [各桶计数, 总和, 次数]
+        self._buckets = {}
+    
+    def describe(self, name, kind, help_text, buckets=None):
+        self._meta[name] = (kind, help_text)
+        if buckets is not None:
+            self._buckets[name] = buckets
+    
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        buckets = self._buckets[name]
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+    
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ''
+        parts = []
+        for k, v in labels:
+            v = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            parts.append('{}="{}"'.format(k, v))
+        return '{' + ','.join(parts) + '}'
+    
+    @staticmethod
+    def _format_value(value):
+        # 浮点累加值保留6位小数，避免输出二进制舍入误差
+        return repr(round(value, 6)) if isinstance(value, float) else str(value)
+    
+    def render(self, gauges=()):
+        """导出为Prometheus文本格式；gauges 为当前状态 [(指标名, 类型, 说明, [(标签, 值), ...]), ...]"""
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = [(key, (list(e[0]), e[1], e[2])) for key, e in self._histograms.items()]
+        
+        lines = []
+        for name, (kind, help_text) in self._meta.items():
+            lines.append('# HELP {} {}'.format(name, help_text))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            if kind == 'histogram':
+                buckets = self._buckets[name]
+                for (metric, labels), (counts, total, count) in histograms:
+                    if metric != name:
+                        continue
+                    for bound, bucket_count in zip(buckets, counts):
+                        lines.append('{}_bucket{} {}'.format(
+                            name, self._format_labels(labels + (('le', bound),)), bucket_count))
+                    lines.append('{}_bucket{} {}'.format(name, self._format_labels(labels + (('le', '+Inf'),)), count))
+                    lines.append('{}_sum{} {}'.format(name, self._format_labels(labels), self._format_value(total)))
+                    lines.append('{}_count{} {}'.format(name, self._format_labels(labels), count))
+            else:
+                for (metric, labels), value in counters:
+                    if metric == name:
+                        lines.append('{}{} {}'.format(name, self._format_labels(labels), self._format_value(value)))
+        for name, kind, help_text, samples in gauges:
+            lines.append('# HELP {} {}'.format(name, help_text))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            for labels, value in samples:
+                lines.append('{}{} {}'.format(name, self._format_labels(tuple(sorted(labels.items()))),
+                                              self._format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+_metrics = MetricsRegistry()
+_metrics.describe('excel_compare_requests_total', 'counter', '按操作统计的HTTP请求数')
+_metrics.describe('excel_compare_request_failures_total', 'counter', '返回失败结果的请求数')
+_metrics.describe('excel_compare_duration_seconds', 'histogram', '比对总耗时（秒）', DURATION_BUCKETS)
+_metrics.describe('excel_compare_phase_seconds_total', 'counter', '比对各阶段累计耗时（秒）')
+_metrics.describe('excel_compare_rows_read_total', 'counter', '比对实际解析的输入行数（含表头和空行，缓存命中不计）')
+_metrics.describe('excel_compare_cells_read_total', 'counter', '比对实际解析的输入单元格数（缓存命中不计）')
+_metrics.describe('excel_compare_bytes_read_total', 'counter', '实际解析的输入文件字节数（缓存命中不计）')
+_metrics.describe('excel_compare_bytes_written_total', 'counter', '写出的结果文件字节数')
+_metrics.describe('excel_compare_header_probe_cache_total', 'counter', '表头探测缓存的命中/未命中次数')
+_metrics.describe('excel_compare_in_progress', 'gauge', '正在执行的比对数（同步请求和后台任务）')
+
+# 并行读取：输入文件合计超过阈值（MB）时，各文件在独立子进程中解析，
+# 子进程只回传紧凑的行数据（元组列表）；小文件启动子进程不划算，仍在当前线程流式读取。
+# 阈值可通过环境变量 EXCEL_COMPARE_PARALLEL_MB 调整，LOAD_WORKERS 为 1 时禁用并行读取
+LOAD_WORKERS = max(1, min(3, os.cpu_count() or 1))
+PARALLEL_LOAD_MIN_MB = float(os.environ.get('EXCEL_COMPARE_PARALLEL_MB', 2))
+
+_load_executor = None
+_load_executor_lock = threading.Lock()
+
+
+def _get_load_executor():
+    """按需创建读取/聚合用的进程池（spawn方式，Windows与打包后的exe行为一致）"""
+    global _load_executor
+    with _load_executor_lock:
+        if _load_executor is None:
+            _load_executor = ProcessPoolExecutor(
+                max_workers=LOAD_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _load_executor
+
+
+def _reset_load_executor():
+    """丢弃已损坏的进程池（子进程异常退出时），下次使用时重新创建"""
+    global _load_executor
+    with _load_executor_lock:
+        executor, _load_executor = _load_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def _worker_call(method_name, *args):
+    """子进程入口：实例化比对服务并调用指定方法（参数和返回值需可pickle）"""
+    return getattr(ExcelCompareService(), method_name)(*args)
+
+
+# 批量比对：同时执行的比对数（每组比对在独立子进程中执行），可通过环境变量调整
+BATCH_WORKERS = int(os.environ.get('EXCEL_COMPARE_BATCH_WORKERS', max(1, min(4, os.cpu_count() or 1))))
+BATCH_ACTIONS = {
+    'compare': ('run_compare', ('baseFile', 'dataAFile', 'dataBFile')),
+    'dimension_compare': ('run_dimension_compare', ('tableAFile', 'tableBFile')),
+    'aggregate_compare': ('run_aggregate_compare', ('tableAFile', 'tableBFile')),
+}
+
+
+def _batch_worker_init():
+    """批量比对子进程初始化：比对之间已并行，子进程内不再启动读取进程池"""
+    global LOAD_WORKERS
+    LOAD_WORKERS = 1
+
+
+def _cache_shared_input(key, source):
+    """把共享输入放入 _table_cache；超出缓存预算放不进去时记录警告（各组比对会各自重新解析）"""
+    if not _table_cache.put(key, source, source['size']):
+        _logger.warning('共享输入 %s 约 %.1f MB，超出表格缓存预算 %.1f MB，各组比对将各自重新解析',
+                        key[0], source['size'] / 1048576, _table_cache.max_bytes / 1048576)
+        return False
+    return True
+
+
+def _load_batch_shared_inputs(shared_inputs):
+    """子进程中载入本组比对用到的共享输入（主进程落盘的 pickle），同一子进程内只载入一次"""
+    for key, spill_path in shared_inputs:
+        if _table_cache.get(key) is not None:
+            continue
+        with open(spill_path, 'rb') as f:
+            source = pickle.load(f)
+        _cache_shared_input(key, source)
+
+
+def _batch_worker_run(job, shared_inputs=()):
+    """执行批量比对中的一组比对，只返回汇总需要的字段（避免回传列对齐方案等大对象）"""
+    method_name = BATCH_ACTIONS[job['action']][0]
+    try:
+        _load_batch_shared_inputs(shared_inputs)
+        result = getattr(ExcelCompareService(), method_name)(job)
+    except Exception as e:
+        result = {'success': False, 'message': str(e)}
+    return {
+        'success': bool(result.get('success')),
+        'message': result.get('message', ''),
+        'summary': result.get('summary'),
+        'seconds': (result.get('performance') or {}).get('totalSeconds'),
+    }
+
+
+# 后台任务：阶段名称、保留的历史任务数、进度上报间隔（行）
+JOB_PHASES = {
+    'queued': '排队中',
+    'preparing': '准备',
+    'reading_base': '读取基准文件',
+    'reading_a': '读取表A',
+    'reading_b': '读取表B',
+    'matching': '匹配比对',
+    'aggregating': '聚合',
+    'writing': '写入结果',
+    'copying': '复制源文件',
+    'saving': '保存文件',
+    'reading_shared': '读取共享输入',
+    'batch': '批量比对',
+    'done': '完成',
+    'failed': '失败',
+    'cancelled': '已取消',
+}
+JOB_HISTORY_SIZE = 100
+PROGRESS_INTERVAL = 1000
+
+# 日志：服务器启动后写入轮转日志文件（请求记录、每次比对的各阶段耗时），
+# 单个文件最大 LOG_MAX_MB，保留 LOG_BACKUP_COUNT 个旧文件；路径可通过环境变量调整
+LOG_FILE = os.environ.get('EXCEL_COMPARE_LOG', os.path.join(WORK_DIR, 'excel_compare.log'))
+LOG_MAX_MB = 5
+LOG_BACKUP_COUNT = 3
+
+_logger = logging.getLogger('excel_compare')
+_logger.addHandler(logging.NullHandler())
+
+# 维度比对时每批计算差异的行数（向量化引擎按块处理已匹配行）
+DIFF_CHUNK_ROWS = 5000
+
+# 聚合比对：每块的行数；累计行数达到阈值时，各块交给进程池分别聚合后按块顺序合并
+AGGREGATE_CHUNK_ROWS = 50000
+AGGREGATE_PARALLEL_MIN_ROWS = 200000
+
+
+def _add_exact(partials, x):
+    """把x精确累加到部分和列表（Shewchuk算法，math.fsum 使用的同一方法）
+    
+    partials 为互不重叠、按绝对值递增的部分和，math.fsum(partials) 即总和的正确舍入值，
+    与累加顺序无关。出现inf/nan时只追加，由 _exact_total 按普通求和处理。
+    """
+    if not math.isfinite(x) or not all(map(math.isfinite, partials)):
+        partials.append(x)
+        return
+    i = 0
+    for y in partials:
+        if abs(x) < abs(y):
+            x, y = y, x
+        hi = x + y
+        lo = y - (hi - x)
+        if lo:
+            partials[i] = lo
+            i += 1
+        x = hi
+    partials[i:] = [x]
+
+
+def _exact_total(partials):
+    """部分和列表的总和（只有一项时原样返回，保留整数0等类型）"""
+    if len(partials) == 1:
+        return partials[0]
+    try:
+        return math.fsum(partials)
+    except (ValueError, OverflowError):
+        return sum(partials)  # inf与-inf相加等情况，与普通累加一致
+
+# 嵌入结果的源文件sheet格式：full 保留源格式，values 只写值（不匹配行仍标红），
+# auto 在源表超过 SOURCE_VALUES_ONLY_ROWS 行时只写值；阈值可通过环境变量调整，0 表示始终保留格式
+SOURCE_FORMATS = ('auto', 'full', 'values')
+SOURCE_VALUES_ONLY_ROWS = int(os.environ.get('EXCEL_COMPARE_VALUES_ONLY_ROWS', 100000))
+
+# 源数据输出策略：embed 嵌入完整副本，unmatched 只嵌入表头和不匹配（标红）的行，
+# manifest 只写一张清单sheet（文件路径、大小、修改时间、SHA256、行数），适合源文件已另行归档的场景
+SOURCE_OUTPUTS = ('embed', 'unmatched', 'manifest')
+
+# 字符串标准化：删除空格、下划线和中英文括号；记忆化缓存的最大条目数
+_NORMALIZE_TABLE = str.maketrans('', '', ' _()（）[]【】')
+NORMALIZE_CACHE_SIZE = 65536
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _normalize_text(s):
+    """标准化字符串（带缓存）：维度值大量重复时只计算一次"""
+    return s.strip().translate(_NORMALIZE_TABLE).lower()
+
+
+# CSV/TSV输入：扩展名对应的分隔符、编码检测读取的字节数
+FLAT_FILE_DELIMITERS = {'.csv': ',', '.tsv': '\t'}
+TEXT_SNIFF_BYTES = 64 * 1024
+
+# CSV/TSV字段转换为数值的格式：整数最多15位（更长的如证件号、账号保留为文本），
+# 前导0的编码（如机构号 0101）保留为文本
+_FLAT_INT = re.compile(r'-?(?:0|[1-9][0-9]{0,14})$')
+_FLAT_FLOAT = re.compile(r'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+(?:[eE][+-]?[0-9]+)?|[eE][+-]?[0-9]+)$')
+
+
+def _parse_flat_value(text):
+    """把CSV/TSV字段转换为与Excel单元格一致的值：空字段为None，数值为int/float，其余保留文本"""
+    if not text:
+        return None
+    if text[0] in '-0123456789':
+        if _FLAT_INT.match(text):
+            return int(text)
+        if _FLAT_FLOAT.match(text):
+            return float(text)
+    return text
+
+
+# Parquet/Arrow IPC输入（需安装pyarrow）：按记录批次读取，每批转换为行；差异表Parquet输出的每批行数
+# （.arrows 为IPC流格式；排在 .arrow 之前，_table_name 去扩展名时先匹配较长的）
+COLUMNAR_EXTENSIONS = ('.parquet', '.arrows', '.arrow', '.feather', '.ipc')
+COLUMNAR_BATCH_ROWS = 65536
+
+
+class JobCancelled(Exception):
+    """后台任务已被取消"""
+
+
+class CompareJob:
+    """后台比对任务：记录状态、当前阶段、处理行数，支持取消"""
+    
+    def __init__(self, action):
+        self.id = uuid.uuid4().hex[:12]
+        self.action = action
+        self.status = 'queued'  # queued / running / done / failed / cancelled
+        self.phase = 'queued'
+        self.rows_done = 0
+        self.rows_total = None
+        self.created_at = time.time()
+        self.phase_started_at = self.created_at
+        self.finished_at = None
+        self.result = None
+        self.cancel_event = threading.Event()
+    
+    def set_phase(self, phase):
+        self.phase = phase
+        self.phase_started_at = time.time()
+        self.rows_done = 0
+        self.rows_total = None
+    
+    def finish(self, status, result):
+        self.status = status
+        self.phase = status
+        self.result = result
+        self.finished_at = time.time()
+    
+    def eta(self):
+        """按当前阶段的处理速度估算剩余秒数，总行数未知时返回None"""
+        if not self.rows_total or not self.rows_done or self.status != 'running':
+            return None
+        elapsed = time.time() - self.phase_started_at
+        remaining = max(self.rows_total - self.rows_done, 0)
+        return round(elapsed / self.rows_done * remaining, 1)
+    
+    def to_dict(self):
+        end = self.finished_at or time.time()
+        return {
+            'jobId': self.id,
+            'action': self.action,
+            'status': self.status,
+            'phase': self.phase,
+            'phaseLabel': JOB_PHASES.get(self.phase, self.phase),
+            'rowsDone': self.rows_done,
+            'rowsTotal': self.rows_total,
+            'eta': self.eta(),
+            'elapsed': round(end - self.created_at, 1),
+            'result': self.result
+        }
+
+
+_jobs = OrderedDict()  # job id -> CompareJob
+_jobs_lock = threading.Lock()
+_job_local = threading.local()
+
+
+def _register_job(job):
+    """登记新任务，超出保留数量时丢弃最早的已结束任务"""
+    with _jobs_lock:
+        _jobs[job.id] = job
+        finished = [jid for jid, j in _jobs.items() if j.finished_at is not None]
+        for jid in finished[:max(len(_jobs) - JOB_HISTORY_SIZE, 0)]:
+            del _jobs[jid]
+
+
+def _get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def _report_progress(phase=None, rows=0, total=None):
+    """上报当前线程所执行任务的进度，并检查是否已取消
+    
+    切换阶段时同时记入当前线程的阶段计时（PhaseTimer）；
+    其余进度不在后台任务中执行时（如同步API调用）不做任何事。
+    """
+    timer = getattr(_job_local, 'timer', None)
+    if timer is not None:
+        if phase is not None:
+            timer.enter(phase)
+        elif rows:
+            timer.sample()
+    job = getattr(_job_local, 'job', None)
+    if job is None:
+        return
+    if job.cancel_event.is_set():
+        raise JobCancelled('任务已取消')
+    if phase is not None:
+        job.set_phase(phase)
+    if total is not None:
+        job.rows_total = total
+    job.rows_done += rows
+
+
+def _process_memory_counters():
+    """Windows 下当前进程的 PROCESS_MEMORY_COUNTERS，其他平台或获取失败时返回None"""
+    if sys.platform != 'win32':
+        return None
+    try:
+        import ctypes
+        from ctypes import wintypes
+        
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage',
+                    'QuotaPagedPoolUsage', 'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage',
+                    'PagefileUsage', 'PeakPagefileUsage')
+            ]
+        
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters
+    except Exception:
+        pass
+    return None
+
+
+def _peak_rss_mb():
+    """当前进程的峰值常驻内存（MB，进程启动以来的最高值），无法获取时返回None"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 上 ru_maxrss 单位为KB，macOS 上为字节
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    counters = _process_memory_counters()
+    if counters is not None:
+        return round(counters.PeakWorkingSetSize / (1024 * 1024), 1)
+    return None
+
+
+def _current_rss_mb():
+    """当前进程此刻的常驻内存（MB）：Linux 读 /proc/self/statm，Windows 取 WorkingSetSize，其他平台返回None"""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return round(resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    counters = _process_memory_counters()
+    if counters is not None:
+        return round(counters.WorkingSetSize / (1024 * 1024), 1)
+    return None
+
+
+def _metrics_mode():
+    """当前线程正在执行的比对模式（用于指标标签），不在比对中时为 other"""
+    timer = getattr(_job_local, 'timer', None)
+    return timer.action if timer is not None else 'other'
+
+
+def _record_rows_read(rows, cells):
+    mode = _metrics_mode()
+    _metrics.inc('excel_compare_rows_read_total', rows, mode=mode)
+    _metrics.inc('excel_compare_cells_read_total', cells, mode=mode)
+
+
+def _record_file_bytes(metric, path, **labels):
+    """把文件大小计入字节数指标（文件不存在时忽略）"""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return
+    _metrics.inc(metric, size, **labels)
+
+
+def _file_format(path):
+    return os.path.splitext(path.lower())[1].lstrip('.') or 'unknown'
+
+
+class PhaseTimer:
+    """比对各阶段的耗时记录：墙钟时间、当前线程的CPU时间、常驻内存
+    
+    阶段由 _report_progress(phase) 切换。常驻内存在阶段切换和进度上报时采样当前值，
+    每个阶段记录结束时的内存（rssMB）、相对阶段开始的变化（rssDeltaMB）和阶段内采样到的最高值（maxRssMB）；
+    无法获取当前内存的平台上这三项为None。
+    """
+    
+    def __init__(self, action, sheet=False):
+        self.action = action
+        self.sheet = sheet  # 是否在结果中写入“性能”sheet
+        self.phases = []
+        self._started = time.perf_counter()
+        self._cpu_started = time.thread_time()
+        self._current = None
+        self._max_rss = None
+        self.enter('preparing')
+    
+    def enter(self, phase):
+        rss = self._close()
+        if rss is None:
+            rss = _current_rss_mb()
+        # [阶段, 墙钟开始, CPU开始, 开始时内存, 阶段内最高内存]
+        self._current = [phase, time.perf_counter(), time.thread_time(), rss, rss]
+    
+    def sample(self):
+        """在阶段中途采样当前内存，更新阶段内最高值"""
+        if self._current is None or self._current[3] is None:
+            return
+        rss = _current_rss_mb()
+        if rss is not None and rss > self._current[4]:
+            self._current[4] = rss
+    
+    def _phase_record(self):
+        phase, wall_start, cpu_start, rss_start, rss_max = self._current
+        rss = _current_rss_mb()
+        if rss is not None and rss_start is not None:
+            rss_delta = round(rss - rss_start, 1)
+            rss_max = max(rss_max, rss)
+        else:
+            rss_delta = rss_max = None
+        return {
+            'phase': phase,
+            'label': JOB_PHASES.get(phase, phase),
+            'seconds': round(time.perf_counter() - wall_start, 4),
+            'cpuSeconds': round(time.thread_time() - cpu_start, 4),
+            'rssMB': rss,
+            'rssDeltaMB': rss_delta,
+            'maxRssMB': rss_max
+        }
+    
+    def _close(self):
+        """结束当前阶段，返回结束时的内存（作为下一阶段的开始值）"""
+        if self._current is None:
+            return None
+        record = self._phase_record()
+        self._current = None
+        self.phases.append(record)
+        if record['maxRssMB'] is not None:
+            self._max_rss = max(self._max_rss or 0, record['maxRssMB'])
+        return record['rssMB']
+    
+    def snapshot(self):
+        """到目前为止的计时（当前阶段计算到此刻，不结束）"""
+        phases = list(self.phases)
+        if self._current is not None:
+            phases.append(self._phase_record())
+        max_rss = [p['maxRssMB'] for p in phases if p['maxRssMB'] is not None]
+        return {
+            'totalSeconds': round(time.perf_counter() - self._started, 4),
+            'cpuSeconds': round(time.thread_time() - self._cpu_started, 4),
+            'maxRssMB': max(max_rss) if max_rss else None,
+            'peakRssMB': _peak_rss_mb(),
+            'phases': phases
+        }
+    
+    def finish(self):
+        self._close()
+        return self.snapshot()
+
+
+def _instrumented(action):
+    """比对入口的装饰器：按阶段计时，结果中附带 performance，并写入日志
+    
+    请求参数 performanceSheet 为真时，结果文件中额外写入“性能”sheet（见 _write_performance_sheet）。
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, data):
+            timer = PhaseTimer(action, sheet=bool(data.get('performanceSheet', False)))
+            outer = getattr(_job_local, 'timer', None)
+            _job_local.timer = timer
+            _metrics.inc('excel_compare_in_progress', mode=action)
+            try:
+                result = method(self, data)
+            except JobCancelled as e:
+                # 任务取消是正常结果，部分写入的结果文件已由各生成函数清理
+                result = {'success': False, 'message': str(e), 'cancelled': True}
+            finally:
+                _job_local.timer = outer
+                _metrics.inc('excel_compare_in_progress', -1, mode=action)
+            performance = timer.finish()
+            result['performance'] = performance
+            status = 'cancelled' if result.get('cancelled') else 'success' if result.get('success') else 'failure'
+            _metrics.observe('excel_compare_duration_seconds', performance['totalSeconds'], mode=action,
+                             status=status)
+            for phase in performance['phases']:
+                _metrics.inc('excel_compare_phase_seconds_total', phase['seconds'], mode=action, phase=phase['phase'])
+            _logger.info('%s %s: 总耗时 %.3fs, CPU %.3fs, 比对期间最高内存 %s MB, 进程峰值内存 %s MB | %s', action,
+                         {'success': '完成', 'failure': '失败', 'cancelled': '已取消'}[status],
+                         performance['totalSeconds'], performance['cpuSeconds'], performance['maxRssMB'],
+                         performance['peakRssMB'],
+                         ', '.join('{} {:.3f}s {:+}MB'.format(p['phase'], p['seconds'], p['rssDeltaMB'] or 0)
+                                   for p in performance['phases']))
+            return result
+        return wrapper
+    return decorator
+
+
+def _setup_logging():
+    """把日志写入轮转文件（服务器启动时调用），无法写入时只打印提示"""
+    try:
+        handler = RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_MB * 1024 * 1024,
+                                      backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    except OSError as e:
+        print('[警告] 无法写入日志文件 {}: {}'.format(LOG_FILE, e))
+        return False
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(threadName)s] %(message)s'))
+    _logger.addHandler(handler)
+    _logger.setLevel(logging.INFO)
+    return True
+
+
+def _render_metrics():
+    """导出全部指标：累计的计数器/直方图，以及缓存、后台任务的当前状态"""
+    cache = _table_cache.stats()
+    with _jobs_lock:
+        job_statuses = [job.status for job in _jobs.values()]
+    normalize = _normalize_text.cache_info()
+    gauges = [
+        ('excel_compare_table_cache_hits_total', 'counter', '表格缓存命中次数', [({}, cache['hits'])]),
+        ('excel_compare_table_cache_misses_total', 'counter', '表格缓存未命中次数', [({}, cache['misses'])]),
+        ('excel_compare_table_cache_evictions_total', 'counter', '表格缓存淘汰次数', [({}, cache['evictions'])]),
+        ('excel_compare_table_cache_entries', 'gauge', '表格缓存中的表格数', [({}, cache['entries'])]),
+        ('excel_compare_table_cache_bytes', 'gauge', '表格缓存估算占用字节数', [({}, cache['bytes'])]),
+        ('excel_compare_normalize_cache_hits_total', 'counter', '维度值标准化缓存命中次数',
+         [({}, normalize.hits)]),
+        ('excel_compare_normalize_cache_misses_total', 'counter', '维度值标准化缓存未命中次数',
+         [({}, normalize.misses)]),
+        ('excel_compare_jobs', 'gauge', '按状态统计的后台任务数（含保留的已结束任务）',
+         [({'status': status}, job_statuses.count(status))
+          for status in ('queued', 'running', 'done', 'failed', 'cancelled')]),
+        ('excel_compare_jobs_in_flight', 'gauge', '排队中和执行中的后台任务数',
+         [({}, sum(1 for status in job_statuses if status in ('queued', 'running')))]),
+        ('excel_compare_process_peak_rss_megabytes', 'gauge', '进程峰值常驻内存（MB）',
+         [({}, _peak_rss_mb() or 0)]),
+        ('excel_compare_process_rss_megabytes', 'gauge', '进程当前常驻内存（MB）',
+         [({}, _current_rss_mb() or 0)]),
+    ]
+    return _metrics.render(gauges)
+
+
+def _run_job(job, func, data):
+    """在比对线程池中执行后台任务"""
+    if job.cancel_event.is_set():
+        job.finish('cancelled', {'success': False, 'message': '任务已取消'})
+        return
+    job.status = 'running'
+    _job_local.job = job
+    try:
+        result = func(data)
+    except Exception as e:
+        result = {'success': False, 'message': str(e)}
+    finally:
+        _job_local.job = None
+    
+    if job.cancel_event.is_set() and not result.get('success'):
+        job.finish('cancelled', {'success': False, 'message': '任务已取消'})
+    else:
+        job.finish('done' if result.get('success') else 'failed', result)
+
 HTML_TEMPLATE = '''<!DOCTYPE html>
 <html>
 <head>
@@ -213,6 +1020,10 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
             color: #333;
             font-weight: 500;
         }
+        .loading-cancel {
+            margin-top: 20px;
+            padding: 8px 20px;
+        }
         
         /* 多选框样式 */
         .multiselect-container {
@@ -238,6 +1049,14 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
         .multiselect-option input[type="checkbox"] {
             margin-right: 8px;
         }
+        .col-type {
+            margin-left: 6px;
+            padding: 0 5px;
+            border-radius: 3px;
+            background: #eef1ff;
+            color: #667eea;
+            font-size: 12px;
+        }
         .column-selection-row {
             display: grid;
             grid-template-columns: 1fr 1fr;
@@ -284,21 +1103,21 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
                 <div class="form-row">
                     <label>上传基准文件:</label>
                     <div class="file-input-wrapper">
-                        <input type="text" id="baseFile" placeholder="选择基准匹配列文件 (.xlsx)">
+                        <input type="text" id="baseFile" placeholder="选择基准匹配列文件 (.xlsx, .xls, .csv, .tsv, .parquet)">
                         <button class="btn-browse" onclick="browseFile('baseFile')">选择文件</button>
                     </div>
                 </div>
                 <div class="form-row">
                     <label>上传输入1文件:</label>
                     <div class="file-input-wrapper">
-                        <input type="text" id="dataAFile" placeholder="选择输入1数据文件 (.xlsx)">
+                        <input type="text" id="dataAFile" placeholder="选择输入1数据文件 (.xlsx, .xls, .csv, .tsv, .parquet)">
                         <button class="btn-browse" onclick="browseFile('dataAFile')">选择文件</button>
                     </div>
                 </div>
                 <div class="form-row">
                     <label>上传输入2文件:</label>
                     <div class="file-input-wrapper">
-                        <input type="text" id="dataBFile" placeholder="选择输入2数据文件 (.xlsx)">
+                        <input type="text" id="dataBFile" placeholder="选择输入2数据文件 (.xlsx, .xls, .csv, .tsv, .parquet)">
                         <button class="btn-browse" onclick="browseFile('dataBFile')">选择文件</button>
                     </div>
                 </div>
@@ -358,14 +1177,14 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
                 <div class="form-row">
                     <label>上传表A文件:</label>
                     <div class="file-input-wrapper">
-                        <input type="text" id="tableAFile" placeholder="选择表A数据文件 (.xlsx)">
+                        <input type="text" id="tableAFile" placeholder="选择表A数据文件 (.xlsx, .xls, .csv, .tsv, .parquet)">
                         <button class="btn-browse" onclick="browseFile2('tableAFile')">选择文件</button>
                     </div>
                 </div>
                 <div class="form-row">
                     <label>上传基准表（表B）:</label>
                     <div class="file-input-wrapper">
-                        <input type="text" id="tableBFile" placeholder="选择基准表数据文件 (.xlsx)">
+                        <input type="text" id="tableBFile" placeholder="选择基准表数据文件 (.xlsx, .xls, .csv, .tsv, .parquet)">
                         <button class="btn-browse" onclick="browseFile2('tableBFile')">选择文件</button>
                     </div>
                 </div>
@@ -424,14 +1243,14 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
                 <div class="form-row">
                     <label>表A文件:</label>
                     <div class="file-input-wrapper">
-                        <input type="text" id="aggTableAFile" placeholder="选择表A文件 (.xlsx, .xls)">
+                        <input type="text" id="aggTableAFile" placeholder="选择表A文件 (.xlsx, .xls, .csv, .tsv, .parquet)">
                         <button class="btn-browse" onclick="browseFile('aggTableAFile')">选择文件</button>
                     </div>
                 </div>
                 <div class="form-row">
                     <label>表B文件:</label>
                     <div class="file-input-wrapper">
-                        <input type="text" id="aggTableBFile" placeholder="选择表B文件 (.xlsx, .xls)">
+                        <input type="text" id="aggTableBFile" placeholder="选择表B文件 (.xlsx, .xls, .csv, .tsv, .parquet)">
                         <button class="btn-browse" onclick="browseFile('aggTableBFile')">选择文件</button>
                     </div>
                 </div>
@@ -522,7 +1341,11 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
             document.getElementById('loadingOverlay').classList.remove('show');
         }
         
-        async function api(action, data) {
+        function setLoadingText(text) {
+            document.querySelector('#loadingOverlay .loading-text').textContent = text;
+        }
+        
+        async function post(action, data) {
             try {
                 const resp = await fetch('/api', {
                     method: 'POST',
@@ -535,6 +1358,55 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
             }
         }
         
+        // 比对类操作以后台任务方式执行：提交后轮询进度，避免长时间挂起单个请求
+        const JOB_ACTIONS = ['compare', 'dimension_compare', 'aggregate_compare'];
+        const JOB_FINISHED = ['done', 'failed', 'cancelled'];
+        let currentJobId = null;
+        
+        function describeJob(job) {
+            let text = job.phaseLabel;
+            if (job.rowsDone) {
+                text += '，已处理 ' + job.rowsDone + (job.rowsTotal ? ' / ' + job.rowsTotal : '') + ' 行';
+            }
+            if (job.eta !== null) {
+                text += '，预计剩余 ' + job.eta + ' 秒';
+            }
+            return text + '（已用时 ' + job.elapsed + ' 秒）';
+        }
+        
+        async function api(action, data) {
+            if (!JOB_ACTIONS.includes(action)) {
+                return await post(action, data);
+            }
+            const submitted = await post('submit_job', {jobAction: action, ...data});
+            if (!submitted.success) {
+                return submitted;
+            }
+            currentJobId = submitted.jobId;
+            try {
+                while (true) {
+                    await new Promise(resolve => setTimeout(resolve, 500));
+                    const status = await post('job_status', {jobId: submitted.jobId});
+                    if (!status.success) {
+                        return status;
+                    }
+                    if (JOB_FINISHED.includes(status.job.status)) {
+                        return status.job.result;
+                    }
+                    setLoadingText(describeJob(status.job));
+                }
+            } finally {
+                currentJobId = null;
+                setLoadingText('正在比对，请稍候...');
+            }
+        }
+        
+        async function cancelJob() {
+            if (!currentJobId) return;
+            log('正在取消任务...');
+            await post('cancel_job', {jobId: currentJobId});
+        }
+        
         // Tab 1 功能（保持不变）
         async function generateTest() {
             log('\\n[指标比对] 生成测试文件...');
@@ -739,6 +1611,19 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
                 log('成功解析表头，共 ' + result.headers.length + ' 列');
                 log('列名: ' + result.headers.join(', '));
                 
+                // 列类型与样本值（用于辅助选择维度列和指标列）
+                const typeNames = {number: '数值', text: '文本', date: '日期', mixed: '混合', empty: '空'};
+                const columnInfo = {};
+                (result.columns || []).forEach(col => { columnInfo[col.name] = col; });
+                const describe = header => {
+                    const info = columnInfo[header];
+                    if (!info) return {tag: '', title: ''};
+                    return {
+                        tag: `<span class="col-type">${typeNames[info.type] || info.type}</span>`,
+                        title: '样本: ' + info.samples.join(', ')
+                    };
+                };
+                
                 // 显示列选择区域
                 document.getElementById('columnSelectionSection').style.display = 'block';
                 
@@ -750,16 +1635,20 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
                 indContainer.innerHTML = '';
                 
                 result.headers.forEach(header => {
+                    const desc = describe(header);
+                    
                     // 维度列选项
                     const dimOption = document.createElement('div');
                     dimOption.className = 'multiselect-option';
-                    dimOption.innerHTML = `<input type="checkbox" value="${header}" onchange="updateDimCheckbox(this)"> ${header}`;
+                    dimOption.title = desc.title;
+                    dimOption.innerHTML = `<input type="checkbox" value="${header}" onchange="updateDimCheckbox(this)"> ${header}${desc.tag}`;
                     dimContainer.appendChild(dimOption);
                     
                     // 指标列选项
                     const indOption = document.createElement('div');
                     indOption.className = 'multiselect-option';
-                    indOption.innerHTML = `<input type="checkbox" value="${header}" onchange="updateIndCheckbox(this)"> ${header}`;
+                    indOption.title = desc.title;
+                    indOption.innerHTML = `<input type="checkbox" value="${header}" onchange="updateIndCheckbox(this)"> ${header}${desc.tag}`;
                     indContainer.appendChild(indOption);
                 });
                 
@@ -929,6 +1818,7 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
         <div class="loading-content">
             <div class="spinner"></div>
             <div class="loading-text">正在比对，请稍候...</div>
+            <button class="btn-secondary loading-cancel" onclick="cancelJob()">取消</button>
         </div>
     </div>
 </body>
@@ -936,11 +1826,11 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
 '''
 
 
-class RequestHandler(BaseHTTPRequestHandler):
-    """HTTP请求处理"""
+class ExcelCompareService:
+    """比对服务：文件读取、比对和结果生成
     
-    def log_message(self, format, *args):
-        pass  # 禁用默认日志
+    不依赖HTTP请求，可在子进程或其他入口中直接实例化使用。
+    """
     
     def _convert_xls_to_xlsx(self, xls_path):
         """将.xls文件转换为临时.xlsx文件
@@ -951,33 +1841,19 @@ class RequestHandler(BaseHTTPRequestHandler):
         Returns:
             临时.xlsx文件路径，如果转换失败则返回None
         """
-        if not XLRD_OK:
-            raise Exception('缺少xlrd库，无法读取.xls文件。请安装xlrd或将文件转换为.xlsx格式')
-        
+        book = self._open_xls(xls_path)
         try:
-            # 使用xlrd读取.xls文件
-            xls_book = xlrd.open_workbook(xls_path, formatting_info=False)
-            xls_sheet = xls_book.sheet_by_index(0)
+            xls_sheet = book.sheet_by_index(0)
             
             # 创建临时.xlsx文件
-            import tempfile
             temp_fd, temp_path = tempfile.mkstemp(suffix='.xlsx')
             os.close(temp_fd)
             
-            # 使用openpyxl写入.xlsx
+            # 使用openpyxl写入.xlsx（逐行复制，日期与直接读取时的处理一致）
             wb = Workbook()
             ws = wb.active
-            
-            # 复制数据
-            for row_idx in range(xls_sheet.nrows):
-                for col_idx in range(xls_sheet.ncols):
-                    cell_value = xls_sheet.cell_value(row_idx, col_idx)
-                    # 处理不同的单元格类型
-                    if xls_sheet.cell_type(row_idx, col_idx) == xlrd.XL_CELL_DATE:
-                        # 日期类型需要特殊处理
-                        from datetime import datetime
-                        cell_value = xlrd.xldate_as_datetime(cell_value, xls_book.datemode)
-                    ws.cell(row=row_idx + 1, column=col_idx + 1, value=cell_value)
+            for row in self._iter_xls_rows(xls_sheet, book.datemode):
+                ws.append(row)
             
             wb.save(temp_path)
             wb.close()
@@ -985,13 +1861,177 @@ class RequestHandler(BaseHTTPRequestHandler):
             
         except Exception as e:
             raise Exception(f'转换.xls文件失败: {str(e)}')
+        finally:
+            book.release_resources()
+    
+    def _is_xls(self, file_path):
+        return os.path.splitext(file_path.lower())[1] == '.xls'
+    
+    def _flat_file_delimiter(self, file_path):
+        """CSV/TSV文件返回分隔符，其他格式返回None"""
+        return FLAT_FILE_DELIMITERS.get(os.path.splitext(file_path.lower())[1])
     
-    def _load_workbook_safe(self, file_path, data_only=True):
+    def _detect_text_encoding(self, file_path):
+        """检测CSV/TSV编码：带BOM或开头部分可按UTF-8解码时为UTF-8，否则按GBK（GB18030）读取"""
+        with open(file_path, 'rb') as f:
+            sample = f.read(TEXT_SNIFF_BYTES)
+        if sample.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+        try:
+            # 增量解码：样本末尾被截断的多字节字符不算错误
+            codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+            return 'utf-8'
+        except UnicodeDecodeError:
+            return 'gb18030'
+    
+    def _iter_flat_file(self, file_path, delimiter, max_row=None):
+        """逐行读取CSV/TSV文件（编码见 _detect_text_encoding），关闭生成器时关闭文件
+        
+        编码检测只看文件开头：按UTF-8读取到后面才遇到无法解码的字节时
+        （如GBK导出的文件开头64KB全是数字、代码等ASCII内容），改按GB18030重新打开，
+        跳过已产出的行后继续读取（这些行在检测范围之外仍能按UTF-8解码，通常只含ASCII，两种编码结果相同）。
+        """
+        encoding = self._detect_text_encoding(file_path)
+        done = 0
+        while True:
+            with open(file_path, 'r', encoding=encoding, newline='') as text_file:
+                try:
+                    for row in islice(self._iter_flat_rows(text_file, delimiter, max_row), done, None):
+                        done += 1
+                        yield row
+                    return
+                except UnicodeDecodeError:
+                    if encoding != 'utf-8':
+                        raise
+                    encoding = 'gb18030'
+    
+    def _iter_flat_rows(self, text_file, delimiter, max_row=None):
+        """从CSV/TSV文本流逐行产出值元组（字段按 _parse_flat_value 转换）"""
+        reader = csv.reader(text_file, delimiter=delimiter)
+        if max_row is not None:
+            reader = islice(reader, max_row)
+        for fields in reader:
+            yield tuple(map(_parse_flat_value, fields))
+    
+    def _is_columnar(self, file_path):
+        return os.path.splitext(file_path.lower())[1] in COLUMNAR_EXTENSIONS
+    
+    def _open_columnar_rows(self, file_path, max_row=None):
+        """打开Parquet/Arrow IPC文件用于逐行读取（以内存映射方式读取，列名作为表头行）
+        
+        Returns:
+            (行值元组迭代器, 总行数, 关闭函数)
+        """
+        if not PYARROW_OK:
+            raise Exception('缺少pyarrow库，无法读取Parquet/Arrow文件。请安装pyarrow')
+        try:
+            if file_path.lower().endswith('.parquet'):
+                parquet_file = pq.ParquetFile(file_path, memory_map=True)
+                names = parquet_file.schema_arrow.names
+                total = parquet_file.metadata.num_rows + 1
+                batches = parquet_file.iter_batches(batch_size=COLUMNAR_BATCH_ROWS)
+                close = getattr(parquet_file, 'close', lambda: None)
+            else:
+                source = pa.memory_map(file_path, 'r')
+                try:
+                    reader = pa.ipc.open_file(source)
+                    batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+                    total = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches)) + 1
+                except pa.ArrowInvalid:
+                    # 流格式（.arrows，或以其他扩展名保存的流）没有文件尾索引，只能顺序读取，总行数未知
+                    source.seek(0)
+                    reader = pa.ipc.open_stream(source)
+                    batches = iter(reader)
+                    total = None
+                names = reader.schema.names
+                close = source.close
+        except Exception as e:
+            raise Exception(f'读取Parquet/Arrow文件失败: {str(e)}')
+        
+        rows = self._iter_columnar_rows(names, batches)
+        if max_row is not None:
+            rows = islice(rows, max_row)
+            total = min(total, max_row) if total is not None else None
+        return rows, total, close
+    
+    def _iter_columnar_rows(self, names, batches):
+        """把记录批次逐批转换为行值元组（第一行为列名）"""
+        yield tuple(names)
+        for batch in batches:
+            columns = [self._columnar_values(column) for column in batch.columns]
+            yield from zip(*columns)
+    
+    def _columnar_values(self, column):
+        """把一列Arrow数据转换为与Excel单元格一致的Python值
+        
+        字典编码的列先解码为值类型（Parquet字符串列常见）；日期转换为datetime，
+        带时区的时间戳按UTC去掉时区（Excel不支持时区），Decimal转换为float，空字符串为None。
+        """
+        if pa.types.is_dictionary(column.type):
+            column = column.dictionary_decode()
+        arrow_type = column.type
+        if pa.types.is_timestamp(arrow_type) and arrow_type.tz is not None:
+            column = column.cast(pa.timestamp(arrow_type.unit))
+        values = column.to_pylist()
+        if pa.types.is_date(arrow_type):
+            return [datetime.datetime.combine(v, datetime.time()) if v is not None else None for v in values]
+        if pa.types.is_decimal(arrow_type):
+            return [float(v) if v is not None else None for v in values]
+        if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+            return [v if v != '' else None for v in values]
+        return values
+    
+    def _has_cell_styles(self, file_path):
+        """该格式的源文件是否带单元格格式（.xls由xlrd读取时不含格式，CSV/TSV和Parquet/Arrow没有格式）"""
+        return os.path.splitext(file_path.lower())[1] in ('.xlsx', '.xlsm')
+    
+    def _table_name(self, file_path):
+        """由文件路径得到表名（用于表头显示和error标记）"""
+        name = os.path.basename(file_path)
+        for ext in ('.xlsx', '.xls', '.csv', '.tsv') + COLUMNAR_EXTENSIONS:
+            name = name.replace(ext, '')
+        return name
+    
+    def _open_xls(self, xls_path):
+        """用xlrd打开.xls文件（按需加载sheet）"""
+        if not XLRD_OK:
+            raise Exception('缺少xlrd库，无法读取.xls文件。请安装xlrd或将文件转换为.xlsx格式')
+        try:
+            return xlrd.open_workbook(xls_path, formatting_info=False, on_demand=True)
+        except Exception as e:
+            raise Exception(f'读取.xls文件失败: {str(e)}')
+    
+    def _iter_xls_rows(self, xls_sheet, datemode, max_row=None):
+        """直接从xlrd sheet逐行产出值元组（不经临时.xlsx转换）
+        
+        日期单元格转换为datetime，空单元格为None，与转换为.xlsx后再读取的结果一致。
+        """
+        XL_CELL_DATE = xlrd.XL_CELL_DATE
+        XL_CELL_NUMBER = xlrd.XL_CELL_NUMBER
+        nrows = xls_sheet.nrows if max_row is None else min(max_row, xls_sheet.nrows)
+        for row_idx in range(nrows):
+            types = xls_sheet.row_types(row_idx)
+            values = xls_sheet.row_values(row_idx)
+            row = []
+            for cell_type, value in zip(types, values):
+                if cell_type == XL_CELL_NUMBER:
+                    # xlrd的数值均为float，按.xlsx的存储格式（16位有效数字）还原，整数值为int
+                    text = '%.16g' % value
+                    value = float(text) if '.' in text or 'e' in text else int(text)
+                elif cell_type == XL_CELL_DATE:
+                    value = xlrd.xldate_as_datetime(value, datemode)
+                elif value == '':
+                    value = None
+                row.append(value)
+            yield tuple(row)
+    
+    def _load_workbook_safe(self, file_path, data_only=True, read_only=False):
         """安全加载workbook，自动处理.xls格式
         
         Args:
             file_path: Excel文件路径
             data_only: 是否只读取数据值（不读取公式）
+            read_only: 是否以只读模式加载（流式读取，不构建单元格对象，适合大文件）
             
         Returns:
             (workbook对象, 临时文件路径或None)
@@ -1006,65 +2046,60 @@ class RequestHandler(BaseHTTPRequestHandler):
             temp_file = self._convert_xls_to_xlsx(file_path)
             file_path = temp_file
         elif ext != '.xlsx' and ext != '.xlsm':
-            raise Exception(f'不支持的文件格式: {ext}。请使用.xlsx, .xlsm或.xls格式')
+            raise Exception(f'不支持的文件格式: {ext}。请使用.xlsx, .xlsm, .xls, .csv, .tsv或.parquet格式')
         
         # 加载workbook
-        wb = load_workbook(file_path, data_only=data_only)
+        wb = load_workbook(file_path, data_only=data_only, read_only=read_only)
         
         return wb, temp_file
     
-    def do_GET(self):
-        self.send_response(200)
-        self.send_header('Content-Type', 'text/html; charset=utf-8')
-        self.end_headers()
-        self.wfile.write(HTML_TEMPLATE.encode('utf-8'))
+    def _run_in_pool(self, func, *args):
+        """在比对工作线程池中执行耗时操作，并等待结果
+        
+        每个HTTP请求有自己的处理线程，比对任务再由有界线程池限流，
+        这样长时间的比对不会阻塞其他请求，同时并发比对数不超过 COMPARE_WORKERS。
+        """
+        return _compare_executor.submit(func, *args).result()
     
-    def do_POST(self):
-        length = int(self.headers.get('Content-Length', 0))
-        body = self.rfile.read(length).decode('utf-8')
-        
-        try:
-            data = json.loads(body)
-            action = data.get('action', '')
-            
-            if action == 'generate_test':
-                result = self.generate_test(data.get('workDir', WORK_DIR))
-            elif action == 'compare':
-                result = self.run_compare(data)
-            elif action == 'generate_dimension_test':
-                result = self.generate_dimension_test(data.get('workDir', WORK_DIR))
-            elif action == 'dimension_compare':
-                result = self.run_dimension_compare(data)
-            elif action == 'parse_headers':
-                result = self.parse_table_headers(data)
-            elif action == 'aggregate_compare':
-                result = self.run_aggregate_compare(data)
-            elif action == 'open_file':
-                result = self.open_file(data.get('path', ''))
-            elif action == 'open_dir':
-                result = self.open_dir(data.get('path', ''))
-            elif action == 'browse_file':
-                result = self.browse_file_dialog(data.get('workDir', WORK_DIR))
-            elif action == 'browse_dir':
-                result = self.browse_dir_dialog()
-            else:
-                result = {'success': False, 'message': '未知操作'}
-                
-        except Exception as e:
-            result = {'success': False, 'message': str(e)}
-        
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(result, ensure_ascii=False).encode('utf-8'))
-    
-    def generate_test(self, workdir):
-        """生成测试文件"""
-        if not OPENPYXL_OK:
-            return {'success': False, 'message': '缺少openpyxl库'}
-        
-        if not os.path.exists(workdir):
-            return {'success': False, 'message': '工作目录不存在'}
+    def submit_job(self, data):
+        """提交后台比对任务，立即返回任务ID，通过 job_status 轮询进度"""
+        job_funcs = {
+            'compare': self.run_compare,
+            'dimension_compare': self.run_dimension_compare,
+            'aggregate_compare': self.run_aggregate_compare,
+            'batch_compare': self.run_batch_compare,
+        }
+        job_action = data.get('jobAction', '')
+        if job_action not in job_funcs:
+            return {'success': False, 'message': f'未知任务类型: {job_action}'}
+        
+        job = CompareJob(job_action)
+        _register_job(job)
+        _compare_executor.submit(_run_job, job, job_funcs[job_action], data)
+        return {'success': True, 'jobId': job.id}
+    
+    def job_status(self, job_id):
+        """查询后台任务的阶段、处理行数、预计剩余时间及结果"""
+        job = _get_job(job_id)
+        if job is None:
+            return {'success': False, 'message': '任务不存在'}
+        return {'success': True, 'job': job.to_dict()}
+    
+    def cancel_job(self, job_id):
+        """取消后台任务（在下一个进度检查点生效）"""
+        job = _get_job(job_id)
+        if job is None:
+            return {'success': False, 'message': '任务不存在'}
+        job.cancel_event.set()
+        return {'success': True, 'job': job.to_dict()}
+    
+    def generate_test(self, workdir):
+        """生成测试文件"""
+        if not OPENPYXL_OK:
+            return {'success': False, 'message': '缺少openpyxl库'}
+        
+        if not os.path.exists(workdir):
+            return {'success': False, 'message': '工作目录不存在'}
         
         try:
             # 基准文件
@@ -1196,6 +2231,7 @@ class RequestHandler(BaseHTTPRequestHandler):
             import traceback
             return {'success': False, 'message': str(e) + '\n' + traceback.format_exc()}
     
+    @_instrumented('dimension_compare')
     def run_dimension_compare(self, data):
         """运行维度比对"""
         if not OPENPYXL_OK:
@@ -1208,30 +2244,45 @@ class RequestHandler(BaseHTTPRequestHandler):
             key_columns = int(data.get('keyColumns', 1))
             diff_threshold = float(data.get('diffThreshold', 1))
             output_file = data.get('outputFile', 'dimension_compare_result.xlsx')
+            engine = data.get('diffEngine', 'auto')
+            parquet_output = bool(data.get('parquetOutput', False))
+            source_format = data.get('sourceFormat', 'auto')
+            source_output = self._resolve_source_output(data)
+            if source_output == 'manifest':
+                source_format = 'values'  # 清单不需要源格式
             
-            # 读取表A和表B
-            table_a = self._read_full_table(table_a_file)
-            table_b = self._read_full_table(table_b_file)
+            # 读取表A和表B（每个文件只解析一次，比对和嵌入源文件共用）
+            (source_a, source_b), (table_a, table_b) = self._load_source_tables(
+                [table_a_file, table_b_file], ['reading_a', 'reading_b'], source_format, source_output
+            )
             
             # 提取文件名（用于error标记）
-            table_a_name = os.path.basename(table_a_file).replace('.xlsx', '').replace('.xls', '')
-            table_b_name = os.path.basename(table_b_file).replace('.xlsx', '').replace('.xls', '')
+            table_a_name = self._table_name(table_a_file)
+            table_b_name = self._table_name(table_b_file)
             
             # 生成结果
             output_path = os.path.join(workdir, output_file)
-            self._create_dimension_result(
+            parquet_path = self._parquet_output_path(output_path) if parquet_output else None
+            stats = self._create_dimension_result(
                 output_path, table_a, table_b, key_columns,
                 table_a_name, table_b_name, diff_threshold,
-                table_a_file, table_b_file
+                source_a, source_b, engine, source_output, parquet_path
             )
             
-            return {
+            result = {
                 'success': True,
                 'message': '维度比对完成!\n表A: {} 行\n表B: {} 行\n基准列: 前{}列\n差异阈值: {}\n结果已保存: {}'.format(
-                    len(table_a['data']), len(table_b['data']), key_columns, diff_threshold, output_file
-                )
+                    stats['rows_a'], stats['rows_b'], key_columns, diff_threshold, output_file
+                ),
+                'columnPlan': self._describe_column_plan(stats['column_plan']),
+                'summary': stats['summary']
             }
+            if parquet_path:
+                result['parquetFile'] = parquet_path
+            return result
             
+        except JobCancelled:
+            raise  # 取消不是错误，不打印堆栈（见 _instrumented）
         except Exception as e:
             import traceback
             traceback.print_exc()
@@ -1249,22 +2300,37 @@ class RequestHandler(BaseHTTPRequestHandler):
             if not table_a_file or not table_b_file:
                 return {'success': False, 'message': '请提供表A和表B文件路径'}
             
-            # 读取两个表的表头
-            table_a = self._read_full_table(table_a_file)
-            table_b = self._read_full_table(table_b_file)
+            # 探测两个表的表头（只读表头和少量样本行，结果按文件缓存）
+            probe_a = self._probe_table(table_a_file)
+            probe_b = self._probe_table(table_b_file)
             
             # 合并表头并去重（保持顺序，忽略下划线、空格和括号的差异）
             all_headers = []
-            seen = set()  # 存储标准化后的字符串
-            for header in table_a['headers'] + table_b['headers']:
-                normalized = self._normalize_string(header)
-                if normalized not in seen:
-                    all_headers.append(header)  # 保存原始列名
-                    seen.add(normalized)
+            columns = {}  # 标准化后的字符串 -> 列信息
+            for source, probe in (('A', probe_a), ('B', probe_b)):
+                for col in probe['columns']:
+                    normalized = self._normalize_string(col['name'])
+                    if normalized not in columns:
+                        all_headers.append(col['name'])  # 保存原始列名
+                        columns[normalized] = dict(col, samples=list(col['samples']), tables=[source])
+                    else:
+                        merged = columns[normalized]
+                        if source not in merged['tables']:
+                            merged['tables'].append(source)
+                        if merged['type'] == 'empty':
+                            merged['type'] = col['type']
+                        elif col['type'] not in ('empty', merged['type']):
+                            merged['type'] = 'mixed'
+                        for sample in col['samples']:
+                            if len(merged['samples']) >= HEADER_PROBE_SAMPLES:
+                                break
+                            if sample not in merged['samples']:
+                                merged['samples'].append(sample)
             
             return {
                 'success': True,
                 'headers': all_headers,
+                'columns': list(columns.values()),
                 'message': f'成功解析表头，共{len(all_headers)}列'
             }
             
@@ -1273,6 +2339,7 @@ class RequestHandler(BaseHTTPRequestHandler):
             traceback.print_exc()
             return {'success': False, 'message': str(e)}
     
+    @_instrumented('aggregate_compare')
     def run_aggregate_compare(self, data):
         """运行聚合比对：对A和B分别聚合，然后比对"""
         if not OPENPYXL_OK:
@@ -1286,47 +2353,64 @@ class RequestHandler(BaseHTTPRequestHandler):
             ind_columns = data.get('indColumns', [])
             diff_threshold = float(data.get('diffThreshold', 1))
             output_file = data.get('outputFile', '聚合比对结果.xlsx')
+            engine = data.get('diffEngine', 'auto')
+            parquet_output = bool(data.get('parquetOutput', False))
+            source_format = data.get('sourceFormat', 'auto')
+            source_output = self._resolve_source_output(data)
+            if source_output == 'manifest':
+                source_format = 'values'  # 清单不需要源格式
             
             if not ind_columns:
                 return {'success': False, 'message': '请至少选择一个指标列'}
             
-            # 读取原始表
-            table_a_raw = self._read_full_table(table_a_file)
-            table_b_raw = self._read_full_table(table_b_file)
+            # 读取原始表（每个文件只解析一次，聚合和嵌入源文件共用）
+            (source_a, source_b), (table_a_raw, table_b_raw) = self._load_source_tables(
+                [table_a_file, table_b_file], ['reading_a', 'reading_b'], source_format, source_output
+            )
             
             # 提取文件名
-            table_a_name = os.path.basename(table_a_file).replace('.xlsx', '').replace('.xls', '')
-            table_b_name = os.path.basename(table_b_file).replace('.xlsx', '').replace('.xls', '')
+            table_a_name = self._table_name(table_a_file)
+            table_b_name = self._table_name(table_b_file)
             
             # 聚合A和B
+            _report_progress('aggregating')
             agg_a = self._aggregate_table(table_a_raw, dim_columns, ind_columns, table_a_name)
             agg_b = self._aggregate_table(table_b_raw, dim_columns, ind_columns, table_b_name)
             
             # 生成结果文件（5个sheet）
             output_path = os.path.join(workdir, output_file)
-            self._create_aggregate_result(
+            parquet_path = self._parquet_output_path(output_path) if parquet_output else None
+            summary = self._create_aggregate_result(
                 output_path, 
                 agg_a, agg_b,
-                table_a_file, table_b_file,
+                source_a, source_b,
                 table_a_name, table_b_name,
-                len(dim_columns), diff_threshold
+                len(dim_columns), diff_threshold, engine,
+                source_output, dim_columns, parquet_path
             )
             
-            return {
+            result = {
                 'success': True,
                 'message': f'''聚合比对完成！
 表A聚合后: {len(agg_a['data'])} 行
 表B聚合后: {len(agg_b['data'])} 行
 维度列: {len(dim_columns)} 个
 指标列: {len(ind_columns)} 个
-结果已保存: {output_file}'''
+结果已保存: {output_file}''',
+                'summary': summary
             }
+            if parquet_path:
+                result['parquetFile'] = parquet_path
+            return result
             
+        except JobCancelled:
+            raise  # 取消不是错误，不打印堆栈（见 _instrumented）
         except Exception as e:
             import traceback
             traceback.print_exc()
             return {'success': False, 'message': str(e)}
     
+    @_instrumented('compare')
     def run_compare(self, data):
         """运行对比"""
         if not OPENPYXL_OK:
@@ -1340,97 +2424,374 @@ class RequestHandler(BaseHTTPRequestHandler):
             output_file = data.get('outputFile', 'compare_result.xlsx')
             decimal_places = int(data.get('decimalPlaces', 6))
             green_th = float(data.get('greenTh', 1.0))
+            source_format = data.get('sourceFormat', 'auto')
+            source_output = self._resolve_source_output(data)
+            if source_output == 'manifest':
+                source_format = 'values'  # 清单不需要源格式
             
-            # 读取基准
-            base_names = self._read_base(base_file)
+            file_paths = [base_file, data_a_file, data_b_file]
+            phases = ['reading_base', 'reading_a', 'reading_b']
+            if source_output == 'manifest':
+                # 不嵌入源数据：基准文件逐行读取第1列，横向数据只解析前两行
+                base_names, data_a, data_b, (base_source, source_a, source_b) = \
+                    self._read_compare_streaming(file_paths, phases)
+            else:
+                # 读取基准和数据（每个文件只解析一次，比对和嵌入源文件共用；大文件在子进程中并行读取）
+                base_source, source_a, source_b = self._load_sources(file_paths, phases, source_format)
+                base_names = self._read_base(base_source)
+                data_a = self._read_horizontal(source_a)
+                data_b = self._read_horizontal(source_b)
             
-            # 读取数据
-            data_a = self._read_horizontal(data_a_file)
-            data_b = self._read_horizontal(data_b_file)
+            # 每个数据源构建一次标准化键索引
+            index_a, collisions_a = self._build_normalized_index(data_a)
+            index_b, collisions_b = self._build_normalized_index(data_b)
             
             # 提取文件名（用于表头显示）
-            data_a_name = os.path.basename(data_a_file).replace('.xlsx', '').replace('.xls', '')
-            data_b_name = os.path.basename(data_b_file).replace('.xlsx', '').replace('.xls', '')
+            data_a_name = self._table_name(data_a_file)
+            data_b_name = self._table_name(data_b_file)
             
             # 生成结果
             output_path = os.path.join(workdir, output_file)
-            self._create_result(output_path, base_names, data_a, data_b, decimal_places, green_th, 
-                              data_a_name, data_b_name, base_file, data_a_file, data_b_file)
+            summary = self._create_result(output_path, base_names, data_a, data_b, decimal_places, green_th, 
+                              data_a_name, data_b_name, base_source, source_a, source_b,
+                              index_a=index_a, index_b=index_b, source_output=source_output)
+            
+            message = '基准: {} 个指标\n输入1: {} 个数据\n输入2: {} 个数据\n小数位数: {} 位\n'.format(
+                len(base_names), len(data_a), len(data_b), decimal_places
+            )
+            if collisions_a or collisions_b:
+                message += '[提示] 以下指标名忽略下划线后重复，模糊匹配时取第一个:\n'
+                message += '\n'.join(self._format_collisions(data_a_name, collisions_a) +
+                                     self._format_collisions(data_b_name, collisions_b)) + '\n'
+            message += '========================================\n[完成] 结果已保存: {}'.format(output_file)
             
             return {
                 'success': True, 
-                'message': '基准: {} 个指标\n输入1: {} 个数据\n输入2: {} 个数据\n小数位数: {} 位\n========================================\n[完成] 结果已保存: {}'.format(
-                    len(base_names), len(data_a), len(data_b), decimal_places, output_file
-                )
+                'message': message,
+                'collisions': {
+                    'dataA': list(collisions_a.values()),
+                    'dataB': list(collisions_b.values())
+                },
+                'summary': summary
             }
             
+        except JobCancelled:
+            raise  # 取消不是错误，不打印堆栈（见 _instrumented）
         except Exception as e:
             import traceback
             traceback.print_exc()
             return {'success': False, 'message': str(e)}
     
-    def _read_base(self, path):
-        # 处理中文路径
-        if sys.platform == 'win32' and isinstance(path, str):
-            # Windows上确保路径是Unicode字符串
-            path = os.path.normpath(path)
+    @_instrumented('batch_compare')
+    def run_batch_compare(self, data):
+        """批量比对：按清单执行多组比对（进程池并发），生成汇总工作簿
+        
+        data['jobs'] 中每项与单个比对的请求参数相同，action 默认为 dimension_compare，
+        未指定 outputFile 时按序号和表名生成。被多组比对共用的输入文件只在主进程解析一次，
+        并发执行时落盘供用到它的子进程载入。
+        """
+        if not OPENPYXL_OK:
+            return {'success': False, 'message': '缺少openpyxl库'}
         
-        wb, temp_file = self._load_workbook_safe(path, data_only=True)
         try:
-            ws = wb.active
-            names = []
-            for row in range(2, ws.max_row + 1):
-                v = ws.cell(row=row, column=1).value
-                if v:
-                    names.append(str(v).strip())
-            return names
-        finally:
-            wb.close()
-            # 清理临时文件
-            if temp_file and os.path.exists(temp_file):
-                try:
-                    os.unlink(temp_file)
-                except:
-                    pass
+            workdir = data.get('workDir', WORK_DIR)
+            summary_file = data.get('summaryFile', '批量比对汇总.xlsx')
+            jobs = self._prepare_batch_jobs(data.get('jobs') or [], workdir)
+            if not jobs:
+                return {'success': False, 'message': '批量比对清单为空'}
+            workers = max(1, min(int(data.get('workers', BATCH_WORKERS)), len(jobs)))
+            
+            # 被多组比对共用的输入只解析一次（有任何一组要求完整格式时按完整格式解析）
+            usage = Counter(job[key] for job in jobs for key in BATCH_ACTIONS[job['action']][1])
+            shared = [path for path, count in usage.items() if count > 1]
+            source_format = 'full' if any(job.get('sourceFormat') == 'full' for job in jobs) else 'auto'
+            
+            if workers == 1:
+                for path in shared:
+                    source = self._load_sources([path], ['reading_shared'], source_format)[0]
+                    _cache_shared_input(TableCache.make_key(path), source)
+                _report_progress('batch', total=len(jobs))
+                results = []
+                for job in jobs:
+                    # 单个比对的阶段不覆盖批量任务的进度，取消在两组比对之间检查
+                    outer_job = getattr(_job_local, 'job', None)
+                    _job_local.job = None
+                    try:
+                        results.append(_batch_worker_run(job))
+                    finally:
+                        _job_local.job = outer_job
+                    _report_progress(rows=1)
+            else:
+                results = self._run_batch_pool(jobs, workers, shared, source_format)
+            
+            _report_progress('writing')
+            summary_path = os.path.join(workdir, summary_file)
+            totals = self._write_batch_summary(summary_path, jobs, results)
+            
+            return {
+                'success': True,
+                'message': '批量比对完成!\n比对组数: {}（失败 {}）\n红色差异: {} 个\n缺失数据: {} 个\n并发数: {}\n共享输入: {} 个\n汇总已保存: {}'.format(
+                    len(jobs), totals['failed'], totals['red'], totals['error'], workers, len(shared), summary_file
+                ),
+                'summaryFile': summary_path,
+                'summary': totals,
+                'results': [dict(result, outputFile=job['outputFile']) for job, result in zip(jobs, results)]
+            }
+            
+        except JobCancelled:
+            raise  # 取消不是错误，不打印堆栈（见 _instrumented）
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            return {'success': False, 'message': str(e)}
     
-    def _read_horizontal(self, path):
-        # 处理中文路径
-        if sys.platform == 'win32' and isinstance(path, str):
-            # Windows上确保路径是Unicode字符串
-            path = os.path.normpath(path)
+    def _prepare_batch_jobs(self, jobs, workdir):
+        """补全批量比对清单：默认action、结果目录和不重复的结果文件名"""
+        prepared = []
+        for idx, job in enumerate(jobs, 1):
+            job = dict(job)
+            job.setdefault('action', 'dimension_compare')
+            if job['action'] not in BATCH_ACTIONS:
+                raise Exception('第{}组比对的action无效: {}'.format(idx, job['action']))
+            inputs = BATCH_ACTIONS[job['action']][1]
+            missing = [key for key in inputs if not job.get(key)]
+            if missing:
+                raise Exception('第{}组比对缺少参数: {}'.format(idx, ', '.join(missing)))
+            for key in inputs:
+                job[key] = os.path.abspath(job[key])
+            job.setdefault('workDir', workdir)
+            if not job.get('outputFile'):
+                names = [self._table_name(job[key]) for key in inputs[-2:]]
+                job['outputFile'] = '批量比对_{:03d}_{}_vs_{}.xlsx'.format(idx, names[0], names[1])
+            prepared.append(job)
+        return prepared
+    
+    def _run_batch_pool(self, jobs, workers, shared, source_format):
+        """在独立的进程池中并发执行各组比对，结果按清单顺序返回
         
-        wb, temp_file = self._load_workbook_safe(path, data_only=True)
+        共享输入逐个解析后落盘为 pickle，每组比对只随任务传入自己用到的文件路径，
+        子进程按需载入，主进程不保留解析结果的副本。
+        """
+        spill_dir = tempfile.mkdtemp(prefix='excel_compare_batch_')
+        executor = None
+        futures = {}
         try:
-            ws = wb.active
-            data = {}
-            for col in range(1, ws.max_column + 1):
-                h = ws.cell(row=1, column=col).value
-                if h:
-                    # 保存原始key和标准化key的映射
-                    original_key = str(h).strip()
-                    data[original_key] = ws.cell(row=2, column=col).value
-            return data
-        finally:
-            wb.close()
-            # 清理临时文件
-            if temp_file and os.path.exists(temp_file):
+            spilled = {}
+            for n, path in enumerate(shared):
+                source = self._load_sources([path], ['reading_shared'], source_format)[0]
+                spill_path = os.path.join(spill_dir, '{}.pickle'.format(n))
+                with open(spill_path, 'wb') as f:
+                    pickle.dump(source, f, pickle.HIGHEST_PROTOCOL)
+                spilled[path] = (TableCache.make_key(path), spill_path)
+                del source
+            
+            _report_progress('batch', total=len(jobs))
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_batch_worker_init
+            )
+            results = [None] * len(jobs)
+            for idx, job in enumerate(jobs):
+                paths = dict.fromkeys(job[key] for key in BATCH_ACTIONS[job['action']][1])
+                shared_inputs = [spilled[path] for path in paths if path in spilled]
+                futures[executor.submit(_batch_worker_run, job, shared_inputs)] = idx
+            for future in as_completed(futures):
                 try:
-                    os.unlink(temp_file)
-                except:
-                    pass
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    # 子进程异常退出（如内存不足）时，该组记为失败
+                    message = '子进程异常退出' if isinstance(e, BrokenProcessPool) else str(e)
+                    results[futures[future]] = {'success': False, 'message': message, 'summary': None,
+                                                'seconds': None}
+                _report_progress(rows=1)
+        finally:
+            for future in futures:
+                future.cancel()
+            if executor is not None:
+                executor.shutdown(wait=True)
+            shutil.rmtree(spill_dir, ignore_errors=True)
+        return results
+    
+    def _write_batch_summary(self, output, jobs, results):
+        """写入批量比对汇总工作簿：每组比对一行（匹配数、各颜色差异数、耗时），最后一行为合计
+        
+        Returns:
+            合计 {'jobs', 'failed', 'matched', 'green', 'red', 'error', 'text', 'unmatchedA', 'unmatchedB'}
+        """
+        HEADER = PatternFill(start_color="DCDCDC", end_color="DCDCDC", fill_type="solid")
+        RED_FILL = PatternFill(start_color="FFB6C1", end_color="FFB6C1", fill_type="solid")
+        ERROR_FILL = PatternFill(start_color="FFE6E6", end_color="FFE6E6", fill_type="solid")
+        border = Border(
+            left=Side(style='thin'), right=Side(style='thin'),
+            top=Side(style='thin'), bottom=Side(style='thin')
+        )
+        count_keys = ('matched', 'red', 'error', 'green', 'text', 'unmatchedA', 'unmatchedB')
+        headers = ['序号', '比对类型', '表A', '表B', '基准列数', '差异阈值', '结果文件', '状态',
+                   '匹配行数', '红色差异', '缺失数据', '绿色', '无法计算', 'A不匹配行', 'B不匹配行', '耗时(秒)', '说明']
+        action_labels = {'compare': '横向比对', 'dimension_compare': '维度比对', 'aggregate_compare': '聚合比对'}
+        
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "批量比对汇总"
+        for col, h in enumerate(headers, 1):
+            c = ws.cell(row=1, column=col, value=h)
+            c.fill = HEADER
+            c.font = Font(bold=True)
+            c.alignment = Alignment(horizontal='center')
+            c.border = border
+        
+        totals = dict.fromkeys(count_keys, 0)
+        totals['jobs'] = len(jobs)
+        totals['failed'] = 0
+        for row_idx, (job, result) in enumerate(zip(jobs, results), 2):
+            inputs = BATCH_ACTIONS[job['action']][1]
+            summary = result.get('summary') or {}
+            if not result['success']:
+                totals['failed'] += 1
+            for key in count_keys:
+                totals[key] += summary.get(key, 0)
+            
+            values = [
+                row_idx - 1, action_labels[job['action']],
+                os.path.basename(job[inputs[-2]]), os.path.basename(job[inputs[-1]]),
+                job.get('keyColumns', 1 if job['action'] == 'dimension_compare' else None),
+                job.get('greenTh', 1.0) if job['action'] == 'compare' else job.get('diffThreshold', 1),
+                job['outputFile'],
+                '成功' if result['success'] else '失败'
+            ] + [summary.get(key) for key in count_keys] + [
+                result.get('seconds'), '' if result['success'] else result.get('message', '')
+            ]
+            for col, value in enumerate(values, 1):
+                c = ws.cell(row=row_idx, column=col, value=value)
+                c.border = border
+            if not result['success']:
+                for col in (8, len(headers)):
+                    ws.cell(row=row_idx, column=col).fill = ERROR_FILL
+                    ws.cell(row=row_idx, column=col).font = Font(color="FF0000")
+            if summary.get('red'):
+                ws.cell(row=row_idx, column=10).fill = RED_FILL
+            if summary.get('error'):
+                ws.cell(row=row_idx, column=11).fill = RED_FILL
+        
+        # 合计行
+        total_row = len(jobs) + 2
+        total_values = ['合计', '', '', '', '', '', '', '失败 {}'.format(totals['failed'])] + \
+                       [totals[key] for key in count_keys]
+        for col, value in enumerate(total_values, 1):
+            c = ws.cell(row=total_row, column=col, value=value)
+            c.font = Font(bold=True)
+            c.border = border
+        
+        for col, w in enumerate([6, 10, 24, 24, 10, 10, 30, 8, 10, 10, 10, 10, 10, 10, 10, 10, 40], 1):
+            ws.column_dimensions[get_column_letter(col)].width = w
+        ws.freeze_panes = 'A2'
+        
+        _report_progress('saving')
+        wb.save(output)
+        wb.close()
+        _record_file_bytes('excel_compare_bytes_written_total', output, mode=_metrics_mode(), format='xlsx')
+        return totals
+    
+    def _read_compare_streaming(self, file_paths, phases):
+        """不嵌入源数据时读取横向比对的输入（基准、数据A、数据B），不构建完整的源数据快照
+        
+        基准文件流式读取，只保留第1列；横向数据文件读到第2行即停止解析。
+        
+        Returns:
+            (基准指标名, 数据A, 数据B, 各文件的清单源数据 {'path', 'rows': None, 'data_rows'})
+            横向数据文件未读完，数据行数为None
+        """
+        parsed = []
+        sources = []
+        for i, (path, phase) in enumerate(zip(file_paths, phases)):
+            _report_progress(phase)
+            _record_file_bytes('excel_compare_bytes_read_total', path, format=_file_format(path))
+            if i == 0:
+                rows = [row[:1] for row in self._iter_table_rows(path)]
+                data_rows = sum(1 for row in islice(rows, 1, None)
+                                if row and row[0] is not None and str(row[0]).strip() != '')
+                parsed.append(self._read_base({'rows': rows}))
+            else:
+                rows = list(self._iter_table_rows(path, max_row=2))
+                data_rows = None
+                parsed.append(self._read_horizontal({'rows': rows}))
+            _record_rows_read(len(rows), sum(map(len, rows)))
+            sources.append({'path': os.path.abspath(path), 'rows': None, 'data_rows': data_rows})
+        return parsed[0], parsed[1], parsed[2], sources
+    
+    def _read_base(self, source):
+        """从基准文件的源数据中取第1列指标名（跳过表头）"""
+        names = []
+        for row in source['rows'][1:]:
+            v = row[0] if row else None
+            if v:
+                names.append(str(v).strip())
+        return names
+    
+    def _read_horizontal(self, source):
+        """从横向数据文件的源数据中取第1行（指标名）和第2行（数值）"""
+        rows = source['rows']
+        header_row = rows[0] if rows else ()
+        value_row = rows[1] if len(rows) > 1 else ()
+        
+        data = {}
+        for col, h in enumerate(header_row):
+            if h:
+                # 保存原始key和标准化key的映射
+                original_key = str(h).strip()
+                data[original_key] = value_row[col] if col < len(value_row) else None
+        return data
     
     def _normalize_key(self, key):
         """标准化指标名称，只忽略下划线"""
         return key.replace('_', '').lower()
     
-    def _find_value(self, data_dict, target_key):
-        """根据标准化规则查找值，忽略下划线差异"""
+    def _build_normalized_index(self, data_dict):
+        """为横向数据构建标准化键索引（每个数据源只构建一次）
+        
+        多个原始键标准化后相同时，保留第一个键的值（与逐个扫描的匹配结果一致），
+        并记录冲突供结果提示。
+        
+        Returns:
+            (索引 {标准化键: 值}, 冲突 {标准化键: [原始键, ...]})
+        """
+        index = {}
+        first_keys = {}
+        collisions = {}
+        for key, value in data_dict.items():
+            normalized = self._normalize_key(key)
+            if normalized not in index:
+                index[normalized] = value
+                first_keys[normalized] = key
+            else:
+                collisions.setdefault(normalized, [first_keys[normalized]]).append(key)
+        return index, collisions
+    
+    def _format_collisions(self, source_name, collisions):
+        """格式化标准化键冲突提示"""
+        lines = []
+        for keys in collisions.values():
+            lines.append('  [{}] {} -> 使用 {}'.format(source_name, ' / '.join(keys), keys[0]))
+        return lines
+    
+    def _find_value(self, data_dict, target_key, normalized_index=None):
+        """根据标准化规则查找值，忽略下划线差异
+        
+        Args:
+            data_dict: 原始键 -> 值
+            target_key: 要查找的指标名称
+            normalized_index: _build_normalized_index 构建的索引，提供时为O(1)查找
+        """
         # 先尝试精确匹配
         if target_key in data_dict:
             return data_dict[target_key]
         
         # 标准化后模糊匹配（只忽略下划线）
         normalized_target = self._normalize_key(target_key)
+        if normalized_index is not None:
+            return normalized_index.get(normalized_target)
+        
         for key, value in data_dict.items():
             if self._normalize_key(key) == normalized_target:
                 return value
@@ -1451,7 +2812,8 @@ class RequestHandler(BaseHTTPRequestHandler):
             return None
     
     def _create_result(self, output, names, data_a, data_b, decimal_places, green_th, 
-                      data_a_name='A', data_b_name='B', base_file=None, data_a_file=None, data_b_file=None):
+                      data_a_name='A', data_b_name='B', base_source=None, data_a_source=None, data_b_source=None,
+                      index_a=None, index_b=None, source_output='embed'):
         GREEN = PatternFill(start_color="90EE90", end_color="90EE90", fill_type="solid")
         RED = PatternFill(start_color="FF6B6B", end_color="FF6B6B", fill_type="solid")
         HEADER = PatternFill(start_color="DCDCDC", end_color="DCDCDC", fill_type="solid")
@@ -1505,14 +2867,25 @@ class RequestHandler(BaseHTTPRequestHandler):
         cell_h2.alignment = Alignment(horizontal='center')
         cell_h2.font = Font(size=10)
         
+        # 标准化键索引（调用方未提供时在此构建，保证查找为O(1)）
+        if index_a is None:
+            index_a, _ = self._build_normalized_index(data_a)
+        if index_b is None:
+            index_b, _ = self._build_normalized_index(data_b)
+        
         # 数据行（从第2行开始）
+        # 差异%列的颜色分类计数（A或B缺值的 #VALUE! 记为 error）
+        kind_counts = {'green': 0, 'red': 0, 'error': 0}
+        _report_progress('writing', total=len(names))
         current_row = 2
         for name in names:
+            if (current_row - 1) % PROGRESS_INTERVAL == 0:
+                _report_progress(rows=PROGRESS_INTERVAL)
             ws.cell(row=current_row, column=1, value=name).border = border
             
             # 使用模糊匹配查找值
-            va = self._find_value(data_a, name)
-            vb = self._find_value(data_b, name)
+            va = self._find_value(data_a, name, index_a)
+            vb = self._find_value(data_b, name, index_b)
             pa = self._parse_num(va)
             pb = self._parse_num(vb)
             
@@ -1546,10 +2919,12 @@ class RequestHandler(BaseHTTPRequestHandler):
                 if pa == pb:
                     cell.value = "0%"
                     cell.fill = GREEN  # A=B 时为绿色
+                    kind_counts['green'] += 1
                 elif pa == 0:
                     # A为0时，无法计算百分比
                     cell.value = "#VALUE!"
                     cell.fill = RED
+                    kind_counts['red'] += 1
                 else:
                     # 计算百分比: (A-B)/A * 100
                     pct = (diff / pa) * 100
@@ -1560,11 +2935,14 @@ class RequestHandler(BaseHTTPRequestHandler):
                     abs_pct = abs(pct)
                     if abs_pct < green_th:
                         cell.fill = GREEN
+                        kind_counts['green'] += 1
                     else:
                         cell.fill = RED
+                        kind_counts['red'] += 1
             else:
                 cell.value = "#VALUE!"
                 cell.fill = RED
+                kind_counts['error'] += 1
             
             current_row += 1
                 
@@ -1575,15 +2953,18 @@ class RequestHandler(BaseHTTPRequestHandler):
         # 冻结表头（第1行）
         ws.freeze_panes = 'A2'
         
-        # 复制源文件到结果workbook
-        if base_file and os.path.exists(base_file):
-            self._copy_sheet_from_file(wb, base_file, "基准文件")
-        if data_a_file and os.path.exists(data_a_file):
-            self._copy_sheet_from_file(wb, data_a_file, f"源文件_{data_a_name}")
-        if data_b_file and os.path.exists(data_b_file):
-            self._copy_sheet_from_file(wb, data_b_file, f"源文件_{data_b_name}")
+        # 按输出策略写入源文件（横向数据没有行级匹配信息，unmatched 时仍完整嵌入）
+        _report_progress('copying')
+        self._write_source_sheets(wb, [
+            ("基准文件", base_source, None),
+            (f"源文件_{data_a_name}", data_a_source, None),
+            (f"源文件_{data_b_name}", data_b_source, None)
+        ], source_output)
+        
+        self._write_performance_sheet(wb)
         
         # 保存文件，处理中文路径编码
+        _report_progress('saving')
         try:
             wb.save(output)
         except Exception as e:
@@ -1594,6 +2975,8 @@ class RequestHandler(BaseHTTPRequestHandler):
                 wb.save(output_bytes.decode('utf-8'))
             else:
                 raise e
+        _record_file_bytes('excel_compare_bytes_written_total', output, mode=_metrics_mode(), format='xlsx')
+        return self._diff_summary(kind_counts)
     
     def open_file(self, path):
         if os.path.exists(path):
@@ -1625,7 +3008,7 @@ class RequestHandler(BaseHTTPRequestHandler):
                 script = '''
                 tell application "System Events"
                     activate
-                    set theFile to choose file with prompt "选择Excel文件" of type {"xlsx", "xls"}
+                    set theFile to choose file with prompt "选择Excel文件" of type {"xlsx", "xlsm", "xls", "csv", "tsv", "parquet", "arrow", "arrows", "feather", "ipc"}
                     return POSIX path of theFile
                 end tell
                 '''
@@ -1663,7 +3046,9 @@ class RequestHandler(BaseHTTPRequestHandler):
                     title='选择Excel文件',
                     initialdir=initial_dir,
                     filetypes=[
-                        ('Excel文件', '*.xlsx *.xls'),
+                        ('Excel文件', '*.xlsx *.xlsm *.xls'),
+                        ('CSV/TSV文件', '*.csv *.tsv'),
+                        ('Parquet/Arrow文件', ' '.join('*' + ext for ext in COLUMNAR_EXTENSIONS)),
                         ('所有文件', '*.*')
                     ]
                 )
@@ -1737,29 +3122,293 @@ class RequestHandler(BaseHTTPRequestHandler):
             import traceback
             return {'success': False, 'message': str(e) + '\n' + traceback.format_exc()}
     
-    def _read_full_table(self, file_path):
-        """读取完整的Excel表格"""
-        wb, temp_file = self._load_workbook_safe(file_path, data_only=True)
+    def _open_table_rows(self, file_path, max_row=None):
+        """打开表格的活动sheet（.xls为第一个sheet）用于逐行读取
+        
+        .xlsx/.xlsm 以openpyxl只读模式流式解析，不构建单元格对象；
+        .xls 由xlrd直接产出行，不再转换为临时.xlsx后重新解析；
+        .csv/.tsv 按检测到的编码（UTF-8/GBK）逐行解析，总行数未知（None）；
+        .parquet/.arrow 由pyarrow按记录批次读取（见 _open_columnar_rows）。
+        
+        Returns:
+            (行值元组迭代器, 总行数, 关闭函数)
+        """
+        if self._is_columnar(file_path):
+            return self._open_columnar_rows(file_path, max_row)
+        
+        delimiter = self._flat_file_delimiter(file_path)
+        if delimiter is not None:
+            rows = self._iter_flat_file(file_path, delimiter, max_row)
+            return rows, None, rows.close
+        
+        if self._is_xls(file_path):
+            book = self._open_xls(file_path)
+            xls_sheet = book.sheet_by_index(0)
+            return (self._iter_xls_rows(xls_sheet, book.datemode, max_row), xls_sheet.nrows,
+                    book.release_resources)
+        
+        wb, temp_file = self._load_workbook_safe(file_path, data_only=True, read_only=True)
+        ws = wb.active
+        
+        def close():
+            wb.close()
+            # 清理临时文件
+            if temp_file and os.path.exists(temp_file):
+                try:
+                    os.unlink(temp_file)
+                except:
+                    pass
+        
+        return ws.iter_rows(max_row=max_row, values_only=True), ws.max_row, close
+    
+    def _iter_table_rows(self, file_path, max_row=None):
+        """流式读取Excel表格，逐行产出原始行元组（包含表头行）
+        
+        内存占用与行数无关；指定max_row时读到该行后即停止解析文件。
+        生成器耗尽或被关闭时自动关闭文件并清理临时文件。
+        """
+        rows, total, close = self._open_table_rows(file_path, max_row)
         try:
-            ws = wb.active
-            
-            # 读取所有数据
-            data = []
-            headers = []
-            
-            for row_idx, row in enumerate(ws.iter_rows(values_only=True), 1):
-                if row_idx == 1:
-                    # 表头
-                    headers = [str(cell) if cell is not None else f'列{i}' for i, cell in enumerate(row, 1)]
-                else:
+            for row_idx, row in enumerate(rows, 1):
+                if row_idx % PROGRESS_INTERVAL == 0:
+                    _report_progress(rows=PROGRESS_INTERVAL, total=total)
+                yield row
+        finally:
+            close()
+    
+    def _track_phase(self, rows, phase):
+        """包装行迭代器：开始遍历时把后台任务切换到指定阶段（用于流式读取）"""
+        _report_progress(phase)
+        for row in rows:
+            yield row
+    
+    def _build_headers(self, header_row):
+        """根据表头行构建列名列表（空列名用 列N 占位）"""
+        return [str(cell) if cell is not None else f'列{i}' for i, cell in enumerate(header_row or (), 1)]
+    
+    def _stream_full_table(self, file_path):
+        """流式读取Excel表格
+        
+        文件未变化且已在 _table_cache 中时直接从缓存产出，不再打开文件；
+        否则边读边收集，完整读完且未超出缓存预算时放入缓存。
+        
+        Returns:
+            {'headers': 表头列表, 'data': 数据行生成器（跳过全空行，每行为list）}
+            data只能遍历一次，遍历结束（或生成器被回收）时释放文件
+        """
+        cache_key = TableCache.make_key(file_path)
+        cached = _table_cache.get(cache_key)
+        if cached is not None:
+            return self._source_table(cached)
+        
+        rows = self._iter_table_rows(file_path)
+        header_row = next(rows, None)
+        headers = self._build_headers(header_row)
+        
+        def data_rows():
+            collected = [header_row] if header_row is not None else []
+            size = 0
+            try:
+                for row in rows:
+                    if collected is not None:
+                        collected.append(row)
+                        size += TableCache.estimate_row_size(row)
+                        if size > _table_cache.max_bytes:
+                            collected = None  # 超出预算，放弃缓存
                     # 数据行（跳过全空行）
                     if any(cell is not None and str(cell).strip() != '' for cell in row):
-                        data.append(list(row))
-            
-            return {
-                'headers': headers,
-                'data': data
-            }
+                        yield list(row)
+                if collected is not None:
+                    _table_cache.put(cache_key, {'rows': collected, 'styles': None, 'style_table': [],
+                                                 'column_widths': {}, 'row_heights': {}, 'size': size,
+                                                 'path': cache_key[0]}, size)
+            finally:
+                rows.close()
+        
+        return {
+            'headers': headers,
+            'data': data_rows()
+        }
+    
+    def _infer_column_type(self, values):
+        """根据样本值推断列类型: number / date / text / mixed / empty"""
+        kinds = set()
+        for v in values:
+            if isinstance(v, bool):
+                kinds.add('text')
+            elif isinstance(v, (int, float)):
+                kinds.add('number')
+            elif isinstance(v, (datetime.datetime, datetime.date, datetime.time)):
+                kinds.add('date')
+            elif self._parse_num(v) is not None:
+                kinds.add('number')
+            else:
+                kinds.add('text')
+        if not kinds:
+            return 'empty'
+        if len(kinds) == 1:
+            return kinds.pop()
+        return 'mixed'
+    
+    def _probe_table(self, file_path):
+        """探测表格结构：只读取表头和前几行样本数据
+        
+        结果按 (绝对路径, 文件大小, 修改时间) 缓存，文件未变化时不再打开文件。
+        
+        Returns:
+            {'headers': 表头列表,
+             'columns': [{'name': 列名, 'type': 推断类型, 'samples': 样本值列表}, ...]}
+        """
+        stat = os.stat(file_path)
+        cache_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        with _header_probe_lock:
+            cached = _header_probe_cache.get(cache_key)
+            if cached is not None:
+                _header_probe_cache.move_to_end(cache_key)
+                _metrics.inc('excel_compare_header_probe_cache_total', result='hit')
+                return cached
+        _metrics.inc('excel_compare_header_probe_cache_total', result='miss')
+        
+        rows = self._iter_table_rows(file_path, max_row=HEADER_PROBE_ROWS + 1)
+        try:
+            headers = self._build_headers(next(rows, None))
+            column_values = [[] for _ in headers]
+            for row in rows:
+                for i, cell in enumerate(row[:len(headers)]):
+                    if cell is not None and str(cell).strip() != '':
+                        column_values[i].append(cell)
+        finally:
+            rows.close()
+        
+        columns = []
+        for name, values in zip(headers, column_values):
+            samples = []
+            for v in values:
+                sample = str(v).strip()
+                if sample not in samples:
+                    samples.append(sample)
+                if len(samples) >= HEADER_PROBE_SAMPLES:
+                    break
+            columns.append({
+                'name': name,
+                'type': self._infer_column_type(values),
+                'samples': samples
+            })
+        
+        result = {'headers': headers, 'columns': columns}
+        with _header_probe_lock:
+            _header_probe_cache[cache_key] = result
+            while len(_header_probe_cache) > HEADER_PROBE_CACHE_SIZE:
+                _header_probe_cache.popitem(last=False)
+        return result
+    
+    def _should_load_parallel(self, file_paths):
+        """是否值得把这些文件放到子进程中并行读取"""
+        if LOAD_WORKERS < 2 or len(file_paths) < 2:
+            return False
+        total = 0
+        for path in file_paths:
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                return False  # 文件不存在等错误交给读取方法报告
+        return total >= PARALLEL_LOAD_MIN_MB * 1024 * 1024
+    
+    def _run_loaders(self, tasks, file_paths):
+        """执行一组读取任务，文件足够大时提交到进程池并行执行
+        
+        Args:
+            tasks: [(进度阶段, 方法名, 参数元组), ...]，方法返回值需可pickle
+            file_paths: 用于判断是否并行的输入文件
+        
+        Returns:
+            与tasks顺序一致的结果列表
+        """
+        if self._should_load_parallel(file_paths):
+            try:
+                executor = _get_load_executor()
+                futures = [executor.submit(_worker_call, method, *args) for _, method, args in tasks]
+            except BrokenProcessPool:
+                _reset_load_executor()
+            else:
+                try:
+                    results = []
+                    for (phase, _, _), future in zip(tasks, futures):
+                        _report_progress(phase)
+                        results.append(self._wait_future(future))
+                    return results
+                except BrokenProcessPool:
+                    _reset_load_executor()
+                finally:
+                    for future in futures:
+                        future.cancel()
+        
+        # 串行读取（小文件，或进程池不可用）
+        results = []
+        for phase, method, args in tasks:
+            _report_progress(phase)
+            results.append(getattr(self, method)(*args))
+        return results
+    
+    def _wait_future(self, future):
+        """等待子进程结果，等待期间定期检查任务是否已被取消"""
+        while not wait([future], timeout=0.5, return_when=FIRST_COMPLETED).done:
+            _report_progress()
+        return future.result()
+    
+    def _read_source_sheet(self, file_path, source_format='full'):
+        """读取源文件的活动sheet：单元格值，以及（保留格式时）样式、列宽和行高
+        
+        结果既用于比对计算，也用于把源文件嵌入结果workbook，
+        每个输入文件每次请求只解析一次（可在子进程中执行后回传）。
+        只写值时以只读模式流式解析，不构建单元格对象和样式；.xls、CSV/TSV 和 Parquet/Arrow 直接逐行读取（不含格式）。
+        
+        Args:
+            file_path: 源文件路径
+            source_format: full / values / auto（见 SOURCE_FORMATS）
+        
+        Returns:
+            {'rows': 各行值元组（包含表头行和空行）,
+             'styles': 各行样式编号元组（对应style_table下标，None表示无样式；只写值时为None）,
+             'style_table': [(font, border, fill, number_format, protection, alignment), ...],
+             'column_widths': {列字母: 宽度}, 'row_heights': {行号: 高度},
+             'size': 估算内存字节数, 'path': 源文件绝对路径}
+        """
+        if source_format not in SOURCE_FORMATS:
+            raise Exception(f'不支持的源文件格式选项: {source_format}')
+        
+        # 处理中文路径
+        if sys.platform == 'win32' and isinstance(file_path, str):
+            # Windows上确保路径是Unicode字符串
+            file_path = os.path.normpath(file_path)
+        
+        unstyled = not self._has_cell_styles(file_path)
+        if source_format != 'full' or unstyled:
+            rows, total, close = self._open_table_rows(file_path)
+            try:
+                if unstyled or source_format == 'values' or self._use_values_only(total):
+                    source = self._snapshot_values(rows, total)
+                    if unstyled and source_format != 'values':
+                        # .xls（xlrd不读取格式信息）、CSV/TSV和Parquet/Arrow的源数据视为全部无样式
+                        source['styles'] = [()] * len(source['rows'])
+                    source['path'] = os.path.abspath(file_path)
+                    return source
+                if total is None:
+                    # 工作表没有<dimension>记录时只读模式不知道总行数：先按值读取并计数，
+                    # 超过阈值的大表直接只写值，不再以完整模式加载
+                    source = self._snapshot_values(rows, None)
+                    if self._use_values_only(len(source['rows'])):
+                        source['path'] = os.path.abspath(file_path)
+                        return source
+            finally:
+                close()
+        
+        # 完整模式：读取样式、列宽和行高（auto格式下行数不多时）
+        wb, temp_file = self._load_workbook_safe(file_path, data_only=True)
+        try:
+            source = self._snapshot_styled(wb.active)
+            source['path'] = os.path.abspath(file_path)
+            return source
         finally:
             wb.close()
             # 清理临时文件
@@ -1769,89 +3418,384 @@ class RequestHandler(BaseHTTPRequestHandler):
                 except:
                     pass
     
-    def _copy_sheet_from_file(self, target_wb, source_file, sheet_name, highlight_rows=None):
-        """从源文件复制sheet到目标workbook，可选择高亮指定行
+    def _use_values_only(self, row_count):
+        """auto格式下，源表是否大到只写值"""
+        return SOURCE_VALUES_ONLY_ROWS > 0 and (row_count or 0) > SOURCE_VALUES_ONLY_ROWS
+    
+    def _snapshot_values(self, row_iter, total):
+        """收集逐行读取的单元格值（不含格式）"""
+        rows = []
+        size = 0
+        for row_num, values in enumerate(row_iter, 1):
+            rows.append(values)
+            size += TableCache.estimate_row_size(values)
+            if row_num % PROGRESS_INTERVAL == 0:
+                _report_progress(rows=PROGRESS_INTERVAL, total=total)
+        return {
+            'rows': rows,
+            'styles': None,
+            'style_table': [],
+            'column_widths': {},
+            'row_heights': {},
+            'size': size
+        }
+    
+    def _snapshot_styled(self, ws):
+        """从完整模式的sheet中收集单元格值、样式、列宽和行高
+        
+        样式按源样式数组去重：每种样式只复制一次，单元格只记录其在style_table中的编号。
+        """
+        total = ws.max_row
+        rows = []
+        styles = []
+        style_table = []
+        style_ids = {}   # 源样式数组 -> style_table下标（相同样式只复制一次）
+        row_styles = {}  # 相同的行样式元组只保留一份
+        size = 0
+        for row_num, row in enumerate(ws.iter_rows(), 1):
+            values = tuple(cell.value for cell in row)
+            row_style = []
+            for cell in row:
+                if not cell.has_style:
+                    row_style.append(None)
+                    continue
+                style_key = tuple(cell._style)
+                style_id = style_ids.get(style_key)
+                if style_id is None:
+                    style_id = style_ids[style_key] = len(style_table)
+                    style_table.append((copy(cell.font), copy(cell.border), copy(cell.fill),
+                                        cell.number_format, copy(cell.protection), copy(cell.alignment)))
+                    size += TableCache.estimate_object_size(style_table[-1])
+                row_style.append(style_id)
+            row_style = tuple(row_style)
+            rows.append(values)
+            shared_style = row_styles.setdefault(row_style, row_style)
+            if shared_style is row_style:
+                # 新出现的行样式元组计入一次，重复的行只共享引用
+                size += TableCache.estimate_row_size(row_style)
+            styles.append(shared_style)
+            size += TableCache.estimate_row_size(values)
+            if row_num % PROGRESS_INTERVAL == 0:
+                _report_progress(rows=PROGRESS_INTERVAL, total=total)
+        size += sys.getsizeof(styles)
+        
+        return {
+            'rows': rows,
+            'styles': styles,
+            'style_table': style_table,
+            'column_widths': {col: dim.width for col, dim in ws.column_dimensions.items()},
+            'row_heights': {row_num: dim.height for row_num, dim in ws.row_dimensions.items()},
+            'size': size
+        }
+    
+    def _load_sources(self, file_paths, phases, source_format='full'):
+        """读取多个源文件，返回与file_paths顺序一致的源数据列表
+        
+        缓存中的源数据满足所需格式时直接使用；其余文件合计足够大时在子进程中并行解析，
+        解析结果放入 _table_cache。
+        """
+        sources = [None] * len(file_paths)
+        pending = []
+        for i, path in enumerate(file_paths):
+            cached = _table_cache.get(TableCache.make_key(path))
+            if cached is None:
+                pending.append(i)
+            elif source_format == 'values' or (
+                    source_format == 'auto' and self._use_values_only(len(cached['rows']))):
+                # 只写值：缓存中是带格式的源数据时去掉格式，输出与缓存状态无关
+                _report_progress(phases[i])
+                sources[i] = self._values_view(cached)
+            elif cached['styles'] is not None:
+                _report_progress(phases[i])
+                sources[i] = cached
+            else:
+                pending.append(i)
+        
+        results = self._run_loaders(
+            [(phases[i], '_read_source_sheet', (file_paths[i], source_format)) for i in pending],
+            [file_paths[i] for i in pending]
+        )
+        for i, source in zip(pending, results):
+            _table_cache.put(TableCache.make_key(file_paths[i]), source, source['size'])
+            _record_file_bytes('excel_compare_bytes_read_total', file_paths[i], format=_file_format(file_paths[i]))
+            _record_rows_read(len(source['rows']), sum(map(len, source['rows'])))
+            sources[i] = source
+        return sources
+    
+    def _values_view(self, source):
+        """源数据的只写值视图：共享单元格值，不含样式、列宽和行高"""
+        if source['styles'] is None:
+            return source
+        return dict(source, styles=None, style_table=[], column_widths={}, row_heights={})
+    
+    def _load_source_tables(self, file_paths, phases, source_format, source_output):
+        """读取比对输入，返回 (源数据列表, 表格列表)
+        
+        清单模式不嵌入源数据：各文件流式读取，不整表载入内存（适合超大CSV/TSV），
+        数据行数在遍历表格时累计到源数据中（缓存中已有的直接使用）；
+        其余模式读取完整源数据（大文件在子进程中并行解析）。
+        """
+        if source_output != 'manifest':
+            sources = self._load_sources(file_paths, phases, source_format)
+            return sources, [self._source_table(source) for source in sources]
+        
+        sources = []
+        tables = []
+        for path, phase in zip(file_paths, phases):
+            cached = _table_cache.get(TableCache.make_key(path))
+            if cached is not None:
+                # 已解析过（如批量比对的共享输入）时直接使用，不再重新读取
+                _report_progress(phase)
+                sources.append(cached)
+                tables.append(self._source_table(cached))
+                continue
+            _record_file_bytes('excel_compare_bytes_read_total', path, format=_file_format(path))
+            source = {'path': os.path.abspath(path), 'rows': None, 'data_rows': 0}
+            table = self._stream_full_table(path)
+            table['data'] = self._count_data_rows(self._track_phase(table['data'], phase), source)
+            sources.append(source)
+            tables.append(table)
+        return sources, tables
+    
+    def _count_data_rows(self, rows, source):
+        """包装数据行迭代器，把遍历过的行数累计到 source['data_rows']（遍历结束后计入读取指标）"""
+        cells = 0
+        try:
+            for row in rows:
+                source['data_rows'] += 1
+                cells += len(row)
+                yield row
+        finally:
+            _record_rows_read(source['data_rows'], cells)
+    
+    def _source_table(self, source):
+        """把源数据转换为比对用的表格：{'headers': 表头列表, 'data': 数据行生成器（跳过全空行）}"""
+        rows = source['rows']
+        headers = self._build_headers(rows[0] if rows else None)
+        data = (
+            list(row) for row in islice(rows, 1, None)
+            if any(cell is not None and str(cell).strip() != '' for cell in row)
+        )
+        return {'headers': headers, 'data': data}
+    
+    def _read_full_table(self, file_path):
+        """读取完整的Excel表格（数据行全部载入内存）"""
+        table = self._stream_full_table(file_path)
+        return {
+            'headers': table['headers'],
+            'data': list(table['data'])
+        }
+    
+    def _copy_sheet_from_source(self, target_wb, source, sheet_name, highlight_rows=None, only_rows=None):
+        """把已读取的源数据作为新sheet写入目标workbook，可选择高亮指定行
+        
+        源样式按编号共享：每种样式（及其高亮版本）在目标sheet中只构建一次模板，
+        单元格直接复用模板的样式索引。源数据不含样式时只写值和高亮。
         
         Args:
             target_wb: 目标workbook
-            source_file: 源文件路径
+            source: 源数据（_read_source_sheet 的返回值）
             sheet_name: 新sheet名称
             highlight_rows: 需要标红的行号列表（从1开始，包含表头）
+            only_rows: 只写入这些行号（表头始终写入，依次紧凑排列），None表示写入全部行
         """
-        temp_file = None
         try:
-            source_wb, temp_file = self._load_workbook_safe(source_file, data_only=True)
-            source_ws = source_wb.active
-            
             # 创建新sheet
             target_ws = target_wb.create_sheet(title=sheet_name)
+            write_only = target_wb.write_only
+            
+            # 列宽、行高、冻结（只写模式需在写入行之前设置）
+            for col_letter, width in source['column_widths'].items():
+                target_ws.column_dimensions[col_letter].width = width
+            target_ws.freeze_panes = 'A2'
+            row_heights = source['row_heights']
             
             # 红色填充（用于标识不匹配的行）
             HIGHLIGHT_FILL = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
+            style_table = source['style_table']
+            templates = {}  # (样式编号, 是否高亮) -> 模板单元格
             
-            # 复制数据
-            for row in source_ws.iter_rows():
-                for cell in row:
-                    target_cell = target_ws.cell(row=cell.row, column=cell.column, value=cell.value)
-                    
-                    # 复制格式
-                    if cell.has_style:
-                        try:
-                            target_cell.font = cell.font.copy()
-                            target_cell.border = cell.border.copy()
-                            target_cell.fill = cell.fill.copy()
-                            target_cell.number_format = cell.number_format
-                            target_cell.protection = cell.protection.copy()
-                            target_cell.alignment = cell.alignment.copy()
-                        except:
-                            pass
-                    
-                    # 如果该行需要高亮，覆盖背景色
-                    if highlight_rows and cell.row in highlight_rows:
-                        target_cell.fill = HIGHLIGHT_FILL
-            
-            # 复制列宽
-            for col_letter in source_ws.column_dimensions:
-                if col_letter in source_ws.column_dimensions:
-                    target_ws.column_dimensions[col_letter].width = source_ws.column_dimensions[col_letter].width
+            def template_for(style_id, highlight):
+                key = (style_id, highlight)
+                template = templates.get(key)
+                if template is None:
+                    template = templates[key] = self._source_style_template(
+                        target_ws, style_table[style_id], HIGHLIGHT_FILL if highlight else None)
+                return template
             
-            # 复制行高
-            for row_num in source_ws.row_dimensions:
-                if row_num in source_ws.row_dimensions:
-                    target_ws.row_dimensions[row_num].height = source_ws.row_dimensions[row_num].height
-            
-            # 冻结表头
-            target_ws.freeze_panes = 'A2'
+            row_styles = source['styles']
+            target_row = 0
+            for row_num, values in enumerate(source['rows'], 1):
+                if only_rows is not None and row_num > 1 and row_num not in only_rows:
+                    continue
+                target_row += 1
+                row_style = row_styles[row_num - 1] if row_styles is not None else ()
+                highlight = bool(highlight_rows) and row_num in highlight_rows
+                if row_num in row_heights:
+                    target_ws.row_dimensions[target_row].height = row_heights[row_num]
+                if write_only:
+                    cells = []
+                    for col, value in enumerate(values):
+                        style_id = row_style[col] if col < len(row_style) else None
+                        if style_id is not None:
+                            cells.append(self._styled_cell(target_ws, value, template_for(style_id, highlight)))
+                        else:
+                            # 无源样式：保留按值自动设置的格式（如日期），只叠加高亮
+                            target_cell = WriteOnlyCell(target_ws, value=value)
+                            if highlight:
+                                target_cell.fill = HIGHLIGHT_FILL
+                            cells.append(target_cell)
+                    target_ws.append(cells)
+                else:
+                    for col, value in enumerate(values):
+                        target_cell = target_ws.cell(row=target_row, column=col + 1, value=value)
+                        style_id = row_style[col] if col < len(row_style) else None
+                        if style_id is not None:
+                            target_cell._style = copy(template_for(style_id, highlight)._style)
+                        elif highlight:
+                            target_cell.fill = HIGHLIGHT_FILL
                     
         except Exception as e:
             print(f"复制sheet失败: {e}")
-        finally:
-            # 清理临时文件
-            if temp_file and os.path.exists(temp_file):
-                try:
-                    os.unlink(temp_file)
-                except:
-                    pass
     
-    def _normalize_string(self, s):
-        """
+    def _resolve_source_output(self, data):
+        """读取并校验请求中的源数据输出策略"""
+        source_output = data.get('sourceOutput', 'embed')
+        if source_output not in SOURCE_OUTPUTS:
+            raise Exception(f'不支持的源数据输出策略: {source_output}')
+        return source_output
+    
+    def _write_source_sheets(self, wb, entries, source_output):
+        """按输出策略把源数据写入结果workbook
+        
+        Args:
+            wb: 结果workbook
+            entries: [(sheet名称, 源数据或None, 不匹配的行号集合或None), ...]
+                     行号集合为None表示该源没有行级匹配信息（unmatched 策略下完整嵌入）
+            source_output: embed / unmatched / manifest
+        """
+        entries = [entry for entry in entries if entry[1] is not None]
+        if source_output == 'manifest':
+            self._write_source_manifest(wb, entries)
+            return
+        for sheet_name, source, unmatched_rows in entries:
+            only_rows = unmatched_rows if source_output == 'unmatched' else None
+            self._copy_sheet_from_source(wb, source, sheet_name,
+                                         highlight_rows=unmatched_rows if unmatched_rows else None,
+                                         only_rows=only_rows)
+    
+    def _write_source_manifest(self, wb, entries):
+        """写入源文件清单sheet：文件路径、大小、修改时间、SHA256和行数"""
+        ws = wb.create_sheet("源文件清单")
+        headers = ['来源', '文件路径', '文件大小(字节)', '修改时间', 'SHA256', '总行数', '数据行数', '不匹配行数']
+        for col, width in enumerate([24, 60, 16, 20, 68, 10, 10, 12], 1):
+            ws.column_dimensions[get_column_letter(col)].width = width
+        ws.freeze_panes = 'A2'
+        
+        header_style = self._make_cell_style(
+            ws, fill=PatternFill(start_color="DCDCDC", end_color="DCDCDC", fill_type="solid"),
+            font=Font(bold=True), alignment=Alignment(horizontal='center')
+        )
+        ws.append([self._styled_cell(ws, h, header_style) for h in headers])
+        
+        for sheet_name, source, unmatched_rows in entries:
+            path = source.get('path', '')
+            try:
+                stat = os.stat(path)
+                file_size = stat.st_size
+                modified = datetime.datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+                digest = self._file_sha256(path)
+            except OSError:
+                file_size = modified = digest = '文件不可访问'
+            rows = source['rows']
+            if rows is None:
+                # 流式读取的源数据只累计了数据行数（只读了前两行的横向数据不统计）
+                total_rows = '-'
+                data_rows = source['data_rows'] if source['data_rows'] is not None else '-'
+            else:
+                total_rows = len(rows)
+                data_rows = sum(
+                    1 for row in islice(rows, 1, None)
+                    if any(cell is not None and str(cell).strip() != '' for cell in row)
+                )
+            ws.append([
+                sheet_name, path, file_size, modified, digest, total_rows, data_rows,
+                len(unmatched_rows) if unmatched_rows is not None else '-'
+            ])
+    
+    def _write_performance_sheet(self, wb):
+        """请求要求时写入“性能”sheet：到保存之前各阶段的耗时、CPU时间和内存
+        
+        保存文件阶段在写入本sheet之后，其耗时只在返回结果的 performance 和日志中。
+        """
+        timer = getattr(_job_local, 'timer', None)
+        if timer is None or not timer.sheet:
+            return
+        performance = timer.snapshot()
+        ws = wb.create_sheet("性能")
+        ws.column_dimensions['A'].width = 16
+        ws.column_dimensions['B'].width = 14
+        for col in 'CDEFG':
+            ws.column_dimensions[col].width = 14
+        ws.append(['阶段', '代码', '耗时(秒)', 'CPU(秒)', '内存(MB)', '内存变化(MB)', '阶段最高内存(MB)'])
+        for phase in performance['phases']:
+            ws.append([phase['label'], phase['phase'], phase['seconds'], phase['cpuSeconds'],
+                       phase['rssMB'], phase['rssDeltaMB'], phase['maxRssMB']])
+        ws.append(['合计（保存前）', '', performance['totalSeconds'], performance['cpuSeconds'],
+                   None, None, performance['maxRssMB']])
+        ws.append([])
+        ws.append(['说明', 'CPU为比对线程的CPU时间（子进程并行读取的CPU不计入）；内存为阶段结束时的常驻内存，'
+                           '变化为相对阶段开始的增减，最高值为阶段内的采样最高值；保存文件的耗时见API返回结果和日志'])
+    
+    def _file_sha256(self, path):
+        """分块计算文件的SHA256"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def _source_rows_with_keys(self, source, dim_columns, keys):
+        """找出源表中维度键（标准化后）属于keys的明细行号（从1开始，包含表头）"""
+        if source is None or not source['rows']:
+            return set()
+        headers = self._build_headers(source['rows'][0])
+        header_map = {self._normalize_string(h): idx for idx, h in enumerate(headers)}
+        dim_indices = [header_map[n] for n in map(self._normalize_string, dim_columns) if n in header_map]
+        
+        row_nums = set()
+        for row_num, row in enumerate(islice(source['rows'], 1, None), 2):
+            if not any(cell is not None and str(cell).strip() != '' for cell in row):
+                continue  # 全空行不参与聚合
+            row_len = len(row)
+            dim_key = self._normalize_dimension_key([row[i] if i < row_len else None for i in dim_indices])
+            if dim_key in keys:
+                row_nums.add(row_num)
+        return row_nums
+    
+    def _source_style_template(self, ws, style, highlight_fill=None):
+        """根据源样式（style_table中的一项）构建共享的样式模板单元格，可叠加高亮背景色"""
+        template = WriteOnlyCell(ws)
+        try:
+            (template.font, template.border, template.fill,
+             template.number_format, template.protection, template.alignment) = style
+        except:
+            pass
+        if highlight_fill is not None:
+            template.fill = highlight_fill
+        return template
+    
+    def _normalize_string(self, s):
+        """
         标准化字符串，忽略：
         - 空格
         - 下划线 _
         - 中文括号 （）【】
         - 英文括号 ()[]
         """
-        import re
         if s is None:
             return ''
-        s = str(s).strip()
-        # 移除空格
-        s = s.replace(' ', '')
-        # 移除下划线
-        s = s.replace('_', '')
-        # 移除各种括号
-        s = re.sub(r'[()（）\[\]【】]', '', s)
-        return s.lower()
+        return _normalize_text(s if type(s) is str else str(s))
     
     def _normalize_dimension_key(self, key_values):
         """
@@ -1861,29 +3805,109 @@ class RequestHandler(BaseHTTPRequestHandler):
         - 中文括号 （）【】
         - 英文括号 ()[]
         """
-        normalized = []
-        for val in key_values:
-            normalized.append(self._normalize_string(val))
-        return tuple(normalized)
+        return tuple(map(self._normalize_string, key_values))
     
     def _create_dimension_result(self, output, table_a, table_b, key_columns, 
                                  table_a_name, table_b_name, diff_threshold,
-                                 table_a_file=None, table_b_file=None):
-        """生成维度比对结果Excel"""
-        HEADER = PatternFill(start_color="DCDCDC", end_color="DCDCDC", fill_type="solid")
-        ERROR_FILL = PatternFill(start_color="FFE6E6", end_color="FFE6E6", fill_type="solid")
-        GREEN_FILL = PatternFill(start_color="90EE90", end_color="90EE90", fill_type="solid")
-        RED_FILL = PatternFill(start_color="FFB6C1", end_color="FFB6C1", fill_type="solid")
-        ROW_MISSING_FILL = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")  # 行不匹配的红色标识
-        border = Border(
-            left=Side(style='thin'), right=Side(style='thin'),
-            top=Side(style='thin'), bottom=Side(style='thin')
-        )
+                                 source_a=None, source_b=None, engine='auto', source_output='embed',
+                                 parquet_output=None):
+        """生成维度比对结果Excel
         
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "维度比对结果"
+        使用openpyxl只写模式：样式预先构建并共享，结果行边生成边写入文件，
+        内存占用不随结果行数增长。
+        table_a/table_b 的 data 可以是列表或行生成器（只遍历一次）；
+        source_a/source_b 为已读取的源数据（_read_source_sheet），按 source_output 策略写入结果；
+        parquet_output 为差异表Parquet文件路径（None表示不输出），与Excel结果同步逐批写入
+        
+        Returns:
+            {'rows_a': 表A数据行数, 'rows_b': 表B数据行数, 'column_plan': 列对齐方案,
+             'summary': 结果汇总（见 _diff_summary）}
+        """
+        wb = Workbook(write_only=True)
+        result = None
+        partial_files = [parquet_output]
+        try:
+            ws = wb.create_sheet("维度比对结果")
+            
+            result = self._build_dimension_result(table_a, table_b, key_columns, table_a_name, table_b_name,
+                                                  diff_threshold, engine)
+            if parquet_output:
+                result['rows'] = self._tee_parquet_rows(result, parquet_output)
+            summary = self._render_dimension_result(ws, result, diff_threshold)
+            
+            # 按输出策略写入源文件，并标红不匹配的行
+            _report_progress('copying')
+            self._write_source_sheets(wb, [
+                (f"源文件_{table_a_name}", source_a, result['unmatched_a_rows']),
+                (f"源文件_{table_b_name}", source_b, result['unmatched_b_rows'])
+            ], source_output)
+            self._write_performance_sheet(wb)
+            
+            # 保存文件
+            _report_progress('saving')
+            partial_files.append(output)
+            try:
+                wb.save(output)
+            except Exception as e:
+                if sys.platform == 'win32':
+                    output_bytes = output.encode('utf-8')
+                    wb.save(output_bytes.decode('utf-8'))
+                else:
+                    raise e
+        except BaseException:
+            self._discard_partial_result(wb, result, partial_files)
+            raise
+        _record_file_bytes('excel_compare_bytes_written_total', output, mode=_metrics_mode(), format='xlsx')
+        
+        return {'rows_a': result['rows_a'], 'rows_b': result['rows_b'], 'column_plan': result['column_plan'],
+                'summary': summary}
+    
+    def _discard_partial_result(self, wb, result, paths):
+        """比对失败或被取消时丢弃未完成的结果
+        
+        关闭结果行生成器（同时关闭差异表Parquet写入），关闭只写workbook各sheet的写入流并删除
+        openpyxl的临时文件，再删除已部分写入的结果文件（paths中为None的项忽略）。
+        """
+        if result is not None:
+            result['rows'].close()
+        if wb.write_only:
+            for ws in wb.worksheets:
+                writer = ws._writer
+                if writer is None or ws.closed:
+                    continue
+                if ws._rows is not None:
+                    ws._rows.close()  # 先结束sheetData元素，再关闭文件流
+                writer.close()
+                if os.path.exists(writer.out):
+                    os.unlink(writer.out)
+        else:
+            wb.close()
+        for path in paths:
+            if path and os.path.exists(path):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+    
+    def _build_dimension_result(self, table_a, table_b, key_columns, table_a_name, table_b_name,
+                                diff_threshold, engine='auto'):
+        """维度比对核心：按标准化维度键匹配A、B两表，构建内存中的结果模型
         
+        索引在此处一次性构建（会消费 table_a/table_b 的 data），
+        结果行由 rows 生成器按需产出，渲染时边生成边写入。
+        指标差异按块批量计算，engine 为 'numpy' 或 'auto'（已安装NumPy时）使用向量化引擎。
+        
+        Returns:
+            {'headers': 结果表头, 'key_columns': 维度列数,
+             'rows': 结果行生成器，每行为 [(值, 类型), ...]，类型为 dim/green/red/text/error,
+             'engine': 实际使用的差异计算引擎,
+             'column_plan': 列对齐方案（见 _build_column_plan）,
+             'total_rows': 结果行数, 'rows_a': 表A数据行数, 'rows_b': 表B数据行数,
+             'unmatched_a_rows': A表不匹配的源文件行号集合（rows 遍历完后完整）,
+             'unmatched_b_rows': B表不匹配的源文件行号集合（rows 遍历完后完整）,
+             'row_counts': 各类结果行数 {'matched', 'only_a', 'only_b'}（rows 遍历完后完整）}
+        """
+        _report_progress('matching')
         headers_a = table_a['headers']
         headers_b = table_b['headers']
         data_a = table_a['data']
@@ -1891,24 +3915,14 @@ class RequestHandler(BaseHTTPRequestHandler):
         
         # 1. 确定维度列和指标列
         dim_headers = headers_b[:key_columns]  # 维度列使用B表的表头
-        indicators_a = headers_a[key_columns:]  # A表的指标列
         indicators_b = headers_b[key_columns:]  # B表的指标列
         
-        # 2. 构建表头（维度列 + 指标列，指标列显示差异值）
-        result_headers = list(dim_headers) + list(indicators_b)
-        
-        # 写入表头
-        for col, h in enumerate(result_headers, 1):
-            c = ws.cell(row=1, column=col, value=h)
-            c.fill = HEADER
-            c.font = Font(bold=True)
-            c.alignment = Alignment(horizontal='center')
-            c.border = border
-        
-        # 3. 构建A和B的索引（标准化键 -> (行数据, 原始行号)）
+        # 2. 构建A和B的索引（标准化键 -> (行数据, 原始行号)）
         a_index = {}
         a_row_nums = {}  # 标准化键 -> 源文件行号（从2开始，1是表头）
+        rows_a = 0
         for idx, row_data in enumerate(data_a):
+            rows_a += 1
             key_vals = row_data[:key_columns]
             norm_key = self._normalize_dimension_key(key_vals)
             a_index[norm_key] = row_data
@@ -1917,141 +3931,316 @@ class RequestHandler(BaseHTTPRequestHandler):
         b_index = {}
         b_row_nums = {}  # 标准化键 -> 源文件行号
         b_keys_order = []  # 保持B表的行顺序
+        rows_b = 0
         for idx, row_data in enumerate(data_b):
+            rows_b += 1
             key_vals = row_data[:key_columns]
             norm_key = self._normalize_dimension_key(key_vals)
             b_index[norm_key] = row_data
             b_row_nums[norm_key] = idx + 2
             b_keys_order.append((norm_key, row_data[:key_columns]))
         
-        # 4. 生成结果行
-        result_rows = []
-        matched_a_keys = set()
+        # 列对齐方案：每个B表指标在A、B两表中的列索引只计算一次，所有行复用
+        column_plan = self._build_column_plan(headers_a, headers_b, key_columns)
+        
+        only_a_count = sum(1 for norm_key in a_index if norm_key not in b_index)
+        use_numpy = self._resolve_diff_engine(engine) == 'numpy'
         unmatched_a_rows = set()  # A表中不匹配的行号
         unmatched_b_rows = set()  # B表中不匹配的行号
+        # 按产出的结果行计数（行号集合会合并重复的维度键）
+        row_counts = dict.fromkeys(('matched', 'only_a', 'only_b'), 0)
         
-        # 遍历B表的行
-        for norm_key, original_key_vals in b_keys_order:
-            result_row = []
-            result_row_meta = []  # 存储元数据：类型（diff/error_a/error_b）和原始值
-            row_type = 'both'  # 记录行类型：'both'（都有）、'only_a'（只在A）、'only_b'（只在B）
-            
-            # 维度列（来自B表）
-            for val in original_key_vals:
-                result_row.append(val)
-                result_row_meta.append(('dim', None))
-            
-            # 查找A表中是否有匹配的行
-            if norm_key in a_index:
-                # A和B都有
-                matched_a_keys.add(norm_key)
-                a_row = a_index[norm_key]
-                b_row = b_index[norm_key]
-                row_type = 'both'
+        def result_rows():
+            matched_a_keys = set()
+            
+            # 3. 按块遍历B表的行：先批量计算块内已匹配行的指标差异，再按B表顺序产出结果行
+            for start in range(0, len(b_keys_order), DIFF_CHUNK_ROWS):
+                chunk = b_keys_order[start:start + DIFF_CHUNK_ROWS]
+                pairs = [(a_index[norm_key], b_index[norm_key]) for norm_key, _ in chunk if norm_key in a_index]
+                diff_rows = iter(self._diff_block(pairs, column_plan, table_a_name, table_b_name,
+                                                  diff_threshold, use_numpy))
                 
-                # 填充指标列（显示差异值 A - B）
-                for ind in indicators_b:
-                    if ind in indicators_a:
-                        # A和B都有这个指标
-                        a_idx = headers_a.index(ind)
-                        b_idx = headers_b.index(ind)
-                        a_val = a_row[a_idx] if a_idx < len(a_row) else None
-                        b_val = b_row[b_idx] if b_idx < len(b_row) else None
-                        
-                        # 尝试计算差异
-                        diff_val = self._calculate_diff(a_val, b_val, table_a_name, table_b_name)
-                        result_row.append(diff_val)
-                        result_row_meta.append(('diff', diff_val))
+                for norm_key, original_key_vals in chunk:
+                    # 维度列（来自B表）
+                    cells = [(val, 'dim') for val in original_key_vals]
+                    
+                    # 查找A表中是否有匹配的行
+                    if norm_key in a_index:
+                        # A和B都有：指标列显示差异值 B - A（A表缺少的指标标记error）
+                        matched_a_keys.add(norm_key)
+                        row_counts['matched'] += 1
+                        cells.extend(next(diff_rows))
                     else:
-                        # B有但A没有的指标
-                        result_row.append(f'{table_a_name}表error')
-                        result_row_meta.append(('error', None))
+                        # 只有B有，A没有
+                        unmatched_b_rows.add(b_row_nums[norm_key])  # 记录B表中不匹配的行号
+                        row_counts['only_b'] += 1
+                        for _ in column_plan:
+                            cells.append((f'{table_a_name}表error', 'error'))
+                    
+                    yield cells
+            
+            # 4. 添加A表独有的行
+            for norm_key, a_row in a_index.items():
+                if norm_key not in matched_a_keys:
+                    # 只有A有，B没有
+                    unmatched_a_rows.add(a_row_nums[norm_key])  # 记录A表中不匹配的行号
+                    row_counts['only_a'] += 1
+                    
+                    # 维度列（来自A表）
+                    cells = [(val, 'dim') for val in a_row[:key_columns]]
+                    
+                    # 指标列
+                    for ind, a_idx, b_idx in column_plan:
+                        if a_idx is not None:
+                            # A和B都有这个指标列，但这一行只在A表
+                            cells.append((f'{table_b_name}表error', 'error'))
+                        else:
+                            # 这个指标列只在B表，这一行也只在A表
+                            # 显示两个error
+                            cells.append((f'{table_a_name}表error, {table_b_name}表error', 'error'))
+                    
+                    yield cells
+        
+        return {
+            'headers': list(dim_headers) + list(indicators_b),
+            'key_columns': key_columns,
+            'rows': result_rows(),
+            'engine': 'numpy' if use_numpy else 'python',
+            'column_plan': column_plan,
+            'total_rows': len(b_keys_order) + only_a_count,
+            'rows_a': rows_a,
+            'rows_b': rows_b,
+            'unmatched_a_rows': unmatched_a_rows,
+            'unmatched_b_rows': unmatched_b_rows,
+            'row_counts': row_counts
+        }
+    
+    def _parquet_output_path(self, output_path):
+        """差异表Parquet文件与Excel结果同名，放在同一目录"""
+        if not PYARROW_OK:
+            raise Exception('缺少pyarrow库，无法输出Parquet文件。请安装pyarrow')
+        return os.path.splitext(output_path)[0] + '.parquet'
+    
+    def _tee_parquet_rows(self, result, parquet_path):
+        """包装结果行生成器：返回的生成器产出每一行的同时按批写入差异表Parquet文件
+        
+        每个维度列为文本列；每个指标输出三列：差异值（B - A，float，无法计算时为空）、
+        `指标_状态`（green/red/text/error，与Excel结果的颜色分类一致）和 `指标_说明`（error或无法计算的提示）。
+        """
+        key_columns = result['key_columns']
+        headers = [str(h) if h is not None else '' for h in result['headers']]
+        fields = [pa.field(name, pa.string()) for name in headers[:key_columns]]
+        for name in headers[key_columns:]:
+            fields.extend([
+                pa.field(name, pa.float64()),
+                pa.field(f'{name}_状态', pa.string()),
+                pa.field(f'{name}_说明', pa.string())
+            ])
+        schema = pa.schema(fields)
+        
+        def write_batch(writer, batch):
+            columns = []
+            for col_idx in range(len(headers)):
+                cells = [row[col_idx] for row in batch]
+                if col_idx < key_columns:
+                    columns.append([str(val) if val is not None else None for val, _ in cells])
+                    continue
+                numeric = [kind in ('green', 'red') for _, kind in cells]
+                columns.append([float(val) if is_num else None for (val, _), is_num in zip(cells, numeric)])
+                columns.append([kind for _, kind in cells])
+                columns.append([None if is_num else str(val) for (val, _), is_num in zip(cells, numeric)])
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema
+            ))
+        
+        def tee(rows):
+            writer = pq.ParquetWriter(parquet_path, schema)
+            try:
+                batch = []
+                for cells in rows:
+                    batch.append(cells)
+                    if len(batch) >= COLUMNAR_BATCH_ROWS:
+                        write_batch(writer, batch)
+                        batch = []
+                    yield cells
+                if batch:
+                    write_batch(writer, batch)
+            finally:
+                writer.close()
+                _record_file_bytes('excel_compare_bytes_written_total', parquet_path,
+                                   mode=_metrics_mode(), format='parquet')
+        
+        return tee(result['rows'])
+    
+    def _resolve_diff_engine(self, engine):
+        """确定差异计算引擎：auto 在已安装NumPy时使用 numpy，否则使用 python"""
+        if engine == 'numpy':
+            if not NUMPY_OK:
+                raise Exception('缺少numpy库，无法使用向量化差异计算引擎。请安装numpy或选择python引擎')
+            return 'numpy'
+        if engine == 'auto' and NUMPY_OK:
+            return 'numpy'
+        return 'python'
+    
+    def _build_column_plan(self, headers_a, headers_b, key_columns):
+        """构建维度比对的列对齐方案（每次比对只构建一次，逐行复用）
+        
+        Returns:
+            [(B表指标名, A表列索引或None, B表列索引), ...]，按B表指标顺序；
+            A表列索引为None表示该指标只在B表中存在
+        """
+        indicators_a = set(headers_a[key_columns:])
+        first_index_a = {}
+        for idx, header in enumerate(headers_a):
+            first_index_a.setdefault(header, idx)
+        first_index_b = {}
+        for idx, header in enumerate(headers_b):
+            first_index_b.setdefault(header, idx)
+        
+        plan = []
+        for ind in headers_b[key_columns:]:
+            a_idx = first_index_a[ind] if ind in indicators_a else None
+            plan.append((ind, a_idx, first_index_b[ind]))
+        return plan
+    
+    def _describe_column_plan(self, column_plan):
+        """把列对齐方案转换为便于诊断的JSON结构（列号为Excel列字母）"""
+        return [{
+            'indicator': ind,
+            'columnA': get_column_letter(a_idx + 1) if a_idx is not None else None,
+            'columnB': get_column_letter(b_idx + 1)
+        } for ind, a_idx, b_idx in column_plan]
+    
+    def _diff_block(self, pairs, column_plan, table_a_name, table_b_name, diff_threshold, use_numpy):
+        """批量计算一组已匹配行的指标差异（B - A）及颜色分类
+        
+        Args:
+            pairs: [(A表行, B表行), ...]
+            use_numpy: 是否使用NumPy向量化计算（结果与逐个计算完全一致）
+            
+        Returns:
+            每个匹配行一个列表 [(值, 类型), ...]，按 column_plan 顺序；
+            类型为 green/red（数值差异）、text（无法计算的提示）或 error（A表缺少该指标）
+        """
+        if not pairs:
+            return []
+        
+        a_error = f'{table_a_name}表error'
+        aligned = [(a_idx, b_idx) for ind, a_idx, b_idx in column_plan if a_idx is not None]
+        a_columns = iter(self._extract_columns([a_row for a_row, _ in pairs], [a for a, _ in aligned]))
+        b_columns = iter(self._extract_columns([b_row for _, b_row in pairs], [b for _, b in aligned]))
+        
+        columns = []
+        for ind, a_idx, b_idx in column_plan:
+            if a_idx is None:
+                # B有但A没有的指标
+                columns.append([(a_error, 'error')] * len(pairs))
+                continue
+            
+            a_vals = next(a_columns)
+            b_vals = next(b_columns)
+            if use_numpy:
+                columns.append(self._diff_column_numpy(a_vals, b_vals, table_a_name, table_b_name, diff_threshold))
             else:
-                # 只有B有，A没有
-                row_type = 'only_b'
-                unmatched_b_rows.add(b_row_nums[norm_key])  # 记录B表中不匹配的行号
-                for ind in indicators_b:
-                    result_row.append(f'{table_a_name}表error')
-                    result_row_meta.append(('error', None))
-            
-            result_rows.append((result_row, result_row_meta, row_type))
-        
-        # 5. 添加A表独有的行
-        for norm_key, a_row in a_index.items():
-            if norm_key not in matched_a_keys:
-                # 只有A有，B没有
-                result_row = []
-                result_row_meta = []
-                row_type = 'only_a'
-                unmatched_a_rows.add(a_row_nums[norm_key])  # 记录A表中不匹配的行号
-                
-                # 维度列（来自A表）
-                original_key_vals = a_row[:key_columns]
-                for val in original_key_vals:
-                    result_row.append(val)
-                    result_row_meta.append(('dim', None))
-                
-                # 指标列
-                for ind in indicators_b:
-                    if ind in indicators_a:
-                        # A和B都有这个指标列，但这一行只在A表
-                        result_row.append(f'{table_b_name}表error')
-                        result_row_meta.append(('error', None))
+                column = []
+                for a_val, b_val in zip(a_vals, b_vals):
+                    diff_val = self._calculate_diff(a_val, b_val, table_a_name, table_b_name)
+                    if isinstance(diff_val, (int, float)):
+                        column.append((diff_val, 'green' if abs(diff_val) < diff_threshold else 'red'))
                     else:
-                        # 这个指标列只在B表，这一行也只在A表
-                        # 显示两个error
-                        result_row.append(f'{table_a_name}表error, {table_b_name}表error')
-                        result_row_meta.append(('error', None))
-                
-                result_rows.append((result_row, result_row_meta, row_type))
+                        column.append((diff_val, 'text'))
+                columns.append(column)
         
-        # 6. 写入数据行，并根据差异值标记颜色
-        for row_idx, (row_data, row_meta, row_type) in enumerate(result_rows, 2):
-            for col_idx, (value, meta) in enumerate(zip(row_data, row_meta), 1):
-                cell = ws.cell(row=row_idx, column=col_idx, value=value)
-                cell.border = border
-                
-                # 根据单元格类型标记颜色
-                if meta[0] == 'error':
-                    # Error标记：红色背景
-                    cell.fill = ERROR_FILL
-                    cell.font = Font(color="FF0000")
-                elif meta[0] == 'diff' and isinstance(meta[1], (int, float)):
-                    # 差异值：根据阈值标记颜色
-                    abs_diff = abs(meta[1])
-                    if abs_diff < diff_threshold:
-                        cell.fill = GREEN_FILL
-                    else:
-                        cell.fill = RED_FILL
+        return [list(row) for row in zip(*columns)] if columns else [[] for _ in pairs]
+    
+    def _extract_columns(self, rows, indices):
+        """按列索引批量取出多列的值（行长度不足时视为None）
         
-        # 7. 添加图例（放在右上角）
-        legend_start_col = len(result_headers) + 2
-        legend_row = 1
-        
-        # 图例标题
-        legend_title = ws.cell(row=legend_row, column=legend_start_col, value="图例")
-        legend_title.font = Font(bold=True)
-        legend_title.border = border
-        
-        # 绿色图例
-        legend_row += 1
-        green_cell = ws.cell(row=legend_row, column=legend_start_col, value=f"|差异| < {diff_threshold}")
-        green_cell.fill = GREEN_FILL
-        green_cell.border = border
-        
-        # 红色图例
-        legend_row += 1
-        red_cell = ws.cell(row=legend_row, column=legend_start_col, value=f"|差异| ≥ {diff_threshold}")
-        red_cell.fill = RED_FILL
-        red_cell.border = border
-        
-        # 源文件行不匹配说明
-        legend_row += 1
-        missing_cell = ws.cell(row=legend_row, column=legend_start_col, value="不匹配行已在源文件sheet中标红")
-        missing_cell.fill = ROW_MISSING_FILL
-        missing_cell.border = border
-        
-        # 8. 调整列宽
+        Returns:
+            与 indices 一一对应的列值列表
+        """
+        if not indices:
+            return []
+        need = max(indices) + 1
+        rows = [row if len(row) >= need else list(row) + [None] * (need - len(row)) for row in rows]
+        if len(indices) == 1:
+            idx = indices[0]
+            return [[row[idx] for row in rows]]
+        getter = itemgetter(*indices)
+        return [list(col) for col in zip(*map(getter, rows))]
+    
+    def _to_float_array(self, values):
+        """把一列单元格值转换为float数组和状态数组（0=数值, 1=空值, 2=无法转换）
+        
+        转换规则与 _calculate_diff 一致：空值判断在前，其余按 float() 转换。
+        """
+        if set(map(type, values)) <= {int, float}:
+            return np.array(values, dtype=np.float64), np.zeros(len(values), dtype=np.int8)
+        
+        nums = []
+        states = []
+        for v in values:
+            if v is None or str(v).strip() == '':
+                nums.append(0.0)
+                states.append(1)
+                continue
+            try:
+                nums.append(float(v))
+                states.append(0)
+            except (ValueError, TypeError):
+                nums.append(0.0)
+                states.append(2)
+        return np.array(nums, dtype=np.float64), np.array(states, dtype=np.int8)
+    
+    def _diff_column_numpy(self, a_vals, b_vals, table_a_name, table_b_name, diff_threshold):
+        """向量化计算一列的差异值（B - A）和颜色分类"""
+        a_num, a_state = self._to_float_array(a_vals)
+        b_num, b_state = self._to_float_array(b_vals)
+        with np.errstate(invalid='ignore', over='ignore'):
+            diff = b_num - a_num
+            green = np.abs(diff) < diff_threshold
+        
+        # 0=绿色, 1=红色, 2=A为空, 3=B为空, 4=无法转换（判断顺序与 _calculate_diff 一致）
+        codes = np.select(
+            [a_state == 1, b_state == 1, (a_state == 2) | (b_state == 2), green],
+            [2, 3, 4, 0],
+            default=1
+        )
+        values = np.array(diff.tolist(), dtype=object)
+        values[codes == 2] = f'{table_a_name}表error'
+        values[codes == 3] = f'{table_b_name}表error'
+        values[codes == 4] = '无法计算差异'
+        kinds = np.array(['green', 'red', 'text', 'text', 'text'], dtype=object)[codes]
+        return list(zip(values.tolist(), kinds.tolist()))
+    
+    def _render_dimension_result(self, ws, result, diff_threshold):
+        """把维度比对结果模型写入目标worksheet（支持普通和只写模式）
+        
+        样式预先构建并共享；只写模式下按行追加，普通模式下直接写入单元格。
+        """
+        HEADER = PatternFill(start_color="DCDCDC", end_color="DCDCDC", fill_type="solid")
+        ERROR_FILL = PatternFill(start_color="FFE6E6", end_color="FFE6E6", fill_type="solid")
+        GREEN_FILL = PatternFill(start_color="90EE90", end_color="90EE90", fill_type="solid")
+        RED_FILL = PatternFill(start_color="FFB6C1", end_color="FFB6C1", fill_type="solid")
+        ROW_MISSING_FILL = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")  # 行不匹配的红色标识
+        border = Border(
+            left=Side(style='thin'), right=Side(style='thin'),
+            top=Side(style='thin'), bottom=Side(style='thin')
+        )
+        
+        result_headers = result['headers']
+        key_columns = result['key_columns']
+        write_only = ws.parent.write_only
+        
+        # 预构建共享样式（每种样式只创建一次，写入单元格时直接复用）
+        header_style = self._make_cell_style(ws, fill=HEADER, font=Font(bold=True),
+                                             alignment=Alignment(horizontal='center'), border=border)
+        plain_style = self._make_cell_style(ws, border=border)
+        error_style = self._make_cell_style(ws, fill=ERROR_FILL, font=Font(color="FF0000"), border=border)
+        green_style = self._make_cell_style(ws, fill=GREEN_FILL, border=border)
+        red_style = self._make_cell_style(ws, fill=RED_FILL, border=border)
+        
+        # 列宽和冻结表头（只写模式下必须在写入数据行之前设置）
         for col_idx, header in enumerate(result_headers, 1):
             col_letter = get_column_letter(col_idx)
             if col_idx <= key_columns:
@@ -2059,30 +4248,95 @@ class RequestHandler(BaseHTTPRequestHandler):
             else:
                 ws.column_dimensions[col_letter].width = 16
         
-        # 图例列宽
-        legend_col_letter = get_column_letter(legend_start_col)
-        ws.column_dimensions[legend_col_letter].width = 20
-        
-        # 冻结表头
+        # 图例放在右上角（第1~4行），随对应行一起写入
+        legend_start_col = len(result_headers) + 2
+        ws.column_dimensions[get_column_letter(legend_start_col)].width = 20
         ws.freeze_panes = 'A2'
         
-        # 复制源文件到结果workbook，并标红不匹配的行
-        if table_a_file and os.path.exists(table_a_file):
-            self._copy_sheet_from_file(wb, table_a_file, f"源文件_{table_a_name}", 
-                                      highlight_rows=unmatched_a_rows if unmatched_a_rows else None)
-        if table_b_file and os.path.exists(table_b_file):
-            self._copy_sheet_from_file(wb, table_b_file, f"源文件_{table_b_name}",
-                                      highlight_rows=unmatched_b_rows if unmatched_b_rows else None)
+        legend_cells = {
+            1: ("图例", self._make_cell_style(ws, font=Font(bold=True), border=border)),
+            2: (f"|差异| < {diff_threshold}", green_style),
+            3: (f"|差异| ≥ {diff_threshold}", red_style),
+            4: ("不匹配行已在源文件sheet中标红", self._make_cell_style(ws, fill=ROW_MISSING_FILL, border=border)),
+        }
         
-        # 9. 保存文件
-        try:
-            wb.save(output)
-        except Exception as e:
-            if sys.platform == 'win32':
-                output_bytes = output.encode('utf-8')
-                wb.save(output_bytes.decode('utf-8'))
+        def write_row(row_idx, cells):
+            """cells: [(值, 样式模板), ...]"""
+            legend = legend_cells.pop(row_idx, None)
+            if write_only:
+                row = [self._styled_cell(ws, value, style) for value, style in cells]
+                if legend is not None:
+                    row += [None] * (legend_start_col - 1 - len(row)) + [self._styled_cell(ws, *legend)]
+                ws.append(row)
             else:
-                raise e
+                if legend is not None:
+                    cells = list(cells) + [(None, None)] * (legend_start_col - 1 - len(cells)) + [legend]
+                for col_idx, (value, style) in enumerate(cells, 1):
+                    if style is not None:
+                        cell = ws.cell(row=row_idx, column=col_idx, value=value)
+                        cell._style = copy(style._style)
+        
+        # 写入表头
+        write_row(1, [(h, header_style) for h in result_headers])
+        
+        # 写入数据行：error标记红色背景，差异值按比对时的阈值分类标记绿色/红色
+        kind_styles = {
+            'error': error_style,
+            'green': green_style,
+            'red': red_style,
+        }
+        kind_counts = dict.fromkeys(('dim', 'green', 'red', 'error', 'text'), 0)
+        _report_progress('writing', total=result['total_rows'])
+        for row_idx, row_cells in enumerate(result['rows'], 2):
+            if (row_idx - 1) % PROGRESS_INTERVAL == 0:
+                _report_progress(rows=PROGRESS_INTERVAL)
+            cells = []
+            for value, kind in row_cells:
+                kind_counts[kind] += 1
+                cells.append((value, kind_styles.get(kind, plain_style)))
+            write_row(row_idx, cells)
+        
+        # 结果行不足4行时补写剩余的图例行
+        for legend_row in sorted(legend_cells):
+            write_row(legend_row, [])
+        
+        return self._diff_summary(kind_counts, result)
+    
+    def _diff_summary(self, kind_counts, result=None):
+        """比对结果汇总：各颜色分类的单元格数、匹配的行数（横向比对为指标数），
+        以及（维度/聚合比对时）各表不匹配的结果行数
+        
+        green/red 为数值差异在阈值内/外，error 为缺少数据（行不匹配或指标缺失），text 为无法计算差异。
+        """
+        summary = {kind: kind_counts.get(kind, 0) for kind in ('green', 'red', 'error', 'text')}
+        if result is not None:
+            row_counts = result['row_counts']
+            summary['unmatchedA'] = row_counts['only_a']
+            summary['unmatchedB'] = row_counts['only_b']
+            summary['matched'] = row_counts['matched']
+        else:
+            # 横向比对：A、B都有数值的指标
+            summary['matched'] = summary['green'] + summary['red']
+        return summary
+    
+    def _make_cell_style(self, ws, fill=None, font=None, alignment=None, border=None):
+        """为只写模式构建共享的样式模板单元格"""
+        template = WriteOnlyCell(ws)
+        if fill is not None:
+            template.fill = fill
+        if font is not None:
+            template.font = font
+        if alignment is not None:
+            template.alignment = alignment
+        if border is not None:
+            template.border = border
+        return template
+    
+    def _styled_cell(self, ws, value, template):
+        """创建只写模式单元格并套用预构建的样式（直接复用样式索引，不再逐个查找样式对象）"""
+        cell = WriteOnlyCell(ws, value=value)
+        cell._style = copy(template._style)
+        return cell
     
     def _calculate_diff(self, a_val, b_val, table_a_name, table_b_name):
         """计算差异值 B - A"""
@@ -2105,7 +4359,7 @@ class RequestHandler(BaseHTTPRequestHandler):
         """聚合表格数据：按维度列分组，对指标列求和
         
         Args:
-            table_data: 包含headers和data的字典
+            table_data: 包含headers和data的字典（data可以是列表或行生成器，只遍历一次）
             dim_columns: 维度列名列表
             ind_columns: 指标列名列表
             table_name: 表名（用于error标记）
@@ -2137,39 +4391,28 @@ class RequestHandler(BaseHTTPRequestHandler):
                 ind_indices.append(normalized_header_map[normalized_col])
                 ind_names_in_table.append(col)
         
-        # 按维度分组聚合
-        groups = {}
-        for row in data:
-            # 构建维度键（使用标准化后的值，忽略下划线、空格和括号差异）
-            dim_values = [row[i] if i < len(row) else None for i in dim_indices]
-            dim_key = self._normalize_dimension_key(dim_values)
-            
-            if dim_key not in groups:
-                groups[dim_key] = {}
-                # 初始化所有指标为0
-                for ind_name in ind_columns:
-                    groups[dim_key][ind_name] = 0
-            
-            # 累加指标值
-            for i, ind_idx in enumerate(ind_indices):
-                ind_name = ind_names_in_table[i]
-                try:
-                    val = row[ind_idx] if ind_idx < len(row) else None
-                    if val is not None and str(val).strip() != '':
-                        groups[dim_key][ind_name] += float(val)
-                except (ValueError, TypeError):
-                    pass  # 忽略无法转换的值
+        # 同名指标累加到同一个槽位
+        slot_names = []
+        ind_slots = []
+        for ind_idx, ind_name in zip(ind_indices, ind_names_in_table):
+            if ind_name not in slot_names:
+                slot_names.append(ind_name)
+            ind_slots.append((ind_idx, slot_names.index(ind_name)))
+        
+        # 按维度分组聚合（键为标准化后的维度值，忽略下划线、空格和括号差异）
+        groups = self._aggregate_rows(data, dim_indices, ind_slots, len(slot_names))
         
         # 生成聚合后的表格
         agg_headers = dim_columns + ind_columns
         agg_data = []
+        output_slots = [slot_names.index(name) if name in slot_names else None for name in ind_columns]
         
-        for dim_key, ind_values in groups.items():
+        for dim_key, sums in groups.items():
             row = list(dim_key)  # 维度值
             # 添加指标值，如果不存在则显示error
-            for ind_name in ind_columns:
-                if ind_name in ind_names_in_table:
-                    row.append(ind_values.get(ind_name, 0))
+            for slot in output_slots:
+                if slot is not None:
+                    row.append(sums[slot])
                 else:
                     row.append('error')  # 该指标在原表中不存在
             agg_data.append(row)
@@ -2180,146 +4423,241 @@ class RequestHandler(BaseHTTPRequestHandler):
             'actual_indicators': ind_names_in_table  # 原表中实际存在的指标
         }
     
+    def _aggregate_rows(self, rows, dim_indices, ind_slots, slot_count):
+        """按维度键分组累加指标
+        
+        数据按 AGGREGATE_CHUNK_ROWS 分块，每块分别求和后精确合并（见 _add_exact）；
+        行数较少时在当前线程逐块聚合，累计达到 AGGREGATE_PARALLEL_MIN_ROWS 行时各块交给进程池聚合，
+        部分结果按块顺序合并，分组顺序与逐行累加一致（按维度键首次出现的顺序）。
+        分块方式固定、合并与顺序无关，指标和不随进程数和是否并行变化。
+        
+        Returns:
+            {维度键元组: [各槽位指标和, ...]}
+        """
+        rows = iter(rows)
+        chunks = iter(lambda: list(islice(rows, AGGREGATE_CHUNK_ROWS)), [])
+        groups = {}
+        
+        # 先缓冲到阈值行数，判断是否值得并行
+        buffered = []
+        buffered_rows = 0
+        if LOAD_WORKERS >= 2:
+            for chunk in chunks:
+                buffered.append(chunk)
+                buffered_rows += len(chunk)
+                if buffered_rows >= AGGREGATE_PARALLEL_MIN_ROWS:
+                    break
+        source = chain(buffered, chunks)
+        
+        if buffered_rows >= AGGREGATE_PARALLEL_MIN_ROWS:
+            pending = deque()  # [块, future]，按提交顺序合并
+            try:
+                executor = _get_load_executor()
+                for chunk in source:
+                    entry = [chunk, None]
+                    pending.append(entry)
+                    entry[1] = executor.submit(_worker_call, '_aggregate_chunk',
+                                               chunk, dim_indices, ind_slots, slot_count)
+                    # 限制在途的块数，避免整表堆积在内存中
+                    while len(pending) > LOAD_WORKERS * 2:
+                        self._merge_partial_groups(groups, self._wait_future(pending[0][1]))
+                        pending.popleft()
+                while pending:
+                    self._merge_partial_groups(groups, self._wait_future(pending[0][1]))
+                    pending.popleft()
+                return self._finish_groups(groups)
+            except BrokenProcessPool:
+                # 子进程异常退出：尚未合并的块改为在当前线程聚合
+                _reset_load_executor()
+                source = chain([entry[0] for entry in pending], source)
+            finally:
+                for entry in pending:
+                    if entry[1] is not None:
+                        entry[1].cancel()
+        
+        for chunk in source:
+            self._merge_partial_groups(groups, self._aggregate_chunk(chunk, dim_indices, ind_slots, slot_count))
+        return self._finish_groups(groups)
+    
+    def _aggregate_chunk(self, rows, dim_indices, ind_slots, slot_count):
+        """聚合一块数据行（可在子进程中执行），返回该块的 {维度键元组: [各槽位指标和, ...]}"""
+        groups = {}
+        normalize_key = self._normalize_dimension_key
+        for row in rows:
+            row_len = len(row)
+            dim_key = normalize_key([row[i] if i < row_len else None for i in dim_indices])
+            sums = groups.get(dim_key)
+            if sums is None:
+                sums = groups[dim_key] = [0] * slot_count
+            
+            # 累加指标值（空值和无法转换的值忽略）
+            for ind_idx, slot in ind_slots:
+                if ind_idx >= row_len:
+                    continue
+                val = row[ind_idx]
+                if val is None or (val.__class__ is str and not val.strip()):
+                    continue
+                try:
+                    sums[slot] += float(val)
+                except (ValueError, TypeError):
+                    pass
+        return groups
+    
+    def _merge_partial_groups(self, groups, partial):
+        """把一块的部分聚合结果合并进总结果（保持维度键首次出现的顺序）
+        
+        每个槽位保存精确的部分和列表，由 _finish_groups 取总和。
+        """
+        for dim_key, sums in partial.items():
+            total = groups.get(dim_key)
+            if total is None:
+                groups[dim_key] = [[value] for value in sums]
+            else:
+                for partials, value in zip(total, sums):
+                    _add_exact(partials, value)
+    
+    def _finish_groups(self, groups):
+        """把各槽位的部分和列表转换为指标和"""
+        return {dim_key: [_exact_total(partials) for partials in slots] for dim_key, slots in groups.items()}
+    
     def _create_aggregate_result(self, output, agg_a, agg_b, 
-                                 table_a_file, table_b_file,
+                                 source_a, source_b,
                                  table_a_name, table_b_name,
-                                 key_columns, diff_threshold):
+                                 key_columns, diff_threshold, engine='auto',
+                                 source_output='embed', dim_columns=None, parquet_output=None):
         """创建聚合比对结果Excel（5个sheet）
         
         Args:
             output: 输出文件路径
             agg_a: 聚合后的表A数据
             agg_b: 聚合后的表B数据
-            table_a_file: 表A源文件路径
-            table_b_file: 表B源文件路径
+            source_a: 表A源数据（_read_source_sheet，None表示不嵌入）
+            source_b: 表B源数据（_read_source_sheet，None表示不嵌入）
             table_a_name: 表A名称
             table_b_name: 表B名称
             key_columns: 维度列数量
             diff_threshold: 差异阈值
+            engine: 差异计算引擎（auto/numpy/python）
+            source_output: 源数据输出策略（见 SOURCE_OUTPUTS）
+            dim_columns: 维度列名列表（unmatched 策略下用于找出源表中不匹配的明细行）
+            parquet_output: 比对结果差异表的Parquet文件路径（None表示不输出）
+            
+        Returns:
+            比对结果的汇总（见 _diff_summary，不匹配行数按聚合后的维度键计）
         """
         wb = Workbook()
         # 删除默认sheet
         if 'Sheet' in wb.sheetnames:
             wb.remove(wb['Sheet'])
         
-        ERROR_FILL = PatternFill(start_color="FFE6E6", end_color="FFE6E6", fill_type="solid")
-        HIGHLIGHT_FILL = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-        HEADER = PatternFill(start_color="DCDCDC", end_color="DCDCDC", fill_type="solid")
-        border = Border(
-            left=Side(style='thin'), right=Side(style='thin'),
-            top=Side(style='thin'), bottom=Side(style='thin')
-        )
-        
-        # 找出A和B中不匹配的行（基于维度键）
-        headers_a = agg_a['headers']
-        headers_b = agg_b['headers']
-        data_a = agg_a['data']
-        data_b = agg_b['data']
-        
-        # 构建维度键索引
-        a_keys = set()
-        for row in data_a:
-            key = tuple(row[:key_columns])
-            a_keys.add(key)
-        
-        b_keys = set()
-        for row in data_b:
-            key = tuple(row[:key_columns])
-            b_keys.add(key)
-        
-        # 找出不匹配的键
-        only_in_a = a_keys - b_keys
-        only_in_b = b_keys - a_keys
-        
-        # Sheet1: A表聚合（标红在A中存在但在B中不存在的行）
-        ws1 = wb.create_sheet(f"{table_a_name}聚合")
-        self._write_aggregated_sheet_with_highlight(
-            ws1, agg_a, HEADER, ERROR_FILL, HIGHLIGHT_FILL, border, 
-            key_columns, only_in_a  # 修复：应该标红只在A中的行
-        )
-        
-        # Sheet2: B表聚合（标红在B中存在但在A中不存在的行）
-        ws2 = wb.create_sheet(f"{table_b_name}聚合")
-        self._write_aggregated_sheet_with_highlight(
-            ws2, agg_b, HEADER, ERROR_FILL, HIGHLIGHT_FILL, border, 
-            key_columns, only_in_b  # 修复：应该标红只在B中的行
-        )
-        
-        # Sheet3: 比对结果（只比对公共指标）
-        ws3 = wb.create_sheet("聚合比对结果")
-        wb.active = ws3  # 设置为活动sheet
-        
-        # 找出公共指标（只考虑原表中实际存在的指标，忽略下划线、空格和括号差异）
-        actual_indicators_a = agg_a.get('actual_indicators', [])
-        actual_indicators_b = agg_b.get('actual_indicators', [])
-        
-        # 创建标准化指标名到原始名称的映射
-        normalized_a = {self._normalize_string(ind): ind for ind in actual_indicators_a}
-        normalized_b = {self._normalize_string(ind): ind for ind in actual_indicators_b}
-        
-        # 找出标准化后的公共指标
-        common_normalized = set(normalized_a.keys()) & set(normalized_b.keys())
-        
-        # 使用A表中的原始指标名称（保持统一）
-        common_indicators_list = sorted([normalized_a[norm] for norm in common_normalized])
-        
-        # 构建只包含公共指标的A和B表
-        agg_a_common = self._filter_common_indicators(agg_a, key_columns, common_indicators_list)
-        agg_b_common = self._filter_common_indicators(agg_b, key_columns, common_indicators_list)
-        
-        # 使用维度比对逻辑生成比对结果
-        temp_output = output + '.temp.xlsx'
-        self._create_dimension_result(
-            temp_output, agg_a_common, agg_b_common, key_columns,
-            table_a_name, table_b_name, diff_threshold,
-            None, None  # 不复制源文件
-        )
-        
-        # 从临时文件读取比对结果sheet
-        temp_wb = load_workbook(temp_output)
-        temp_ws = temp_wb.active
-        
-        # 复制比对结果到ws3
-        for row in temp_ws.iter_rows():
-            for cell in row:
-                new_cell = ws3.cell(row=cell.row, column=cell.column, value=cell.value)
-                if cell.has_style:
-                    try:
-                        new_cell.font = cell.font.copy()
-                        new_cell.fill = cell.fill.copy()
-                        new_cell.border = cell.border.copy()
-                        new_cell.alignment = cell.alignment.copy()
-                    except:
-                        pass
-        
-        # 复制列宽
-        for col_letter in temp_ws.column_dimensions:
-            if col_letter in temp_ws.column_dimensions:
-                ws3.column_dimensions[col_letter].width = temp_ws.column_dimensions[col_letter].width
-        
-        # 冻结表头
-        ws3.freeze_panes = 'A2'
-        
-        temp_wb.close()
-        os.remove(temp_output)  # 删除临时文件
-        
-        # Sheet4和5: A和B源文件
-        if table_a_file and os.path.exists(table_a_file):
-            self._copy_sheet_from_file(wb, table_a_file, f"源文件_{table_a_name}")
-        if table_b_file and os.path.exists(table_b_file):
-            self._copy_sheet_from_file(wb, table_b_file, f"源文件_{table_b_name}")
-        
-        # 保存
+        result = None
+        partial_files = [parquet_output]
         try:
-            wb.save(output)
-        except Exception as e:
-            if sys.platform == 'win32':
-                output_bytes = output.encode('utf-8')
-                wb.save(output_bytes)
-            else:
-                raise e
-        finally:
-            wb.close()
+            ERROR_FILL = PatternFill(start_color="FFE6E6", end_color="FFE6E6", fill_type="solid")
+            HIGHLIGHT_FILL = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
+            HEADER = PatternFill(start_color="DCDCDC", end_color="DCDCDC", fill_type="solid")
+            border = Border(
+                left=Side(style='thin'), right=Side(style='thin'),
+                top=Side(style='thin'), bottom=Side(style='thin')
+            )
+            
+            # 找出A和B中不匹配的行（基于维度键）
+            headers_a = agg_a['headers']
+            headers_b = agg_b['headers']
+            data_a = agg_a['data']
+            data_b = agg_b['data']
+            
+            # 构建维度键索引
+            a_keys = set()
+            for row in data_a:
+                key = tuple(row[:key_columns])
+                a_keys.add(key)
+            
+            b_keys = set()
+            for row in data_b:
+                key = tuple(row[:key_columns])
+                b_keys.add(key)
+            
+            # 找出不匹配的键
+            only_in_a = a_keys - b_keys
+            only_in_b = b_keys - a_keys
+            
+            # Sheet1: A表聚合（标红在A中存在但在B中不存在的行）
+            _report_progress('writing')
+            ws1 = wb.create_sheet(f"{table_a_name}聚合")
+            self._write_aggregated_sheet_with_highlight(
+                ws1, agg_a, HEADER, ERROR_FILL, HIGHLIGHT_FILL, border, 
+                key_columns, only_in_a  # 修复：应该标红只在A中的行
+            )
+            
+            # Sheet2: B表聚合（标红在B中存在但在A中不存在的行）
+            ws2 = wb.create_sheet(f"{table_b_name}聚合")
+            self._write_aggregated_sheet_with_highlight(
+                ws2, agg_b, HEADER, ERROR_FILL, HIGHLIGHT_FILL, border, 
+                key_columns, only_in_b  # 修复：应该标红只在B中的行
+            )
+            
+            # Sheet3: 比对结果（只比对公共指标）
+            ws3 = wb.create_sheet("聚合比对结果")
+            wb.active = ws3  # 设置为活动sheet
+            
+            # 找出公共指标（只考虑原表中实际存在的指标，忽略下划线、空格和括号差异）
+            actual_indicators_a = agg_a.get('actual_indicators', [])
+            actual_indicators_b = agg_b.get('actual_indicators', [])
+            
+            # 创建标准化指标名到原始名称的映射
+            normalized_a = {self._normalize_string(ind): ind for ind in actual_indicators_a}
+            normalized_b = {self._normalize_string(ind): ind for ind in actual_indicators_b}
+            
+            # 找出标准化后的公共指标
+            common_normalized = set(normalized_a.keys()) & set(normalized_b.keys())
+            
+            # 使用A表中的原始指标名称（保持统一）
+            common_indicators_list = sorted([normalized_a[norm] for norm in common_normalized])
+            
+            # 构建只包含公共指标的A和B表
+            agg_a_common = self._filter_common_indicators(agg_a, key_columns, common_indicators_list)
+            agg_b_common = self._filter_common_indicators(agg_b, key_columns, common_indicators_list)
+            
+            # 使用维度比对逻辑生成比对结果，直接写入ws3
+            result = self._build_dimension_result(
+                agg_a_common, agg_b_common, key_columns, table_a_name, table_b_name,
+                diff_threshold, engine
+            )
+            if parquet_output:
+                result['rows'] = self._tee_parquet_rows(result, parquet_output)
+            summary = self._render_dimension_result(ws3, result, diff_threshold)
+            
+            # Sheet4和5: A和B源文件（unmatched 策略下只保留维度键不匹配的明细行）
+            _report_progress('copying')
+            unmatched_a_rows = unmatched_b_rows = None
+            if source_output == 'unmatched' and dim_columns:
+                unmatched_a_rows = self._source_rows_with_keys(source_a, dim_columns, only_in_a)
+                unmatched_b_rows = self._source_rows_with_keys(source_b, dim_columns, only_in_b)
+            self._write_source_sheets(wb, [
+                (f"源文件_{table_a_name}", source_a, unmatched_a_rows),
+                (f"源文件_{table_b_name}", source_b, unmatched_b_rows)
+            ], source_output)
+            self._write_performance_sheet(wb)
+            
+            # 保存
+            _report_progress('saving')
+            partial_files.append(output)
+            try:
+                wb.save(output)
+            except Exception as e:
+                if sys.platform == 'win32':
+                    output_bytes = output.encode('utf-8')
+                    wb.save(output_bytes)
+                else:
+                    raise e
+            finally:
+                wb.close()
+        except BaseException:
+            self._discard_partial_result(wb, result, partial_files)
+            raise
+        _record_file_bytes('excel_compare_bytes_written_total', output, mode=_metrics_mode(), format='xlsx')
+        return summary
     
     def _filter_common_indicators(self, table_data, key_columns, common_indicators):
         """过滤表格，只保留公共指标（使用标准化匹配）"""
@@ -2408,7 +4746,318 @@ class RequestHandler(BaseHTTPRequestHandler):
         for col_idx in range(1, len(headers) + 1):
             col_letter = get_column_letter(col_idx)
             ws.column_dimensions[col_letter].width = 16
+
+
+class RequestHandler(ExcelCompareService, BaseHTTPRequestHandler):
+    """HTTP请求处理"""
+    
+    def log_message(self, format, *args):
+        """请求日志写入轮转日志文件（不输出到控制台）"""
+        _logger.info('%s %s', self.address_string(), format % args)
+    
+    def do_GET(self):
+        if self.path.split('?', 1)[0] == '/metrics':
+            _metrics.inc('excel_compare_requests_total', action='metrics')
+            body = _render_metrics().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        
+        _metrics.inc('excel_compare_requests_total', action='page')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.end_headers()
+        self.wfile.write(HTML_TEMPLATE.encode('utf-8'))
+    
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8')
+        
+        action = 'invalid'
+        try:
+            data = json.loads(body)
+            action = data.get('action', '')
+            
+            if action == 'generate_test':
+                result = self.generate_test(data.get('workDir', WORK_DIR))
+            elif action == 'compare':
+                result = self._run_in_pool(self.run_compare, data)
+            elif action == 'generate_dimension_test':
+                result = self.generate_dimension_test(data.get('workDir', WORK_DIR))
+            elif action == 'dimension_compare':
+                result = self._run_in_pool(self.run_dimension_compare, data)
+            elif action == 'parse_headers':
+                result = self.parse_table_headers(data)
+            elif action == 'aggregate_compare':
+                result = self._run_in_pool(self.run_aggregate_compare, data)
+            elif action == 'batch_compare':
+                result = self._run_in_pool(self.run_batch_compare, data)
+            elif action == 'open_file':
+                result = self.open_file(data.get('path', ''))
+            elif action == 'open_dir':
+                result = self.open_dir(data.get('path', ''))
+            elif action == 'browse_file':
+                result = self.browse_file_dialog(data.get('workDir', WORK_DIR))
+            elif action == 'browse_dir':
+                result = self.browse_dir_dialog()
+            elif action == 'submit_job':
+                result = self.submit_job(data)
+            elif action == 'job_status':
+                result = self.job_status(data.get('jobId', ''))
+            elif action == 'cancel_job':
+                result = self.cancel_job(data.get('jobId', ''))
+            elif action == 'cache_stats':
+                if data.get('clear'):
+                    _table_cache.clear()
+                result = {'success': True, 'stats': _table_cache.stats()}
+            else:
+                action = 'unknown'
+                result = {'success': False, 'message': '未知操作'}
+                
+        except Exception as e:
+            result = {'success': False, 'message': str(e)}
+        
+        _metrics.inc('excel_compare_requests_total', action=action)
+        if not result.get('success'):
+            _metrics.inc('excel_compare_request_failures_total', action=action)
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(result, ensure_ascii=False).encode('utf-8'))
+
+
+# 命令行模式：可执行的比对操作、退出码（有差异时返回 CLI_EXIT_DIFF，比对失败返回 CLI_EXIT_FAILED）
+CLI_ACTIONS = ('compare', 'dimension_compare', 'aggregate_compare')
+CLI_EXIT_OK = 0
+CLI_EXIT_DIFF = 1
+CLI_EXIT_FAILED = 2
+
+# 作业文件中相对路径按作业文件所在目录解析的输入参数
+CLI_PATH_KEYS = ('baseFile', 'dataAFile', 'dataBFile', 'tableAFile', 'tableBFile')
+CLI_BOOL_KEYS = ('parquetOutput', 'performanceSheet')
+CLI_BOOL_VALUES = {'true': True, '1': True, 'yes': True, 'false': False, '0': False, 'no': False}
+CLI_NUMBER_KEYS = {'keyColumns': int, 'decimalPlaces': int, 'diffThreshold': float, 'greenTh': float}
+
+
+def _build_cli_parser():
+    parser = argparse.ArgumentParser(
+        prog='excel_compare_web',
+        description='Excel比对工具命令行模式（不启动服务器和浏览器）；不带参数运行时启动Web界面',
+    )
+    subparsers = parser.add_subparsers(dest='command')
+    
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('-o', '--output', help='结果文件名（相对于 --work-dir）')
+    common.add_argument('--work-dir', default=None, help='结果文件目录（默认当前目录）')
+    common.add_argument('--source-output', choices=SOURCE_OUTPUTS, help='源数据输出策略')
+    common.add_argument('--source-format', choices=SOURCE_FORMATS, help='嵌入源数据的格式')
+    common.add_argument('--performance-sheet', action='store_true', help='结果中写入“性能”sheet')
+    
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument('--fail-on', choices=('diff', 'red', 'never'), default='diff',
+                        help='返回非0退出码的条件：diff 有红色差异或缺失数据（默认），red 只看超过阈值的差异，never 不检查')
+    output.add_argument('--json', action='store_true', help='以JSON输出比对结果')
+    
+    sub = subparsers.add_parser('compare', parents=[common, output], help='横向比对（基准文件 + 两个数据文件）')
+    sub.add_argument('--base', required=True, help='基准文件')
+    sub.add_argument('--data-a', required=True, help='数据文件A')
+    sub.add_argument('--data-b', required=True, help='数据文件B')
+    sub.add_argument('--decimal-places', type=int, help='小数位数')
+    sub.add_argument('--green-th', type=float, help='绿色阈值（差异%%）')
+    
+    for name, help_text in (('dimension_compare', '维度比对'), ('aggregate_compare', '聚合比对')):
+        sub = subparsers.add_parser(name, parents=[common, output], help=help_text)
+        sub.add_argument('--table-a', required=True, help='表A文件')
+        sub.add_argument('--table-b', required=True, help='表B文件')
+        sub.add_argument('--threshold', type=float, help='差异阈值')
+        sub.add_argument('--diff-engine', choices=('auto', 'numpy', 'python'), help='差异计算引擎')
+        sub.add_argument('--parquet', action='store_true', help='同时输出差异表Parquet文件')
+        if name == 'dimension_compare':
+            sub.add_argument('--key-columns', type=int, help='维度列数（前N列）')
+        else:
+            sub.add_argument('--dim-columns', required=True, help='维度列名，逗号分隔')
+            sub.add_argument('--ind-columns', required=True, help='指标列名，逗号分隔')
+    
+    sub = subparsers.add_parser('run', parents=[output], help='执行JSON/YAML作业文件中的一个或多个比对')
+    sub.add_argument('job_file', help='作业文件（.json/.yaml/.yml），内容与API请求参数相同，需包含action')
+    
+    sub = subparsers.add_parser('batch', parents=[output],
+                                help='批量比对：按清单并发执行多组比对，生成汇总工作簿')
+    sub.add_argument('job_file', help='比对清单（.json/.yaml/.yml/.csv），每组参数与API相同，action默认为维度比对')
+    sub.add_argument('--workers', type=int, default=BATCH_WORKERS, help='同时执行的比对数')
+    sub.add_argument('--summary', default='批量比对汇总.xlsx', help='汇总工作簿文件名')
+    sub.add_argument('--work-dir', default=None, help='汇总及结果文件目录（默认清单所在目录）')
+    return parser
+
+
+def _cli_request(args):
+    """把子命令参数转换为与API相同的请求参数"""
+    data = {}
+    options = (
+        ('output', 'outputFile'), ('work_dir', 'workDir'), ('source_output', 'sourceOutput'),
+        ('source_format', 'sourceFormat'), ('base', 'baseFile'), ('data_a', 'dataAFile'),
+        ('data_b', 'dataBFile'), ('decimal_places', 'decimalPlaces'), ('green_th', 'greenTh'),
+        ('table_a', 'tableAFile'), ('table_b', 'tableBFile'), ('threshold', 'diffThreshold'),
+        ('diff_engine', 'diffEngine'), ('key_columns', 'keyColumns'),
+    )
+    for attr, key in options:
+        value = getattr(args, attr, None)
+        if value is not None:
+            data[key] = value
+    for attr, key in (('dim_columns', 'dimColumns'), ('ind_columns', 'indColumns')):
+        value = getattr(args, attr, None)
+        if value is not None:
+            data[key] = [col.strip() for col in value.split(',') if col.strip()]
+    if getattr(args, 'parquet', False):
+        data['parquetOutput'] = True
+    if args.performance_sheet:
+        data['performanceSheet'] = True
+    data['action'] = args.command
+    data.setdefault('workDir', os.getcwd())
+    return data
+
+
+def _load_job_file(path, default_action=None, default_workdir=True):
+    """读取作业文件，返回请求参数列表
+    
+    文件内容为单个请求、请求列表或 {"jobs": [...]}；YAML 需要安装PyYAML；
+    CSV 第一行为参数名（与API相同），每行一组比对，dimColumns/indColumns 用分号分隔多个列名，
+    parquetOutput/performanceSheet 取 true/false、1/0 或 yes/no，keyColumns 等数值参数按数字读取。
+    相对路径按作业文件所在目录解析，未指定 workDir 时结果也写入该目录
+    （default_workdir 为False时不设置，批量比对由 _prepare_batch_jobs 使用批量结果目录）。
+    """
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if path.lower().endswith('.csv'):
+            content = []
+            for line_num, row in enumerate(csv.DictReader(f), 2):
+                job = {key.strip(): value.strip() for key, value in row.items() if key and value and value.strip()}
+                for key in ('dimColumns', 'indColumns'):
+                    if key in job:
+                        job[key] = [col.strip() for col in job[key].split(';') if col.strip()]
+                for key in CLI_BOOL_KEYS:
+                    if key in job:
+                        if job[key].lower() not in CLI_BOOL_VALUES:
+                            raise Exception('作业文件第{}行的{}无效: {}（应为 true/false、1/0 或 yes/no）'.format(
+                                line_num, key, job[key]))
+                        job[key] = CLI_BOOL_VALUES[job[key].lower()]
+                for key, convert in CLI_NUMBER_KEYS.items():
+                    if key in job:
+                        try:
+                            job[key] = convert(job[key])
+                        except ValueError:
+                            raise Exception('作业文件第{}行的{}无效: {}（应为{}）'.format(
+                                line_num, key, job[key], '整数' if convert is int else '数字'))
+                content.append(job)
+        elif path.lower().endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise Exception('缺少PyYAML库，无法读取YAML作业文件。请安装pyyaml或改用JSON')
+            content = yaml.safe_load(f)
+        else:
+            content = json.load(f)
+    
+    if isinstance(content, dict):
+        content = content['jobs'] if 'jobs' in content else [content]
+    if not isinstance(content, list) or not all(isinstance(job, dict) for job in content):
+        raise Exception('作业文件格式错误：应为请求对象、请求列表或 {"jobs": [...]}')
+    
+    job_dir = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    for job in content:
+        job = dict(job)
+        if default_action:
+            job.setdefault('action', default_action)
+        if job.get('action') not in CLI_ACTIONS:
+            raise Exception('作业的action必须是 {} 之一: {}'.format(', '.join(CLI_ACTIONS), job.get('action')))
+        for key in CLI_PATH_KEYS:
+            if job.get(key) and not os.path.isabs(job[key]):
+                job[key] = os.path.join(job_dir, job[key])
+        if job.get('workDir') or default_workdir:
+            job['workDir'] = os.path.join(job_dir, job.get('workDir', ''))
+        jobs.append(job)
+    return jobs
+
+
+def _cli_exit_code(result, fail_on):
+    """单个比对结果对应的退出码"""
+    if not result.get('success'):
+        return CLI_EXIT_FAILED
+    summary = result.get('summary') or {}
+    if summary.get('failed'):
+        return CLI_EXIT_FAILED  # 批量比对中有比对失败
+    if fail_on == 'diff' and (summary.get('red') or summary.get('error')):
+        return CLI_EXIT_DIFF
+    if fail_on == 'red' and summary.get('red'):
+        return CLI_EXIT_DIFF
+    return CLI_EXIT_OK
+
+
+def cli_main(argv):
+    """命令行模式入口：直接执行比对，不启动服务器和浏览器
     
+    Returns:
+        退出码：0 无差异，1 有差异（按 --fail-on），2 比对失败或参数错误
+    """
+    parser = _build_cli_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return CLI_EXIT_FAILED
+    if not OPENPYXL_OK:
+        print('[错误] 缺少openpyxl库，请运行: pip install openpyxl', file=sys.stderr)
+        return CLI_EXIT_FAILED
+    
+    try:
+        if args.command == 'batch':
+            batch = {
+                'action': 'batch_compare',
+                'jobs': _load_job_file(args.job_file, default_action='dimension_compare', default_workdir=False),
+                'workers': args.workers,
+                'summaryFile': args.summary,
+                'workDir': args.work_dir or os.path.dirname(os.path.abspath(args.job_file)),
+            }
+            jobs = [batch]
+        elif args.command == 'run':
+            jobs = _load_job_file(args.job_file)
+        else:
+            jobs = [_cli_request(args)]
+    except Exception as e:
+        print('[错误] {}'.format(e), file=sys.stderr)
+        return CLI_EXIT_FAILED
+    
+    service = ExcelCompareService()
+    methods = {
+        'compare': service.run_compare,
+        'dimension_compare': service.run_dimension_compare,
+        'aggregate_compare': service.run_aggregate_compare,
+        'batch_compare': service.run_batch_compare,
+    }
+    results = []
+    exit_code = CLI_EXIT_OK
+    try:
+        for job in jobs:
+            result = methods[job['action']](job)
+            code = _cli_exit_code(result, args.fail_on)
+            exit_code = max(exit_code, code)
+            results.append(dict(result, action=job['action'], exitCode=code))
+            if not args.json:
+                print(result.get('message', ''))
+                if result.get('summary'):
+                    print('汇总: {}'.format(json.dumps(result['summary'], ensure_ascii=False)))
+                print()
+    finally:
+        _reset_load_executor()
+    
+    if args.json:
+        print(json.dumps(results if args.command == 'run' else results[0], ensure_ascii=False, indent=2))
+    return exit_code
+
+
 def main():
     print("=" * 50)
     print("Excel比对工具 - Web界面")
@@ -2421,21 +5070,33 @@ def main():
     
     url = "http://localhost:{}".format(PORT)
     print("启动服务器: {}".format(url))
+    print("并发比对任务数: {}".format(COMPARE_WORKERS))
+    print("并行读取进程数: {}（输入合计超过 {} MB 时启用）".format(LOAD_WORKERS, PARALLEL_LOAD_MIN_MB))
+    if _setup_logging():
+        print("日志文件: {}".format(os.path.abspath(LOG_FILE)))
     print("按 Ctrl+C 停止服务器")
     print()
     
-    # 自动打开浏览器
+    # 自动打开浏览器（命令行模式不需要，只在启动服务器时导入）
+    import webbrowser
     threading.Timer(1, lambda: webbrowser.open(url)).start()
     
-    # 启动服务器
-    server = HTTPServer(('localhost', PORT), RequestHandler)
+    # 启动服务器（每个请求一个线程，比对任务由有界线程池执行）
+    server = ThreadingHTTPServer(('localhost', PORT), RequestHandler)
+    server.daemon_threads = True
     try:
         server.serve_forever()
     except KeyboardInterrupt:
         print("\n服务器已停止")
         server.shutdown()
+        _compare_executor.shutdown(wait=False)
+        _reset_load_executor()
 
 
 if __name__ == '__main__':
+    # 打包为exe后，进程池的子进程需要从这里接管
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1:
+        sys.exit(cli_main(sys.argv[1:]))
     main()
 
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""pytest公共配置：从仓库根目录导入 excel_compare_web"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import excel_compare_web as ecw  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def clear_table_cache():
+    """每个测试从空的表格缓存开始，避免测试之间相互影响"""
+    ecw._table_cache.clear()
+    yield
+    ecw._table_cache.clear()
+
+
+@pytest.fixture
+def read_rows():
+    """返回读取函数：流式读取表格文件的全部行（包含表头行）"""
+    service = ecw.ExcelCompareService()
+    return lambda path: list(service._iter_table_rows(str(path)))
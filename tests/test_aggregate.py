@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""聚合比对：分组累加结果不随进程数和是否并行变化"""
+
+import random
+
+import pytest
+
+import excel_compare_web as ecw
+
+
+@pytest.fixture
+def rows():
+    rng = random.Random(20260101)
+    return [
+        ['k{}'.format(rng.randrange(50)), rng.uniform(-1e6, 1e6) * rng.choice([1, 1e-7, 1e7]), str(rng.random())]
+        for _ in range(6000)
+    ]
+
+
+def test_exact_merge_is_order_independent():
+    values = [0.1, 1e16, -1e16, 0.2, 0.3, 1e-9]
+    forward, backward = [values[0]], [values[-1]]
+    for v in values[1:]:
+        ecw._add_exact(forward, v)
+    for v in reversed(values[:-1]):
+        ecw._add_exact(backward, v)
+    assert ecw._exact_total(forward) == ecw._exact_total(backward)
+
+
+def test_parallel_sums_match_serial(rows, monkeypatch):
+    service = ecw.ExcelCompareService()
+    monkeypatch.setattr(ecw, 'AGGREGATE_CHUNK_ROWS', 500)
+    
+    monkeypatch.setattr(ecw, 'LOAD_WORKERS', 1)
+    serial = service._aggregate_rows(rows, [0], [(1, 0), (2, 1)], 2)
+    
+    monkeypatch.setattr(ecw, 'AGGREGATE_PARALLEL_MIN_ROWS', 1000)
+    results = []
+    for workers in (2, 3):
+        monkeypatch.setattr(ecw, 'LOAD_WORKERS', workers)
+        ecw._reset_load_executor()
+        try:
+            results.append(service._aggregate_rows(rows, [0], [(1, 0), (2, 1)], 2))
+        finally:
+            ecw._reset_load_executor()
+    
+    for parallel in results:
+        assert list(parallel) == list(serial)  # 分组顺序一致
+        assert parallel == serial              # 指标和逐位一致
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""批量比对：CSV比对清单解析和比对结果汇总"""
+
+import os
+
+import pytest
+
+import excel_compare_web as ecw
+
+CSV_MANIFEST = (
+    'tableAFile,tableBFile,keyColumns,dimColumns,parquetOutput,performanceSheet,outputFile,diffThreshold\n'
+    'a.csv,/data/b.csv,2,险种; 渠道,false,YES,r1.xlsx,0.5\n'
+    'a.csv,b.csv,,,0,,,\n'
+)
+
+
+def test_csv_job_file(tmp_path):
+    path = tmp_path / 'jobs.csv'
+    path.write_text(CSV_MANIFEST, encoding='utf-8-sig')
+    first, second = ecw._load_job_file(str(path), default_action='dimension_compare')
+    
+    assert first['action'] == 'dimension_compare'
+    assert first['tableAFile'] == os.path.join(str(tmp_path), 'a.csv')
+    assert first['tableBFile'] == '/data/b.csv'
+    assert first['keyColumns'] == 2 and first['diffThreshold'] == 0.5
+    assert first['dimColumns'] == ['险种', '渠道']
+    assert first['parquetOutput'] is False
+    assert first['performanceSheet'] is True
+    assert first['workDir'] == os.path.join(str(tmp_path), '')
+    
+    # 空单元格视为未指定，使用默认值
+    assert second['parquetOutput'] is False
+    assert 'keyColumns' not in second and 'performanceSheet' not in second and 'outputFile' not in second
+
+
+@pytest.mark.parametrize('value', ['nah', 'T', '2'])
+def test_csv_job_file_rejects_unknown_bool(tmp_path, value):
+    path = tmp_path / 'jobs.csv'
+    path.write_text('tableAFile,tableBFile,parquetOutput\na.csv,b.csv,{}\n'.format(value), encoding='utf-8')
+    with pytest.raises(Exception, match='第2行的parquetOutput'):
+        ecw._load_job_file(str(path), default_action='dimension_compare')
+
+
+def test_dimension_summary_counts_duplicate_keys(tmp_path):
+    a = tmp_path / 'a.csv'
+    b = tmp_path / 'b.csv'
+    a.write_text('k,x\nr1,1\nr1,1\nzz,3\n', encoding='utf-8')
+    b.write_text('k,x\nr1,2\nq,4\nq,5\nq,6\n', encoding='utf-8')
+    result = ecw.ExcelCompareService().run_dimension_compare({
+        'tableAFile': str(a), 'tableBFile': str(b), 'workDir': str(tmp_path)
+    })
+    summary = result['summary']
+    assert (summary['matched'], summary['unmatchedA'], summary['unmatchedB']) == (1, 1, 3)
+
+
+@pytest.mark.parametrize('column, value', [('keyColumns', '1.5'), ('diffThreshold', 'abc'), ('greenTh', '1%')])
+def test_csv_job_file_rejects_bad_number(tmp_path, column, value):
+    path = tmp_path / 'jobs.csv'
+    path.write_text('tableAFile,tableBFile,{}\na.csv,b.csv,1\na.csv,b.csv,{}\n'.format(column, value),
+                    encoding='utf-8')
+    with pytest.raises(Exception, match='第3行的' + column):
+        ecw._load_job_file(str(path), default_action='dimension_compare')
+
+
+def test_batch_manifest_leaves_workdir_to_batch(tmp_path):
+    """批量清单中未指定 workDir 的比对使用批量结果目录（--work-dir），指定的按清单目录解析"""
+    path = tmp_path / 'jobs.csv'
+    path.write_text('tableAFile,tableBFile,workDir\na.csv,b.csv,\na.csv,b.csv,sub\n', encoding='utf-8')
+    first, second = ecw._load_job_file(str(path), default_action='dimension_compare', default_workdir=False)
+    assert 'workDir' not in first
+    assert second['workDir'] == os.path.join(str(tmp_path), 'sub')
+    
+    jobs = ecw.ExcelCompareService()._prepare_batch_jobs([first, second], str(tmp_path / 'out'))
+    assert [job['workDir'] for job in jobs] == [str(tmp_path / 'out'), os.path.join(str(tmp_path), 'sub')]
+
+
+def test_batch_summary_same_for_sequential_and_pool(tmp_path):
+    """共用同一输入的两组比对：顺序执行与进程池并发执行的汇总结果一致"""
+    from openpyxl import load_workbook
+    
+    a = tmp_path / 'a.csv'
+    a.write_text('k,x,y\nr1,1,10\nr2,2,20\nr3,3,30\n', encoding='utf-8')
+    (tmp_path / 'b.csv').write_text('k,x,y\nr1,1,11\nr2,5,20\nr4,4,40\n', encoding='utf-8')
+    (tmp_path / 'c.csv').write_text('k,x,y\nr1,1,10\nr3,3,33\n', encoding='utf-8')
+    jobs = [{'tableAFile': str(a), 'tableBFile': str(tmp_path / name)} for name in ('b.csv', 'c.csv')]
+    
+    summaries = {}
+    for workers in (1, 2):
+        workdir = tmp_path / 'w{}'.format(workers)
+        workdir.mkdir()
+        ecw._table_cache.clear()
+        result = ecw.ExcelCompareService().run_batch_compare(
+            {'jobs': jobs, 'workers': workers, 'workDir': str(workdir)})
+        assert result['success'], result['message']
+        assert '共享输入: 1 个' in result['message']
+        sheet = load_workbook(result['summaryFile']).active
+        # 去掉耗时列，其余各列（含合计行）应完全一致
+        summaries[workers] = ([r['summary'] for r in result['results']], result['summary'],
+                              [row[:15] + row[16:] for row in sheet.iter_rows(values_only=True)])
+    
+    assert summaries[1] == summaries[2]
+    per_pair, totals, rows = summaries[1]
+    assert totals['jobs'] == 2 and totals['failed'] == 0
+    assert rows[-1][0] == '合计' and rows[-1][8] == sum(s['matched'] for s in per_pair)
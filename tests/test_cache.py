@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""表格缓存：文件修改（大小或修改时间变化）后失效"""
+
+import os
+
+import excel_compare_web as ecw
+
+
+def test_cache_invalidated_when_file_changes(tmp_path):
+    path = tmp_path / 'a.csv'
+    path.write_text('k,x\nr1,1\n', encoding='utf-8')
+    service = ecw.ExcelCompareService()
+    
+    def load():
+        return service._load_sources([str(path)], ['reading_a'], 'values')[0]['rows']
+    
+    hits = ecw._table_cache.stats()['hits']
+    assert load() == [('k', 'x'), ('r1', 1)]
+    assert load() == [('k', 'x'), ('r1', 1)]
+    assert ecw._table_cache.stats()['hits'] == hits + 1
+    
+    # 大小不变、只有修改时间变化
+    stat = path.stat()
+    path.write_text('k,x\nr1,2\n', encoding='utf-8')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert load() == [('k', 'x'), ('r1', 2)]
+    
+    # 大小变化（修改时间不变）
+    stat = path.stat()
+    path.write_text('k,x\nr1,30\n', encoding='utf-8')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert load() == [('k', 'x'), ('r1', 30)]
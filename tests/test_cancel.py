@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""任务取消：写入结果途中取消时，不留下部分写入的结果文件和临时文件"""
+
+import os
+
+import pytest
+
+import excel_compare_web as ecw
+
+
+class CancelOnWriteJob(ecw.CompareJob):
+    """写入结果阶段已开始写Parquet文件后请求取消，下一次进度上报时中止"""
+    
+    def __init__(self, parquet_path):
+        super().__init__('compare')
+        self.parquet_path = parquet_path
+    
+    @property
+    def rows_done(self):
+        return self._rows_done
+    
+    @rows_done.setter
+    def rows_done(self, value):
+        self._rows_done = value
+        if self.phase == 'writing' and value > 0 and os.path.exists(self.parquet_path):
+            self.cancel_event.set()
+
+
+@pytest.mark.parametrize('method, extra', [
+    ('run_dimension_compare', {}),
+    ('run_aggregate_compare', {'dimColumns': ['k'], 'indColumns': ['x', 'y']}),
+])
+def test_cancel_mid_write_leaves_no_files(tmp_path, monkeypatch, method, extra):
+    pytest.importorskip('pyarrow')
+    monkeypatch.setattr(ecw, 'PROGRESS_INTERVAL', 5)
+    monkeypatch.setattr(ecw, 'COLUMNAR_BATCH_ROWS', 20)
+    temp_dir = tmp_path / 'tmp'
+    temp_dir.mkdir()
+    monkeypatch.setattr('tempfile.tempdir', str(temp_dir))  # openpyxl 只写模式的临时文件
+    workdir = tmp_path / 'out'
+    workdir.mkdir()
+    a = tmp_path / 'a.csv'
+    b = tmp_path / 'b.csv'
+    a.write_text('k,x,y\n' + ''.join('k{},{},{}\n'.format(i, i, i * 2) for i in range(200)), encoding='utf-8')
+    b.write_text('k,x,y\n' + ''.join('k{},{},{}\n'.format(i, i + i % 7, i * 2) for i in range(200)),
+                 encoding='utf-8')
+    
+    job = CancelOnWriteJob(str(workdir / 'result.parquet'))
+    ecw._job_local.job = job
+    try:
+        result = getattr(ecw.ExcelCompareService(), method)(dict({
+            'tableAFile': str(a), 'tableBFile': str(b), 'workDir': str(workdir),
+            'outputFile': 'result.xlsx', 'parquetOutput': True
+        }, **extra))
+    finally:
+        ecw._job_local.job = None
+    
+    assert result.get('cancelled'), result['message']
+    assert job.phase == 'writing' and job.rows_done > 0
+    assert os.listdir(str(workdir)) == []
+    assert os.listdir(str(temp_dir)) == []
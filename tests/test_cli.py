@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""命令行模式：作业文件解析和退出码"""
+
+import json
+import os
+
+import pytest
+
+import excel_compare_web as ecw
+
+
+def test_json_job_file(tmp_path):
+    path = tmp_path / 'jobs.json'
+    path.write_text(json.dumps({'jobs': [
+        {'action': 'compare', 'baseFile': 'base.xlsx', 'dataAFile': 'a.xlsx', 'dataBFile': 'b.xlsx',
+         'workDir': 'out'}
+    ]}), encoding='utf-8')
+    job, = ecw._load_job_file(str(path))
+    assert job['baseFile'] == os.path.join(str(tmp_path), 'base.xlsx')
+    assert job['workDir'] == os.path.join(str(tmp_path), 'out')
+
+
+def test_job_file_requires_action(tmp_path):
+    path = tmp_path / 'jobs.json'
+    path.write_text(json.dumps([{'tableAFile': 'a.csv', 'tableBFile': 'b.csv'}]), encoding='utf-8')
+    with pytest.raises(Exception, match='action'):
+        ecw._load_job_file(str(path))
+
+
+def test_yaml_job_file(tmp_path):
+    pytest.importorskip('yaml')
+    path = tmp_path / 'jobs.yaml'
+    path.write_text('action: aggregate_compare\ntableAFile: a.csv\ntableBFile: b.csv\n'
+                    'dimColumns: [险种]\nindColumns: [保费]\n', encoding='utf-8')
+    job, = ecw._load_job_file(str(path))
+    assert job['dimColumns'] == ['险种'] and job['tableAFile'] == os.path.join(str(tmp_path), 'a.csv')
+
+
+@pytest.mark.parametrize('result, fail_on, code', [
+    ({'success': False}, 'never', ecw.CLI_EXIT_FAILED),
+    ({'success': True, 'summary': {'red': 0, 'error': 0}}, 'diff', ecw.CLI_EXIT_OK),
+    ({'success': True, 'summary': {'red': 0, 'error': 2}}, 'diff', ecw.CLI_EXIT_DIFF),
+    ({'success': True, 'summary': {'red': 0, 'error': 2}}, 'red', ecw.CLI_EXIT_OK),
+    ({'success': True, 'summary': {'red': 1, 'error': 0}}, 'never', ecw.CLI_EXIT_OK),
+    ({'success': True, 'summary': {'red': 0, 'error': 0, 'failed': 1}}, 'never', ecw.CLI_EXIT_FAILED),
+])
+def test_exit_code(result, fail_on, code):
+    assert ecw._cli_exit_code(result, fail_on) == code
+
+
+def test_cli_dimension_compare(tmp_path):
+    (tmp_path / 'a.csv').write_text('k,x\nr1,1\n', encoding='utf-8')
+    (tmp_path / 'b.csv').write_text('k,x\nr1,1\n', encoding='utf-8')
+    code = ecw.cli_main(['dimension_compare', '--table-a', str(tmp_path / 'a.csv'),
+                         '--table-b', str(tmp_path / 'b.csv'), '--work-dir', str(tmp_path), '-o', 'r.xlsx'])
+    assert code == ecw.CLI_EXIT_OK
+    assert (tmp_path / 'r.xlsx').exists()
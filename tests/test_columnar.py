@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Parquet/Arrow读取：与同样数据的xlsx读取结果一致"""
+
+import pytest
+
+import excel_compare_web as ecw
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+HEADERS = ('险种', '渠道', '保费')
+ROWS = [('车险', '银行', 100.5), ('健康险', '', 20.0), ('车险', None, 3.25)]
+
+
+def _table(dictionary=False):
+    columns = [list(col) for col in zip(*ROWS)]
+    arrays = [pa.array(col) for col in columns]
+    if dictionary:
+        arrays = [arr.dictionary_encode() if pa.types.is_string(arr.type) else arr for arr in arrays]
+    return pa.Table.from_arrays(arrays, names=list(HEADERS))
+
+
+@pytest.fixture
+def xlsx_rows(tmp_path, read_rows):
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    ws.append(HEADERS)
+    for row in ROWS:
+        ws.append(row)
+    path = tmp_path / 'a.xlsx'
+    wb.save(path)
+    return read_rows(path)
+
+
+@pytest.mark.parametrize('dictionary', [False, True])
+def test_parquet_matches_xlsx(tmp_path, xlsx_rows, dictionary, read_rows):
+    path = tmp_path / 'a.parquet'
+    pq.write_table(_table(dictionary), path)
+    if dictionary:
+        assert pa.types.is_dictionary(pq.ParquetFile(path).schema_arrow.field('渠道').type)
+    assert read_rows(path) == xlsx_rows
+
+
+def test_arrow_stream_file(tmp_path, xlsx_rows, read_rows):
+    path = tmp_path / 'a.arrows'
+    table = _table(dictionary=True)
+    with pa.OSFile(str(path), 'wb') as sink, pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    assert ecw.ExcelCompareService()._table_name(str(path)) == 'a'
+    assert read_rows(path) == xlsx_rows
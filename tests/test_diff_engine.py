@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""差异计算引擎：NumPy向量化与逐个计算的结果一致"""
+
+import pytest
+
+import excel_compare_web as ecw
+
+
+def test_diff_engines_agree():
+    """NumPy与逐个计算的差异值和颜色分类逐项一致"""
+    pytest.importorskip('numpy')
+    values = [0, 1, -1, 2.5, 100, 1e-12, 1e15, '3.5', ' 7 ', '', None, 'abc', True, 0.1, 0.2, -0.3]
+    pairs = [([i] + [a] * 3, [i] + [b] * 4) for i, (a, b) in enumerate(
+        (a, b) for a in values for b in values)]
+    column_plan = [('x', 1, 1), ('y', 2, 2), ('z', 3, 3), ('b_only', None, 4)]
+    service = ecw.ExcelCompareService()
+    for threshold in (0, 1, 5.5):
+        python = service._diff_block(pairs, column_plan, 'A', 'B', threshold, use_numpy=False)
+        numpy = service._diff_block(pairs, column_plan, 'A', 'B', threshold, use_numpy=True)
+        assert numpy == python
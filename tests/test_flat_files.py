@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""CSV/TSV读取：编码检测和字段转换"""
+
+import excel_compare_web as ecw
+
+
+def test_utf8_with_bom(tmp_path, read_rows):
+    path = tmp_path / 'a.csv'
+    path.write_bytes('险种,保费\n车险,100.5\n'.encode('utf-8-sig'))
+    assert read_rows(path) == [('险种', '保费'), ('车险', 100.5)]
+
+
+def test_gbk_detected_from_sample(tmp_path, read_rows):
+    path = tmp_path / 'a.tsv'
+    path.write_bytes('险种\t件数\n车险\t3\n'.encode('gbk'))
+    assert read_rows(path) == [('险种', '件数'), ('车险', 3)]
+
+
+def test_gbk_after_sniff_window(tmp_path, read_rows):
+    """开头超过检测范围的内容全是ASCII，之后才出现GBK中文：改按GB18030读取，不丢行也不重复"""
+    lines = ['code,amount'] + ['{:08d},{}'.format(i, i) for i in range(ecw.TEXT_SNIFF_BYTES // 10 + 100)]
+    lines.append('车险,7')
+    path = tmp_path / 'a.csv'
+    path.write_bytes(('\n'.join(lines) + '\n').encode('gbk'))
+    assert b'\xb3' in path.read_bytes()[ecw.TEXT_SNIFF_BYTES:]  # 非ASCII字节在检测范围之后
+    
+    rows = read_rows(path)
+    assert len(rows) == len(lines)
+    assert rows[1] == ('00000000', 0)  # 前导零的代码保留为文本
+    assert rows[-1] == ('车险', 7)
+    assert [row[1] for row in rows[1:-1]] == list(range(len(lines) - 2))
+
+
+def test_max_row_stops_early(tmp_path):
+    path = tmp_path / 'a.csv'
+    path.write_text('a,b\n1,2\n3,4\n', encoding='utf-8')
+    rows = ecw.ExcelCompareService()._iter_table_rows(str(path), max_row=2)
+    assert list(rows) == [('a', 'b'), (1, 2)]
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""运行指标：Prometheus文本格式导出和读取行数统计"""
+
+import excel_compare_web as ecw
+
+
+def _samples(text, name):
+    """导出文本中指标 name 的各样本行（去掉 HELP/TYPE 注释）"""
+    return [line for line in text.splitlines() if line.startswith(name) and not line.startswith('#')]
+
+
+def test_histogram_buckets_in_order_and_cumulative():
+    registry = ecw.MetricsRegistry()
+    registry.describe('demo_seconds', 'histogram', '示例耗时', (0.5, 1, 5))
+    for value in (0.2, 0.7, 3, 30):
+        registry.observe('demo_seconds', value, mode='dimension')
+    text = registry.render()
+    
+    assert text.index('# HELP demo_seconds') < text.index('# TYPE demo_seconds histogram')
+    assert _samples(text, 'demo_seconds') == [
+        'demo_seconds_bucket{mode="dimension",le="0.5"} 1',
+        'demo_seconds_bucket{mode="dimension",le="1"} 2',
+        'demo_seconds_bucket{mode="dimension",le="5"} 3',
+        'demo_seconds_bucket{mode="dimension",le="+Inf"} 4',
+        'demo_seconds_sum{mode="dimension"} 33.9',
+        'demo_seconds_count{mode="dimension"} 4',
+    ]
+
+
+def test_label_values_escaped():
+    registry = ecw.MetricsRegistry()
+    registry.describe('demo_total', 'counter', '示例计数')
+    registry.inc('demo_total', 2, path='C:\\data\\"a".xlsx\nb', mode='x')
+    assert _samples(registry.render(), 'demo_total') == [
+        'demo_total{mode="x",path="C:\\\\data\\\\\\"a\\".xlsx\\nb"} 2'
+    ]
+
+
+def test_gauges_read_at_scrape_time(tmp_path):
+    assert 'excel_compare_table_cache_entries 0' in _samples(ecw._render_metrics(), 'excel_compare_table_cache')
+    
+    path = tmp_path / 'a.csv'
+    path.write_text('k,x\nr1,1\n', encoding='utf-8')
+    ecw.ExcelCompareService()._load_sources([str(path)], ['reading_a'], 'values')
+    assert 'excel_compare_table_cache_entries 1' in _samples(ecw._render_metrics(), 'excel_compare_table_cache')
+
+
+def test_rows_read_not_counted_for_cache_hits(tmp_path):
+    path = tmp_path / 'a.csv'
+    path.write_text('k,x\nr1,1\nr2,2\n', encoding='utf-8')
+    service = ecw.ExcelCompareService()
+    key = ('excel_compare_rows_read_total', (('mode', 'other'),))
+    before = ecw._metrics._counters.get(key, 0)
+    
+    service._load_sources([str(path)], ['reading_a'], 'values')
+    assert ecw._metrics._counters[key] == before + 3
+    service._load_sources([str(path)], ['reading_a'], 'values')
+    assert ecw._metrics._counters[key] == before + 3
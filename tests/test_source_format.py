@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""源数据格式选项：values 只写值、full 保留格式，与缓存状态无关"""
+
+import pytest
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Font, PatternFill
+
+import excel_compare_web as ecw
+
+HEADER_FILL = 'FFFF00'
+
+
+def _write_xlsx(path, rows, styled_header=False):
+    wb = Workbook()
+    ws = wb.active
+    for row in rows:
+        ws.append(row)
+    if styled_header:
+        for cell in ws[1]:
+            cell.fill = PatternFill('solid', start_color=HEADER_FILL)
+            cell.font = Font(bold=True)
+    wb.save(path)
+    return str(path)
+
+
+def _embedded_header(path):
+    wb = load_workbook(path)
+    cell = wb.worksheets[-1]['A1']
+    return cell.fill.fgColor.rgb, bool(cell.font.b)
+
+
+@pytest.mark.parametrize('first', ['full', 'values'])
+def test_source_format_independent_of_cache(tmp_path, first):
+    """sourceFormat=values 只写值、full 保留格式，与之前的请求留在缓存中的内容无关"""
+    a = _write_xlsx(tmp_path / 'a.xlsx', [['k', 'x'], ['r1', 1], ['r2', 5]], styled_header=True)
+    b = _write_xlsx(tmp_path / 'b.xlsx', [['k', 'x'], ['r1', 2], ['r2', 5]], styled_header=True)
+    service = ecw.ExcelCompareService()
+    order = [first, 'values' if first == 'full' else 'full']
+    for source_format in order:
+        result = service.run_dimension_compare({
+            'tableAFile': a, 'tableBFile': b, 'workDir': str(tmp_path),
+            'sourceFormat': source_format, 'outputFile': source_format + '.xlsx'
+        })
+        assert result['success'], result['message']
+    
+    assert _embedded_header(tmp_path / 'full.xlsx') == ('00' + HEADER_FILL, True)
+    assert _embedded_header(tmp_path / 'values.xlsx') == ('00000000', False)
+
+
+def _strip_dimension(path):
+    """去掉工作表的<dimension>记录（部分工具导出的文件没有该记录，只读模式下总行数未知）"""
+    import re
+    import zipfile
+    with zipfile.ZipFile(path) as src:
+        items = [(info, src.read(info)) for info in src.infolist()]
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as dst:
+        for info, data in items:
+            if info.filename.startswith('xl/worksheets/'):
+                data = re.sub(rb'<dimension[^>]*/>', b'', data)
+            dst.writestr(info, data)
+
+
+def test_auto_without_dimension_uses_values_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(ecw, 'SOURCE_VALUES_ONLY_ROWS', 5)
+    path = _write_xlsx(tmp_path / 'a.xlsx', [['k', 'x']] + [['r{}'.format(i), i] for i in range(10)],
+                       styled_header=True)
+    _strip_dimension(path)
+    service = ecw.ExcelCompareService()
+    _, total, close = service._open_table_rows(path)
+    close()
+    assert total is None
+    
+    source = service._read_source_sheet(path, 'auto')
+    assert source['styles'] is None and len(source['rows']) == 11
+    
+    # 行数未超过阈值时仍保留格式
+    monkeypatch.setattr(ecw, 'SOURCE_VALUES_ONLY_ROWS', 50)
+    assert service._read_source_sheet(path, 'auto')['styles'] is not None
+
+
+def test_styled_size_counts_styles(tmp_path):
+    """带格式的源数据估算大小包含行样式元组和样式对象，只写值时不含"""
+    path = _write_xlsx(tmp_path / 'a.xlsx', [['k', 'x']] + [['r{}'.format(i), i] for i in range(10)],
+                       styled_header=True)
+    service = ecw.ExcelCompareService()
+    styled = service._read_source_sheet(path, 'full')
+    values = service._read_source_sheet(path, 'values')
+    assert styled['rows'] == values['rows'] and len(styled['style_table']) == 1
+    
+    style_bytes = ecw.TableCache.estimate_object_size(styled['style_table'][0])
+    assert styled['size'] >= values['size'] + style_bytes > values['size']
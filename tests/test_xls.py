@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+""".xls读取：xlrd直接逐行读取与转换为.xlsx后读取的结果一致"""
+
+import datetime
+import os
+
+import pytest
+from openpyxl import load_workbook
+
+import excel_compare_web as ecw
+
+xlwt = pytest.importorskip('xlwt')
+pytest.importorskip('xlrd')
+
+ROWS = [
+    ('险种', '保费', '比例', '日期', '备注'),
+    ('车险', 100, 0.1, datetime.datetime(2026, 1, 31), None),
+    ('健康险', -3, 1 / 3, datetime.datetime(2025, 12, 1, 8, 30), '含空格 '),
+    ('意外险', 12345678901, 1e20, None, ''),
+]
+
+
+@pytest.fixture
+def xls_path(tmp_path):
+    book = xlwt.Workbook()
+    sheet = book.add_sheet('Sheet1')
+    date_style = xlwt.easyxf(num_format_str='yyyy-mm-dd hh:mm')
+    for r, row in enumerate(ROWS):
+        for c, value in enumerate(row):
+            if value is None:
+                continue
+            if isinstance(value, datetime.datetime):
+                sheet.write(r, c, value, date_style)
+            else:
+                sheet.write(r, c, value)
+    path = tmp_path / 'a.xls'
+    book.save(str(path))
+    return str(path)
+
+
+def test_xls_rows(xls_path):
+    rows = list(ecw.ExcelCompareService()._iter_table_rows(xls_path))
+    expected = [tuple(None if v == '' else v for v in row) for row in ROWS]
+    assert rows == expected
+    assert isinstance(rows[1][1], int) and isinstance(rows[3][1], int)
+
+
+def test_xls_direct_matches_converted_xlsx(xls_path):
+    service = ecw.ExcelCompareService()
+    temp_path = service._convert_xls_to_xlsx(xls_path)
+    try:
+        wb = load_workbook(temp_path, read_only=True, data_only=True)
+        converted = [tuple(row) for row in wb.active.iter_rows(values_only=True)]
+        wb.close()
+    finally:
+        os.unlink(temp_path)
+    assert list(service._iter_table_rows(xls_path)) == converted